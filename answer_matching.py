@@ -0,0 +1,173 @@
+"""Local grading of typed quiz answers
+
+An Interslavic answer can be typed in Latin or Cyrillic, with or without
+diacritics (č/c, ě/e), with the words of a phrase in another order or with
+a typo. All of these compare equal after normalization: the answer is
+transliterated to Latin, lower-cased, folded to plain letters and split
+into words. A remaining difference of a few letters (bounded by the
+length of the answer) is accepted as a typo, but not in a short answer,
+not when the typed text is as close to another option of the question,
+and not when only the ending of a word differs: "knjigu" for "knjiga" is
+a wrong form, not a slip of the finger.
+
+The normalized forms of the correct answer and the options are computed
+once per question and cached, so grading an answer costs microseconds.
+"""
+
+import re
+import unicodedata
+from collections import namedtuple
+from functools import lru_cache
+from metrics import registry
+
+typed_answers = registry.counter("typed_answers_total", "Typed quiz answers by grade")
+
+# Grades, from the strictest match to none
+EXACT = "exact"
+NORMALIZED = "normalized"
+REORDERED = "reordered"
+TYPO = "typo"
+WRONG = "wrong"
+
+Grade = namedtuple("Grade", "is_correct kind")
+
+# Interslavic Cyrillic to the Latin alphabet (before folding)
+_CYRILLIC = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "ґ": "g", "д": "d", "ђ": "đ", "е": "e", "є": "je", "ё": "jo",
+    "ж": "ž", "з": "z", "и": "i", "і": "i", "ї": "ji", "й": "j", "ј": "j", "к": "k", "л": "l", "љ": "lj",
+    "м": "m", "н": "n", "њ": "nj", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "ћ": "ć", "у": "u",
+    "ф": "f", "х": "h", "ц": "c", "ч": "č", "џ": "dž", "ш": "š", "щ": "šč", "ъ": "", "ы": "y", "ь": "",
+    "ѣ": "ě", "э": "e", "ю": "ju", "я": "ja", "ѧ": "ę", "ѫ": "ų",
+}
+# Latin letters without a Unicode decomposition, and the etymological soft consonants
+_LATIN = {"đ": "dž", "ł": "l", "ß": "ss", "ľ": "lj", "ń": "nj", "ŕ": "r", "ť": "t", "ď": "d", "ś": "s", "ź": "z"}
+_TRANSLATION = str.maketrans({**_CYRILLIC, **_LATIN})
+
+_NOT_LETTERS = re.compile(r"[\W_]+")
+
+# Typos accepted for a normalized answer of at least this many letters: none below 6, 1 from 6, 2 from 12
+TYPO_THRESHOLDS = (6, 12)
+
+# Folded inflectional endings of nouns, adjectives and verbs; two forms of a word that differ only
+# in these are different grammatical forms
+ENDINGS = frozenset((
+    "", "a", "e", "i", "o", "u", "y", "ja", "je", "ji", "ju", "om", "em", "ov", "ev", "oj", "ej", "ah", "ih", "yh",
+    "am", "im", "ym", "ami", "ego", "ogo", "emu", "omu", "oju", "eju", "aja", "oje", "uju", "ije", "ija",
+    "m", "s", "t", "mo", "te", "ut", "jut", "at", "et", "it", "l", "la", "lo", "li", "ti",
+))
+
+
+def fold(text):
+    """Lower-case Latin text without diacritics: "Rěč", "рѣч" -> "rec" """
+    decomposed = unicodedata.normalize("NFD", text.lower().translate(_TRANSLATION))
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def normalize(text):
+    """Folded words of the text joined by single spaces, without punctuation"""
+    return " ".join(_NOT_LETTERS.sub(" ", fold(text)).split())
+
+
+def typo_limit(length):
+    return sum(length >= threshold for threshold in TYPO_THRESHOLDS)
+
+
+def edit_distance(first, second, limit):
+    """Levenshtein distance of two strings, or limit + 1 as soon as it is known to exceed limit
+
+    Only the diagonal band of width 2 * limit + 1 is computed.
+    """
+    if first == second:
+        return 0
+    if len(first) > len(second):
+        first, second = second, first
+    if len(second) - len(first) > limit:
+        return limit + 1
+    over = limit + 1
+    previous = [min(j, over) for j in range(len(second) + 1)]
+    for i, char in enumerate(first, 1):
+        low, high = max(1, i - limit), min(len(second), i + limit)
+        current = [over] * (len(second) + 1)
+        current[0] = min(i, over)
+        best = current[0] if low == 1 else over
+        for j in range(low, high + 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char != second[j - 1]))
+            current[j] = cost if cost < over else over
+            if cost < best:
+                best = cost
+        if best > limit:
+            return over
+        previous = current
+    return previous[-1]
+
+
+def _sorted_words(normalized):
+    return " ".join(sorted(normalized.split()))
+
+
+def _changes_ending(answer, correct):
+    """True if a word of the answer is another form of the corresponding word of the correct answer"""
+    answer_words, correct_words = answer.split(), correct.split()
+    if len(answer_words) != len(correct_words):
+        return False
+    for typed, expected in zip(answer_words, correct_words):
+        if typed == expected:
+            continue
+        stem = 0
+        while stem < min(len(typed), len(expected)) and typed[stem] == expected[stem]:
+            stem += 1
+        if stem and typed[stem:] in ENDINGS and expected[stem:] in ENDINGS:
+            return True
+    return False
+
+
+class AnswerMatcher:
+    """The precomputed forms of a question's correct answer and of its other options"""
+
+    __slots__ = ("correct", "normalized", "sorted_words", "limit", "others")
+
+    def __init__(self, correct_answer, options=()):
+        self.correct = correct_answer.strip()
+        self.normalized = normalize(correct_answer)
+        self.sorted_words = _sorted_words(self.normalized)
+        self.limit = typo_limit(len(self.normalized))
+        # A typed wrong option must not pass as a typo of the right one
+        self.others = tuple(frozenset(normalize(option) for option in options) - {self.normalized})
+
+    def grade(self, answer):
+        answer = answer.strip()
+        if answer == self.correct:
+            return Grade(True, EXACT)
+        normalized = normalize(answer)
+        if normalized == self.normalized:
+            return Grade(True, NORMALIZED)
+        if not normalized or normalized in self.others:
+            return Grade(False, WRONG)
+        sorted_words = _sorted_words(normalized)
+        if sorted_words == self.sorted_words:
+            return Grade(True, REORDERED)
+        if not self.limit:
+            return Grade(False, WRONG)
+        for typed, expected in ((normalized, self.normalized), (sorted_words, self.sorted_words)):
+            if edit_distance(typed, expected, self.limit) <= self.limit:
+                if _changes_ending(typed, expected) or self._near_other(normalized):
+                    return Grade(False, WRONG)
+                return Grade(True, TYPO)
+        return Grade(False, WRONG)
+
+    def _near_other(self, normalized):
+        """True if the answer is within the typo limit of a wrong option: it cannot be told apart"""
+        return any(edit_distance(normalized, other, self.limit) <= self.limit for other in self.others)
+
+
+@lru_cache(maxsize=4096)
+def answer_matcher(correct_answer, options=()):
+    """The cached matcher of a question; options is a tuple"""
+    return AnswerMatcher(correct_answer, options)
+
+
+def grade_answer(answer, correct_answer, options=()):
+    """Grade(is_correct, kind) of a typed answer"""
+    grade = answer_matcher(correct_answer, tuple(options)).grade(answer)
+    typed_answers.inc(kind=grade.kind)
+    return grade
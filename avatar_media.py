@@ -0,0 +1,108 @@
+import asyncio
+import hashlib
+import os
+from contextlib import ExitStack
+from config import logger
+from metrics import registry
+
+media_sends = registry.counter("telegram_media_sends_total", "Media groups sent by source (file_id/upload)")
+
+
+def file_digest(path):
+    """SHA-256 of a file, to notice when an image on disk has been replaced"""
+    with open(path, "rb") as media_file:
+        return hashlib.sha256(media_file.read()).hexdigest()
+
+
+class AvatarMediaCache:
+    """Sends avatar images as one media group, uploading every image only once
+
+    Telegram returns a file_id for each uploaded photo; it is kept in memory
+    and in the telegram_files table (keyed by path, with the file's digest)
+    so later sends reference the images instead of uploading them again.
+    """
+
+    def __init__(self, api, database=None):
+        self.api = api
+        self._database = database
+        self.file_ids = None
+        self.digests = {}
+        # Only one cold-start upload at a time; concurrent sends wait and reuse its file_ids
+        self.lock = asyncio.Lock()
+
+    @property
+    def database(self):
+        if self._database is None:
+            from database import db
+            self._database = db
+        return self._database
+
+    def _digest(self, path):
+        if path not in self.digests:
+            self.digests[path] = file_digest(path)
+        return self.digests[path]
+
+    def _cached(self, path):
+        if self.file_ids is None:
+            self.file_ids = self.database.get_telegram_file_ids()
+        digest, file_id = self.file_ids.get(path, (None, None))
+        return file_id if digest == self._digest(path) else None
+
+    def _all_cached(self, photos):
+        return all(self._cached(path) for path, _ in photos)
+
+    @staticmethod
+    def _item(media, caption):
+        item = {"type": "photo", "media": media}
+        if caption:
+            item["caption"] = caption
+        return item
+
+    async def send(self, chat_id, photos):
+        """Send [(path, caption), ...] to a chat as one album"""
+        if self._all_cached(photos):
+            result = await self._send_cached(chat_id, photos)
+            if result.get("ok"):
+                return result
+            # file_ids belong to a bot token; after a token change they have to be uploaded again
+            logger.warning(f"Cached avatar file_ids rejected ({result.get('description')}), uploading again")
+            for path, _ in photos:
+                self.file_ids.pop(path, None)
+
+        async with self.lock:
+            if self._all_cached(photos):
+                return await self._send_cached(chat_id, photos)
+            return await self._upload(chat_id, photos)
+
+    async def _send_cached(self, chat_id, photos):
+        media = [self._item(self._cached(path), caption) for path, caption in photos]
+        media_sends.inc(source="file_id")
+        return await self.api.send_media_group(chat_id, media)
+
+    async def _upload(self, chat_id, photos):
+        """Send the album, uploading the images that have no file_id yet, and remember the new file_ids"""
+        media, files = [], {}
+        with ExitStack() as stack:
+            for index, (path, caption) in enumerate(photos):
+                file_id = self._cached(path)
+                if not file_id:
+                    name = f"photo{index}"
+                    files[name] = (os.path.basename(path), stack.enter_context(open(path, "rb")))
+                    file_id = f"attach://{name}"
+                media.append(self._item(file_id, caption))
+            media_sends.inc(source="upload")
+            result = await self.api.send_media_group(chat_id, media, files=files)
+
+        if not result.get("ok"):
+            return result
+        uploaded = []
+        for (path, _), message in zip(photos, result.get("result", [])):
+            sizes = message.get("photo")
+            if sizes:
+                # Sizes are ordered, the original resolution is last
+                uploaded.append((path, self._digest(path), sizes[-1]["file_id"]))
+        self.file_ids.update({path: (digest, file_id) for path, digest, file_id in uploaded})
+        if uploaded:
+            self.database.save_telegram_file_ids(uploaded)
+            logger.info(f"Stored file_ids for {len(uploaded)} avatar images")
+        return result
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""Offline content generation through the OpenAI Batch API
+
+Builds lesson and ritual prompts for every study plan topic / Bloom level and
+dictionary word, submits them as one batch job (JSONL in, JSONL out), polls
+until the job is done and bulk-loads the validated results into lesson_bank
+and ritual_bank. LocalBatchBackend runs the same JSONL file request by request
+against any chat completions endpoint, e.g. benchmarks.fake_servers:
+
+    python batch_generation.py lessons --variants 3
+    python batch_generation.py rituals --local-url http://127.0.0.1:8080/v1
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from openai import AsyncOpenAI
+from openai.types import CompletionUsage
+from config import logger
+from llm_usage import FEATURE_LESSON, FEATURE_RITUAL, usage_tracker
+from llm_validation import LLMValidationError, parse_json, repair_lesson
+from openai_service import route_for
+from prompts import AVATAR_STYLES, lesson_messages, ritual_messages
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# None is the neutral style used when a user has not picked an avatar
+AVATARS = (None,) + tuple(AVATAR_STYLES)
+BLOOM_LEVELS = range(1, 7)
+
+
+def batch_request(custom_id, feature, messages, bloom_level=None, json_output=False):
+    """One line of a Batch API input file, with model settings from MODEL_ROUTES"""
+    route = route_for(feature, bloom_level)
+    body = {
+        "model": route["model"],
+        "messages": messages,
+        "max_tokens": route["max_tokens"],
+        "temperature": route["temperature"]
+    }
+    if json_output:
+        body["response_format"] = {"type": "json_object"}
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+class OpenAIBatchBackend:
+    """Submits batch files to the OpenAI Batch API"""
+
+    def __init__(self, client):
+        self.client = client
+
+    async def submit(self, path):
+        with open(path, "rb") as batch_file:
+            uploaded = await self.client.files.create(file=batch_file, purpose="batch")
+        batch = await self.client.batches.create(
+            input_file_id=uploaded.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h"
+        )
+        return batch.id
+
+    async def poll(self, batch_id):
+        """Return (status, output lines); lines are None until the batch is finished"""
+        batch = await self.client.batches.retrieve(batch_id)
+        if batch.status not in TERMINAL_STATUSES:
+            return batch.status, None
+        # Expired batches still return the requests that did complete
+        if not batch.output_file_id:
+            return batch.status, []
+        content = await self.client.files.content(batch.output_file_id)
+        return batch.status, content.text.splitlines()
+
+
+class LocalBatchBackend:
+    """Stand-in for the Batch API: runs each request of the file against a chat completions endpoint"""
+
+    def __init__(self, client, concurrency=8):
+        self.client = client
+        self.concurrency = concurrency
+        self.jobs = {}
+        self.ids = itertools.count(1)
+
+    async def submit(self, path):
+        with open(path, encoding="utf-8") as batch_file:
+            requests = [json.loads(line) for line in batch_file if line.strip()]
+        batch_id = f"batch_local_{next(self.ids)}"
+        self.jobs[batch_id] = asyncio.create_task(self._run(requests))
+        return batch_id
+
+    async def poll(self, batch_id):
+        job = self.jobs[batch_id]
+        if not job.done():
+            return "in_progress", None
+        return "completed", job.result()
+
+    async def _run(self, requests):
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(request):
+            async with semaphore:
+                try:
+                    response = await self.client.chat.completions.create(**request["body"])
+                    result = {
+                        "response": {"status_code": 200, "body": response.model_dump()},
+                        "error": None
+                    }
+                except Exception as e:
+                    result = {"response": None, "error": {"code": type(e).__name__, "message": str(e)}}
+            return json.dumps({"id": f"local_{request['custom_id']}", "custom_id": request["custom_id"], **result})
+
+        return await asyncio.gather(*(run_one(request) for request in requests))
+
+
+class BatchPipeline:
+    """Build a batch file, run it through a backend and load the results into the content banks"""
+
+    def __init__(self, backend, database=None, poll_interval=60):
+        self.backend = backend
+        self._database = database
+        self.poll_interval = poll_interval
+
+    @property
+    def database(self):
+        if self._database is None:
+            from database import db
+            self._database = db
+        return self._database
+
+    def lesson_requests(self, topics, variants=1, words_per_lesson=10):
+        """Requests for every topic x Bloom level x variant; yields (request, meta)"""
+        word_pool = self.database.get_random_words(500)
+        counter = itertools.count()
+        for topic, bloom_level, _ in itertools.product(topics, BLOOM_LEVELS, range(variants)):
+            words = random.sample(word_pool, min(words_per_lesson, len(word_pool)))
+            custom_id = f"lesson-{next(counter)}"
+            request = batch_request(
+                custom_id, FEATURE_LESSON, lesson_messages(topic, bloom_level, words),
+                bloom_level=bloom_level, json_output=True
+            )
+            yield request, {"kind": FEATURE_LESSON, "topic": topic, "bloom_level": bloom_level}
+
+    def ritual_requests(self, words, avatars=AVATARS):
+        """Requests for every (word, meaning) x avatar; yields (request, meta)"""
+        counter = itertools.count()
+        for (word, meaning), avatar in itertools.product(words, avatars):
+            custom_id = f"ritual-{next(counter)}"
+            request = batch_request(custom_id, FEATURE_RITUAL, ritual_messages(word, meaning, avatar))
+            yield request, {"kind": FEATURE_RITUAL, "word": word, "avatar": avatar}
+
+    def write_input(self, path, requests):
+        """Write the JSONL input file plus a <path>.meta.json sidecar mapping custom_id to its target"""
+        meta = {}
+        with open(path, "w", encoding="utf-8") as batch_file:
+            for request, request_meta in requests:
+                batch_file.write(json.dumps(request, ensure_ascii=False) + "\n")
+                meta[request["custom_id"]] = request_meta
+        with open(f"{path}.meta.json", "w", encoding="utf-8") as meta_file:
+            json.dump(meta, meta_file, ensure_ascii=False)
+        logger.info(f"Wrote {len(meta)} batch requests to {path}")
+        return len(meta)
+
+    async def run(self, path, batch_id=None):
+        """Submit (or resume) a batch, wait for it and load the results; returns load statistics"""
+        with open(f"{path}.meta.json", encoding="utf-8") as meta_file:
+            meta = json.load(meta_file)
+        if batch_id is None:
+            batch_id = await self.backend.submit(path)
+            logger.info(f"Submitted batch {batch_id} with {len(meta)} requests")
+
+        started = time.monotonic()
+        while True:
+            status, lines = await self.backend.poll(batch_id)
+            if lines is not None:
+                break
+            logger.info(f"Batch {batch_id} is {status} ({time.monotonic() - started:.0f}s)")
+            await asyncio.sleep(self.poll_interval)
+        logger.info(f"Batch {batch_id} {status} after {time.monotonic() - started:.0f}s")
+
+        stats = self.load_results(lines, meta)
+        stats["status"] = status
+        return stats
+
+    def load_results(self, lines, meta):
+        """Validate batch output lines and bulk-insert the usable ones"""
+        lessons, rituals = [], []
+        stats = {"requests": len(meta), "results": 0, "loaded": 0, "errors": 0, "invalid": 0}
+
+        for line in lines:
+            if not line.strip():
+                continue
+            stats["results"] += 1
+            result = json.loads(line)
+            target = meta.get(result.get("custom_id"))
+            response = result.get("response") or {}
+            if not target or result.get("error") or response.get("status_code") != 200:
+                stats["errors"] += 1
+                continue
+
+            body = response["body"]
+            if body.get("usage"):
+                usage_tracker.record(
+                    target["kind"], body.get("model", ""), CompletionUsage(**body["usage"]), status="batch"
+                )
+            content = body["choices"][0]["message"]["content"] or ""
+
+            try:
+                if target["kind"] == FEATURE_LESSON:
+                    lessons.append((target["topic"], target["bloom_level"], repair_lesson(parse_json(content))))
+                elif content.strip():
+                    rituals.append((target["word"], target["avatar"], content.strip()))
+                else:
+                    stats["invalid"] += 1
+            except (ValueError, LLMValidationError) as e:
+                logger.warning(f"Discarding batch result {result.get('custom_id')}: {e}")
+                stats["invalid"] += 1
+
+        if lessons and self.database.save_bank_lessons(lessons):
+            stats["loaded"] += len(lessons)
+        if rituals and self.database.save_bank_rituals(rituals):
+            stats["loaded"] += len(rituals)
+        usage_tracker.flush()
+        return stats
+
+
+async def main(args):
+    if args.local_url:
+        backend = LocalBatchBackend(AsyncOpenAI(api_key="local", base_url=args.local_url), args.concurrency)
+    else:
+        from openai_service import get_client
+        backend = OpenAIBatchBackend(get_client())
+    pipeline = BatchPipeline(backend, poll_interval=args.poll_interval)
+
+    path = args.input or os.path.join(tempfile.gettempdir(), f"{args.kind}-batch-{int(time.time())}.jsonl")
+    if not args.batch_id:
+        if args.kind == "lessons":
+            requests = pipeline.lesson_requests(pipeline.database.get_study_plan_topics(), args.variants)
+        else:
+            words = [(word["isv"], word["ru"]) for word in pipeline.database.get_random_words(args.words) if word["ru"]]
+            requests = pipeline.ritual_requests(words)
+        pipeline.write_input(path, requests)
+
+    stats = await pipeline.run(path, batch_id=args.batch_id)
+    logger.info(f"Batch finished: {stats}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate lessons or rituals offline through the Batch API")
+    parser.add_argument("kind", choices=("lessons", "rituals"))
+    parser.add_argument("--variants", type=int, default=3, help="lessons per topic and Bloom level")
+    parser.add_argument("--words", type=int, default=1000, help="dictionary words to prepare rituals for")
+    parser.add_argument("--input", help="batch input file (kept for --batch-id resumes)")
+    parser.add_argument("--batch-id", help="resume polling an already submitted batch; needs --input")
+    parser.add_argument("--poll-interval", type=float, default=60, help="seconds between status checks")
+    parser.add_argument("--local-url", help="run the batch locally against this chat completions base URL")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel requests for --local-url")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of grading typed answers with answer_matching
+
+Reports the cost of grading one answer for every kind of difference from
+the correct answer (exact, script and diacritics, word order, typo, wrong),
+with the normalized forms of the question already cached as in the bot.
+No network, database or OpenAI involved.
+
+    python -m benchmarks.bench_answer_matching --number 50000
+"""
+
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from answer_matching import answer_matcher
+
+CORRECT = "Ja jesm student iz Pragy"
+OPTIONS = (CORRECT, "Ty jesi student iz Pragy", "On jest učitelj v Pragě", "My jesmo studenti")
+ANSWERS = {
+    "exact": CORRECT,
+    "normalized": "ја јесм студент из прагы",
+    "reordered": "Iz Pragy ja jesm student",
+    "typo": "Ja jesm studnet iz Pragy",
+    "wrong": "My jesmo studenti",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=50000, help="answers graded per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="measurements per answer, the best is reported")
+    args = parser.parse_args()
+
+    matcher = answer_matcher(CORRECT, OPTIONS)
+    print(f"{'answer':<12}{'grade':<12}{'µs':>8}")
+    for name, answer in ANSWERS.items():
+        grade = matcher.grade(answer)
+        seconds = min(timeit.repeat(lambda: matcher.grade(answer), number=args.number, repeat=args.repeat))
+        print(f"{name:<12}{grade.kind:<12}{seconds / args.number * 1e6:>8.2f}")
+
+if __name__ == "__main__":
+    main()
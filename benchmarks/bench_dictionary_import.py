@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""Benchmark of dictionary_importer against row-by-row inserts
+
+Generates a synthetic dictionary export shaped like the official Interslavic
+one and imports it into scratch copies of the words table (created with
+LIKE words, dropped afterwards):
+
+  executemany  one INSERT ... ON CONFLICT per entry, like the original seeding
+  copy         DictionaryImporter into an empty table
+  copy-update  DictionaryImporter again with --changed of the entries modified
+
+Needs a PostgreSQL database (PG* environment variables).
+
+    python -m benchmarks.bench_dictionary_import --rows 50000
+"""
+
+import argparse
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADER = ("id", "isv", "addition", "partOfSpeech", "type", "en", "ru", "pl", "cs")
+PARTS_OF_SPEECH = ("m.", "f.", "n.", "adj.", "adv.", "v. tr. ipf.", "v. intr. pf.", "prep.")
+LETTERS = "abcdefghijklmnoprstuvzčšžěj"
+
+
+def synthetic_entries(rows, seed=1):
+    """Rows of a fake dictionary export; every (isv, addition, partOfSpeech) is unique"""
+    generator = random.Random(seed)
+    for number in range(1, rows + 1):
+        stem = "".join(generator.choice(LETTERS) for _ in range(generator.randint(3, 9)))
+        yield (
+            number, f"{stem}{number}", generator.choice(("", "", "", "(sę)", "(+2)")),
+            generator.choice(PARTS_OF_SPEECH), "1",
+            f"{stem} (en)", f"{stem} (ru), {stem}ка", f"{stem} (pl)", f"{stem} (cs)"
+        )
+
+
+def write_export(path, rows, changed=0.0):
+    """Write the export; a `changed` share of entries gets a new Russian translation"""
+    generator = random.Random(2)
+    with open(path, "w", encoding="utf-8", newline="") as export:
+        writer = csv.writer(export)
+        writer.writerow(HEADER)
+        for entry in synthetic_entries(rows):
+            if changed and generator.random() < changed:
+                entry = entry[:6] + (entry[6] + " (изм.)",) + entry[7:]
+            writer.writerow(entry)
+
+
+def bench_executemany(connection, table, path):
+    from dictionary_importer import normalize_entry, read_entries
+    started = time.perf_counter()
+    rows = [row for row in map(normalize_entry, read_entries(path)) if row]
+    with connection.cursor() as cursor:
+        cursor.executemany(f"""
+            INSERT INTO {table} (source_id, isv, addition, part_of_speech, ru, en)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (isv, addition, part_of_speech) DO UPDATE SET ru = EXCLUDED.ru, en = EXCLUDED.en
+        """, rows)
+    connection.commit()
+    return len(rows), time.perf_counter() - started
+
+
+def bench_copy(connection, table, path, batch_size):
+    from dictionary_importer import DictionaryImporter, read_entries
+    stats = DictionaryImporter(connection, table=table, batch_size=batch_size).run(read_entries(path))
+    return stats["read"], stats["seconds"], stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=50000, help="dictionary entries for the COPY import")
+    parser.add_argument("--baseline-rows", type=int, default=5000, help="entries for the executemany baseline")
+    parser.add_argument("--changed", type=float, default=0.1, help="share of entries changed for the re-import")
+    parser.add_argument("--batch-size", type=int, default=10000)
+    args = parser.parse_args()
+
+    from database import db
+    connection = db.connection
+    tables = ("words_bench_executemany", "words_bench_copy")
+    workdir = tempfile.mkdtemp(prefix="dictionary-bench-")
+    export, baseline_export, updated_export = (
+        os.path.join(workdir, name) for name in ("export.csv", "baseline.csv", "updated.csv")
+    )
+    write_export(export, args.rows)
+    write_export(baseline_export, args.baseline_rows)
+    write_export(updated_export, args.rows, changed=args.changed)
+
+    with connection.cursor() as cursor:
+        for table in tables:
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+            cursor.execute(f"CREATE TABLE {table} (LIKE words INCLUDING ALL)")
+    connection.commit()
+
+    results = []
+    try:
+        rows, seconds = bench_executemany(connection, tables[0], baseline_export)
+        results.append(("executemany", rows, seconds, ""))
+        rows, seconds, stats = bench_copy(connection, tables[1], export, args.batch_size)
+        results.append(("copy", rows, seconds, f"{stats['inserted']} inserted"))
+        rows, seconds, stats = bench_copy(connection, tables[1], updated_export, args.batch_size)
+        results.append(("copy-update", rows, seconds, f"{stats['inserted']} inserted, {stats['updated']} updated"))
+    finally:
+        with connection.cursor() as cursor:
+            for table in tables:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+        connection.commit()
+
+    print(f"{'mode':<14}{'rows':>10}{'seconds':>10}{'rows/s':>12}  result")
+    for mode, rows, seconds, note in results:
+        print(f"{mode:<14}{rows:>10}{seconds:>10.2f}{rows / seconds:>12.0f}  {note}")
+
+if __name__ == "__main__":
+    main()
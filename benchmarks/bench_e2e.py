@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark of OldChurchSlavonicBot against fake Telegram and OpenAI servers
+
+Every simulated user walks through onboarding, takes assignments, answers them
+and opens the chronicle. Updates are fed straight into bot.process_update, so
+the numbers are handler latencies including DB, OpenAI and Telegram time.
+
+Needs a PostgreSQL database (PG* environment variables); use a scratch database,
+benchmark users are created with ids starting at --user-id-base.
+
+    python -m benchmarks.bench_e2e --users 50 --openai-latency 0.8 --telegram-latency 0.05
+"""
+
+import argparse
+import asyncio
+import math
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_servers import FakeOpenAIServer, FakeTelegramServer
+from callback_codec import answer_callback
+
+AVATARS = ("vedunia", "bolgar", "starec", "polyak")
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+class UpdateFactory:
+    """Builds Telegram updates for one simulated user"""
+
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.update_ids = iter(range(user_id * 1000, user_id * 1000 + 1000))
+        self.message_id = 1
+        # Callback query ids must be new on every run, processed ones are skipped
+        self.run_id = int(time.time())
+
+    def _user(self):
+        return {"id": self.user_id, "first_name": f"Bench{self.user_id}", "username": f"bench{self.user_id}"}
+
+    def message(self, text):
+        return {
+            "update_id": next(self.update_ids),
+            "message": {
+                "message_id": self.message_id,
+                "from": self._user(),
+                "chat": {"id": self.user_id, "type": "private"},
+                "date": int(time.time()),
+                "text": text
+            }
+        }
+
+    def callback(self, data):
+        update_id = next(self.update_ids)
+        return {
+            "update_id": update_id,
+            "callback_query": {
+                "id": f"cb-{self.run_id}-{update_id}",
+                "from": self._user(),
+                "message": {"message_id": self.message_id, "chat": {"id": self.user_id, "type": "private"}},
+                "data": data
+            }
+        }
+
+
+def journey(factory, assignments, sessions):
+    """Scripted steps of one user: (step name, update); sessions is the bot's quiz session store"""
+    yield "start", factory.message("/start")
+    yield "next_intro", factory.callback("next_intro")
+    yield "level", factory.callback("level_beginner")
+    yield "goal", factory.callback("goal_texts")
+    yield "avatar", factory.callback(f"avatar_{AVATARS[factory.user_id % len(AVATARS)]}")
+    for _ in range(assignments):
+        yield "get_assignment", factory.callback("get_assignment")
+        # Answer buttons carry the nonce of the quiz shown by the previous step
+        session = sessions.get(factory.user_id) or {}
+        yield "answer", factory.callback(answer_callback(session.get("nonce", ""), 0))
+    yield "show_study_plan", factory.callback("show_study_plan")
+    yield "show_progress", factory.callback("show_progress")
+    yield "main_menu", factory.callback("main_menu")
+
+
+async def run_user(bot, user_id, assignments, timings, errors):
+    factory = UpdateFactory(user_id)
+    for step, update in journey(factory, assignments, bot.quiz_sessions):
+        started = time.perf_counter()
+        try:
+            await bot.process_update(update)
+            # Assignments are generated in the background; the step ends when the quiz is shown
+            await bot.generations.wait(user_id)
+        except Exception as e:
+            errors[step] += 1
+            print(f"user {user_id} step {step} failed: {e}", file=sys.stderr)
+        timings[step].append(time.perf_counter() - started)
+
+
+def report(timings, errors, wall_time):
+    all_timings = [value for values in timings.values() for value in values]
+    print(f"\n{'step':<18}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}{'errors':>8}")
+    for step, values in list(timings.items()) + [("TOTAL", all_timings)]:
+        if not values:
+            continue
+        print(
+            f"{step:<18}{len(values):>7}"
+            f"{percentile(values, 0.50) * 1000:>10.1f}"
+            f"{percentile(values, 0.95) * 1000:>10.1f}"
+            f"{percentile(values, 0.99) * 1000:>10.1f}"
+            f"{max(values) * 1000:>10.1f}"
+            f"{errors.get(step, sum(errors.values()) if step == 'TOTAL' else 0):>8}"
+        )
+    print(f"\nWall time: {wall_time:.2f}s, throughput: {len(all_timings) / wall_time:.1f} updates/s, "
+          f"mean latency: {statistics.mean(all_timings) * 1000:.1f} ms")
+
+
+async def main(args):
+    workdir = tempfile.mkdtemp(prefix="bench-e2e-")
+    # handle_avatar_selection reads avatars/*.png relative to the working directory
+    os.makedirs(os.path.join(workdir, "avatars"))
+    for avatar in AVATARS:
+        with open(os.path.join(workdir, "avatars", f"{avatar}.png"), "wb") as image:
+            image.write(b"\x89PNG\r\n\x1a\n" + b"\0" * args.avatar_bytes)
+
+    async with FakeTelegramServer(latency=args.telegram_latency, jitter=args.jitter) as telegram, \
+            FakeOpenAIServer(latency=args.openai_latency, jitter=args.jitter) as openai_server:
+        os.environ.setdefault("TELEGRAM_TOKEN", "bench-token")
+        os.environ["OPENAI_API_KEY"] = "bench-key"
+        os.environ["TELEGRAM_API_URL"] = telegram.url
+        os.environ["OPENAI_BASE_URL"] = f"{openai_server.url}/v1"
+        os.environ.setdefault("TELEGRAM_GLOBAL_RATE", str(args.telegram_rate))
+
+        previous_dir = os.getcwd()
+        os.chdir(workdir)
+        try:
+            from enhanced_bot import OldChurchSlavonicBot
+            bot = OldChurchSlavonicBot(os.environ["TELEGRAM_TOKEN"])
+
+            timings = defaultdict(list)
+            errors = defaultdict(int)
+            started = time.perf_counter()
+            await asyncio.gather(*(
+                run_user(bot, args.user_id_base + index, args.assignments, timings, errors)
+                for index in range(args.users)
+            ))
+            wall_time = time.perf_counter() - started
+            await bot.api.close()
+        finally:
+            os.chdir(previous_dir)
+            shutil.rmtree(workdir, ignore_errors=True)
+
+        report(timings, errors, wall_time)
+        print(f"Telegram requests: {telegram.requests}, OpenAI requests: {openai_server.requests}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--assignments", type=int, default=3, help="assignments per user")
+    parser.add_argument("--telegram-latency", type=float, default=0.05, help="fake Telegram latency, seconds")
+    parser.add_argument("--openai-latency", type=float, default=0.5, help="fake OpenAI latency, seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra random latency, seconds")
+    parser.add_argument("--telegram-rate", type=float, default=1000, help="outbox global rate for the run")
+    parser.add_argument("--avatar-bytes", type=int, default=300_000, help="size of placeholder avatar images")
+    parser.add_argument("--user-id-base", type=int, default=9_000_000_000, help="first simulated user id")
+    return parser.parse_args(argv)
+
+if __name__ == "__main__":
+    asyncio.run(main(parse_args()))
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of the cost of rendering a screen into a Bot API request body
+
+For each screen the inline way the handlers used to build it (keyboard dicts
+and f-strings rebuilt on every call, the whole body serialized by json.dumps)
+is compared with rendering.py (pre-serialized keyboards spliced into the
+body, precompiled text fragments). Both include the digest TelegramAPI takes
+of every edit to skip unchanged ones. No network, database or OpenAI involved.
+
+    python -m benchmarks.bench_render --number 20000
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from callback_codec import answer_callback, new_nonce
+from telegram_api import rendered_digest
+from rendering import (
+    MAIN_MENU_KEYBOARD, QUIZ_RESULT_KEYBOARD, STUDY_PLAN_KEYBOARD, encode_body, lesson_text, level_up_line,
+    answer_keyboard, study_plan_text
+)
+
+CHAT_ID = 123456789
+MESSAGE_ID = 4242
+TOPICS = [
+    {"topic": f"Тема {number}", "description": f"Описание темы {number} для учебного плана.",
+     "current_bloom_level": number % 6 + 1, "is_completed": number < 3}
+    for number in range(1, 11)
+]
+LESSON = "Слово «voda» означает «вода». Оно общее для всех славянских языков. " * 4
+QUESTION = "Как на межславянском будет «вода»?"
+OPTIONS = ["voda", "ogonj", "zemja", "dom"]
+NONCE = new_nonce()
+
+
+def _edit_body(text, reply_markup):
+    rendered_digest(text, reply_markup, "Markdown")
+    return {"chat_id": CHAT_ID, "message_id": MESSAGE_ID, "text": text, "parse_mode": "Markdown",
+            "reply_markup": reply_markup}
+
+
+def _legacy_encode(data):
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def legacy_main_menu():
+    message = "Радуйся, Bench! Что желаеши творити днесь?\n\n"
+    message += "Избери путь свой в учении языка межславянского:"
+    keyboard = {
+        "inline_keyboard": [
+            [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
+            [{"text": "📋 Учебный план", "callback_data": "show_study_plan"}],
+            [{"text": "🔮 Получить заклинание дня", "callback_data": "get_word_ritual"}],
+            [{"text": "📜 Моя летопись", "callback_data": "show_progress"}]
+        ]
+    }
+    return _legacy_encode(_edit_body(message, keyboard))
+
+
+def rendered_main_menu():
+    message = "Радуйся, Bench! Что желаеши творити днесь?\n\nИзбери путь свой в учении языка межславянского:"
+    return encode_body(_edit_body(message, MAIN_MENU_KEYBOARD))
+
+
+def legacy_study_plan():
+    message = "📚 **Ваш учебный план**\n\n"
+    for item in TOPICS:
+        status = "✅" if item["is_completed"] else "🔄" if item["current_bloom_level"] > 1 else "⏳"
+        bloom_stars = "⭐" * item["current_bloom_level"]
+        message += f"{status} **{item['topic']}**\n"
+        message += f"_{item['description']}_\n"
+        message += f"Прогресс: {bloom_stars} ({item['current_bloom_level']}/6)\n\n"
+    keyboard = {
+        "inline_keyboard": [
+            [
+                {"text": "◀️ Предыдущая тема", "callback_data": "prev_topic"},
+                {"text": "Следующая тема ▶️", "callback_data": "next_topic"}
+            ],
+            [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
+            [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
+        ]
+    }
+    return _legacy_encode(_edit_body(message, keyboard))
+
+
+def rendered_study_plan():
+    return encode_body(_edit_body(study_plan_text(TOPICS), STUDY_PLAN_KEYBOARD))
+
+
+def legacy_quiz():
+    bloom_levels = ["Запоминание", "Понимание", "Применение", "Анализ", "Оценка", "Творчество"]
+    message = "📚 **Урок: Тема 1**\n"
+    message += f"**Уровень: {bloom_levels[2 - 1]}** (уровень 2 из 6)\n\n"
+    message += f"{LESSON}\n\n"
+    message += f"❓ **Вопрос 2 из 5:**\n{QUESTION}"
+    keyboard = {"inline_keyboard": []}
+    for i, option in enumerate(OPTIONS):
+        keyboard["inline_keyboard"].append([{"text": option, "callback_data": answer_callback(NONCE, i)}])
+    return _legacy_encode(_edit_body(message, keyboard))
+
+
+def rendered_quiz():
+    message = lesson_text("Тема 1", 2, LESSON, QUESTION, 2, 5)
+    keyboard = answer_keyboard(NONCE, OPTIONS)
+    return encode_body(_edit_body(message, keyboard))
+
+
+def legacy_quiz_result():
+    bloom_levels = ["Запоминание", "Понимание", "Применение", "Анализ", "Оценка", "Творчество"]
+    response = "🎉 **Правильно!**\n\nОтлично, путник!\n\n"
+    response += f"⬆️ Вы перешли на уровень **{bloom_levels[3 - 1]}** (уровень 3 из 6)\n\n"
+    keyboard = {
+        "inline_keyboard": [
+            [{"text": "📖 Получить новое задание", "callback_data": "get_assignment"}],
+            [{"text": "📋 Учебный план", "callback_data": "show_study_plan"}],
+            [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
+        ]
+    }
+    return _legacy_encode({"chat_id": CHAT_ID, "text": response, "parse_mode": "Markdown", "reply_markup": keyboard})
+
+
+def rendered_quiz_result():
+    response = "🎉 **Правильно!**\n\nОтлично, путник!\n\n" + level_up_line(3)
+    return encode_body({"chat_id": CHAT_ID, "text": response, "parse_mode": "Markdown",
+                        "reply_markup": QUIZ_RESULT_KEYBOARD})
+
+
+SCREENS = {
+    "main_menu": (legacy_main_menu, rendered_main_menu),
+    "study_plan": (legacy_study_plan, rendered_study_plan),
+    "quiz": (legacy_quiz, rendered_quiz),
+    "quiz_result": (legacy_quiz_result, rendered_quiz_result),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000, help="renders per measurement")
+    parser.add_argument("--repeat", type=int, default=5, help="measurements per screen, the best is reported")
+    args = parser.parse_args()
+
+    print(f"{'screen':<14}{'inline µs':>11}{'rendering µs':>14}{'speedup':>9}")
+    for screen, (legacy, rendered) in SCREENS.items():
+        # Both ways must produce the same request for Telegram
+        assert json.loads(legacy()) == json.loads(rendered()), screen
+        before = min(timeit.repeat(legacy, number=args.number, repeat=args.repeat)) / args.number
+        after = min(timeit.repeat(rendered, number=args.number, repeat=args.repeat)) / args.number
+        print(f"{screen:<14}{before * 1e6:>11.2f}{after * 1e6:>14.2f}{before / after:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
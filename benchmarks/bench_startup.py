@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Benchmark of process startup: module import times and services.init()
+
+Every import is measured in a fresh interpreter with no Telegram token,
+OpenAI key or database, so it also checks that importing has no side effects.
+services.init() then runs against the fake Telegram and OpenAI servers; the
+database warm-up is included only with --with-db (PG* environment variables).
+
+    python -m benchmarks.bench_startup --runs 5
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.fake_servers import FakeOpenAIServer, FakeTelegramServer
+
+MODULES = ("config", "database", "openai_service", "telegram_api", "enhanced_bot")
+
+IMPORT_SNIPPET = """
+import sys, time
+started = time.perf_counter()
+import {module}
+print(time.perf_counter() - started)
+"""
+
+
+def import_seconds(module):
+    """Seconds to import a module in a fresh interpreter without credentials"""
+    environment = {
+        name: value for name, value in os.environ.items()
+        if name not in ("TELEGRAM_TOKEN", "OPENAI_API_KEY") and not name.startswith("PG")
+    }
+    # An unreachable database makes an accidental connect at import fail instead of hang
+    environment.update(PGHOST="127.0.0.1", PGPORT="1", PYTHONPATH=ROOT, PYTHONDONTWRITEBYTECODE="1")
+    completed = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+        cwd=ROOT, env=environment, capture_output=True, text=True
+    )
+    if completed.returncode:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr.strip()}")
+    return float(completed.stdout.strip().splitlines()[-1])
+
+
+async def bench_init(args):
+    async with FakeTelegramServer(latency=args.telegram_latency) as telegram, \
+            FakeOpenAIServer(latency=args.openai_latency) as openai_server:
+        os.environ.setdefault("TELEGRAM_TOKEN", "bench-token")
+        os.environ["OPENAI_API_KEY"] = "bench-key"
+        os.environ["TELEGRAM_API_URL"] = telegram.url
+        os.environ["OPENAI_BASE_URL"] = f"{openai_server.url}/v1"
+
+        # Imported first so that the timings below are the warm-ups alone
+        import services
+        import openai_service  # noqa: F401
+        from telegram_api import get_telegram_api
+        names = ("database", "openai", "telegram") if args.with_db else ("openai", "telegram")
+        started = time.perf_counter()
+        timings = await services.init(os.environ["TELEGRAM_TOKEN"], names=names)
+        total = time.perf_counter() - started
+        await get_telegram_api(os.environ["TELEGRAM_TOKEN"]).close()
+    return timings, total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per module")
+    parser.add_argument("--with-db", action="store_true", help="include the database warm-up")
+    parser.add_argument("--openai-latency", type=float, default=0.05)
+    parser.add_argument("--telegram-latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    print(f"{'import':<18}{'median ms':>10}{'min ms':>10}")
+    for module in MODULES:
+        samples = [import_seconds(module) for _ in range(args.runs)]
+        print(f"{module:<18}{statistics.median(samples) * 1000:>10.1f}{min(samples) * 1000:>10.1f}")
+
+    timings, total = asyncio.run(bench_init(args))
+    print(f"\n{'warm-up':<18}{'ms':>10}")
+    for name, result in timings.items():
+        value = f"{result * 1000:>10.1f}" if isinstance(result, float) else f"  failed: {result}"
+        print(f"{name:<18}{value}")
+    print(f"{'services.init':<18}{total * 1000:>10.1f}")
+
+if __name__ == "__main__":
+    main()
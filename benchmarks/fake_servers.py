@@ -0,0 +1,250 @@
+"""Local stand-ins for the Telegram Bot API and the OpenAI chat completions API
+
+Both servers speak plain HTTP/1.1 with keep-alive, answer every request after a
+configurable latency and record what they received, so benchmarks can run the
+real bot code without network access or API keys.
+"""
+
+import asyncio
+import email.parser
+import email.policy
+import itertools
+import json
+import random
+import re
+import time
+from urllib.parse import urlsplit
+
+
+class FakeHTTPServer:
+    """Tiny asyncio HTTP/1.1 server; subclasses implement handle()"""
+
+    def __init__(self, latency=0.0, jitter=0.0, host="127.0.0.1", port=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.host = host
+        self.port = port
+        self.server = None
+        self.connections = set()
+        self.requests = 0
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._serve_connection, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            # Idle keep-alive connections would otherwise keep wait_closed() waiting
+            for writer in list(self.connections):
+                writer.close()
+            await self.server.wait_closed()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _read_body(self, reader, headers):
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            body = b""
+            while True:
+                size = int((await reader.readline()).strip(), 16)
+                if size == 0:
+                    await reader.readline()
+                    return body
+                body += await reader.readexactly(size)
+                await reader.readline()
+        length = int(headers.get("content-length", "0"))
+        return await reader.readexactly(length) if length else b""
+
+    async def _serve_connection(self, reader, writer):
+        self.connections.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await self._read_body(reader, headers)
+
+                self.requests += 1
+                delay = self.latency + random.uniform(0, self.jitter)
+                if delay:
+                    await asyncio.sleep(delay)
+                status, payload = await self.handle(method, urlsplit(target), headers, body)
+
+                data = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                writer.write(
+                    f"HTTP/1.1 {status} OK\r\n"
+                    "Content-Type: application/json\r\n"
+                    f"Content-Length: {len(data)}\r\n"
+                    "Connection: keep-alive\r\n\r\n".encode("latin-1") + data
+                )
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.connections.discard(writer)
+            writer.close()
+
+    async def handle(self, method, url, headers, body):
+        raise NotImplementedError
+
+
+def parse_form(content_type, body):
+    """Text fields of a multipart/form-data body and the names of its file parts"""
+    message = email.parser.BytesParser(policy=email.policy.HTTP).parsebytes(
+        f"Content-Type: {content_type}\r\n\r\n".encode("latin-1") + body
+    )
+    fields, files = {}, []
+    for part in message.iter_parts():
+        name = part.get_param("name", header="content-disposition")
+        if part.get_filename():
+            files.append(name)
+        else:
+            fields[name] = part.get_content()
+    return fields, files
+
+
+class FakeTelegramServer(FakeHTTPServer):
+    """Answers Bot API methods with plausible results and records every call"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = []
+        self.pending_updates = []
+        self.message_ids = itertools.count(1000)
+        # Bytes received in multipart (file upload) requests
+        self.uploaded_bytes = 0
+
+    async def handle(self, method, url, headers, body):
+        api_method = url.path.rsplit("/", 1)[-1]
+        data = {}
+        content_type = headers.get("content-type", "")
+        if content_type.startswith("application/json") and body:
+            data = json.loads(body)
+        elif content_type.startswith("multipart/form-data"):
+            self.uploaded_bytes += len(body)
+            data, _ = parse_form(content_type, body)
+            if "media" in data:
+                data["media"] = json.loads(data["media"])
+        self.calls.append((api_method, data))
+
+        if api_method == "getUpdates":
+            updates, self.pending_updates = self.pending_updates, []
+            return 200, {"ok": True, "result": updates}
+        if api_method == "getMe":
+            return 200, {"ok": True, "result": {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}}
+        if api_method in ("sendMessage", "sendPhoto", "editMessageText"):
+            message = {
+                "message_id": data.get("message_id") or next(self.message_ids),
+                "chat": {"id": data.get("chat_id")},
+                "date": int(time.time()),
+                "text": data.get("text", "")
+            }
+            if api_method == "sendPhoto":
+                message["photo"] = [{"file_id": f"fake-file-{message['message_id']}", "width": 512, "height": 512}]
+            return 200, {"ok": True, "result": message}
+        if api_method == "sendMediaGroup":
+            messages = []
+            for item in data.get("media", []):
+                message_id = next(self.message_ids)
+                # Uploads get a new file_id, file_ids are echoed back
+                file_id = item["media"] if not item["media"].startswith("attach://") else f"fake-file-{message_id}"
+                messages.append({
+                    "message_id": message_id,
+                    "chat": {"id": data.get("chat_id")},
+                    "date": int(time.time()),
+                    "caption": item.get("caption", ""),
+                    "photo": [{"file_id": file_id, "width": 512, "height": 512}]
+                })
+            return 200, {"ok": True, "result": messages}
+        return 200, {"ok": True, "result": True}
+
+
+FAKE_STUDY_PLAN = {
+    "study_plan": [
+        {"topic": f"Тема {number}", "description": f"Описание темы {number}.", "bloom_level": 1}
+        for number in range(1, 11)
+    ]
+}
+
+
+def fake_lesson(question_count=1):
+    options = ["voda", "ogonj", "zemja", "dom"]
+    lesson = {
+        "lesson": "Слово «voda» означает «вода». Оно общее для всех славянских языков.",
+        "task_type": "Слово дня",
+        "question": "Как на межславянском будет «вода»?",
+        "options": options,
+        "correct_answer": options[0]
+    }
+    if question_count > 1:
+        lesson["questions"] = [
+            {
+                "question": f"Как на межславянском будет «{meaning}»? ({number})",
+                "options": options,
+                "correct_answer": word
+            }
+            for number, (word, meaning) in enumerate(
+                itertools.islice(itertools.cycle(zip(options, ("вода", "огонь", "земля", "дом"))), question_count), 1
+            )
+        ]
+    return lesson
+
+
+class FakeOpenAIServer(FakeHTTPServer):
+    """OpenAI-compatible /v1/chat/completions returning canned lessons, plans and texts"""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.completions = 0
+
+    def build_content(self, request):
+        prompt = " ".join(message.get("content", "") for message in request.get("messages", []))
+        if "study plan" in prompt.lower():
+            return json.dumps(FAKE_STUDY_PLAN, ensure_ascii=False)
+        if request.get("response_format", {}).get("type") == "json_object":
+            question_count = re.search(r"\((\d+) questions in total\)", prompt)
+            return json.dumps(fake_lesson(int(question_count.group(1)) if question_count else 1), ensure_ascii=False)
+        return "Прими слово сие. Да пребудет с тобой слово сие."
+
+    async def handle(self, method, url, headers, body):
+        if url.path.endswith("/models"):
+            return 200, {"object": "list", "data": [{"id": "gpt-4o", "object": "model", "owned_by": "fake"}]}
+        if not url.path.endswith("/chat/completions"):
+            return 404, {"error": {"message": f"Unknown path {url.path}"}}
+        request = json.loads(body or b"{}")
+        self.completions += 1
+        content = self.build_content(request)
+        prompt_tokens = sum(len(message.get("content", "")) for message in request.get("messages", [])) // 4
+        return 200, {
+            "id": f"chatcmpl-fake-{self.completions}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "gpt-4o"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop"
+            }],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": len(content) // 4,
+                "total_tokens": prompt_tokens + len(content) // 4
+            }
+        }
@@ -7,9 +7,10 @@ except ImportError:
     # Fallback for older versions
     from telegram import ParseMode
 
-from config import TELEGRAM_BOT_TOKEN, logger
+from config import TELEGRAM_BOT_TOKEN, logger, validate_config
 from openai_service import openai_service
 from quiz_handler import quiz_handler
+from callback_codec import answer_callback, parse_answer
 
 class OldChurchSlavonicBot:
     """Main bot class for Inter-Slavic learning"""
@@ -82,7 +83,7 @@ class OldChurchSlavonicBot:
         try:
             if data == "get_assignment":
                 await self.handle_get_assignment(query, user_id)
-            elif data.startswith("answer_"):
+            elif parse_answer(data):
                 await self.handle_quiz_answer(query, user_id, data)
             else:
                 logger.warning(f"Unknown callback data: {data}")
@@ -106,7 +107,7 @@ class OldChurchSlavonicBot:
         
         try:
             # Generate lesson and quiz using OpenAI
-            lesson_data = await openai_service.generate_lesson_and_quiz()
+            lesson_data = await openai_service.generate_lesson_and_quiz(user_id=user_id)
             
             # Create new quiz session
             session = quiz_handler.create_session(user_id, lesson_data)
@@ -119,7 +120,7 @@ class OldChurchSlavonicBot:
             for i, option in enumerate(session.options):
                 keyboard.append([InlineKeyboardButton(
                     option,
-                    callback_data=f"answer_{i}_{option}"
+                    callback_data=answer_callback(session.nonce, i)
                 )])
             
             reply_markup = InlineKeyboardMarkup(keyboard)
@@ -158,14 +159,24 @@ class OldChurchSlavonicBot:
         
         # Parse the answer from callback data
         try:
-            parts = callback_data.split("_", 2)
-            option_index = int(parts[1])
-            user_answer = parts[2]
-        except (IndexError, ValueError):
+            nonce, option_index = parse_answer(callback_data)
+            user_answer = session.options[option_index]
+        except (IndexError, TypeError):
             logger.error(f"Invalid callback data format: {callback_data}")
             await query.answer("Ошибка в формате ответа")
             return
         
+        # The button belongs to an earlier quiz of this user
+        if nonce is not None and nonce != session.nonce:
+            await query.answer("Этот вопрос уже неактуален.")
+            return
+        
+        # Claim the session so that a second tap (possibly on another worker) is ignored
+        session = quiz_handler.claim_session(user_id)
+        if not session:
+            await query.answer("Вы уже ответили на этот вопрос!")
+            return
+        
         # Set user answer
         session.set_user_answer(user_answer)
         is_correct = session.is_correct(user_answer)
@@ -176,7 +187,7 @@ class OldChurchSlavonicBot:
         try:
             # Generate personalized feedback
             feedback = await openai_service.generate_feedback(
-                session.question, user_answer, session.correct_answer, is_correct
+                session.question, user_answer, session.correct_answer, is_correct, user_id=user_id
             )
         except Exception as e:
             logger.error(f"Error generating feedback: {e}")
@@ -207,6 +218,7 @@ class OldChurchSlavonicBot:
 
 def main():
     """Main function to run the bot"""
+    validate_config()
     bot = OldChurchSlavonicBot()
     bot.run()
 
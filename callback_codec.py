@@ -0,0 +1,142 @@
+"""Compact callback_data for inline keyboards and a table-driven callback router
+
+Telegram rejects keyboards whose callback_data is longer than 64 bytes, so
+buttons never carry user-visible text. Versioned callbacks are
+"<version><action>.<field>.<field>", e.g. "1a.skk0x4q7.2" for "answer option 2
+of the quiz session with nonce skk0x4q7". The nonce starts with the time it
+was issued, so an answer to a quiz older than the session TTL is recognised
+from the callback alone, and an answer to an older quiz of the same user by
+comparing nonces.
+"""
+
+import secrets
+import string
+import time
+from collections import namedtuple
+
+VERSION = "1"
+SEPARATOR = "."
+MAX_CALLBACK_BYTES = 64
+
+# Action ids of versioned callbacks
+ACTION_ANSWER = "a"
+
+_ALPHABET = string.digits + string.ascii_lowercase
+_NONCE_RANDOM_CHARS = 2
+
+
+def _base36(number):
+    digits = ""
+    while True:
+        number, digit = divmod(number, 36)
+        digits = _ALPHABET[digit] + digits
+        if not number:
+            return digits
+
+
+def new_nonce():
+    """Quiz session nonce: issue time in seconds (base 36) plus two random characters"""
+    return _base36(int(time.time())) + "".join(secrets.choice(_ALPHABET) for _ in range(_NONCE_RANDOM_CHARS))
+
+
+def nonce_age(nonce):
+    """Seconds since the nonce was issued, or None if it is malformed"""
+    try:
+        return time.time() - int(nonce[:-_NONCE_RANDOM_CHARS], 36)
+    except (TypeError, ValueError):
+        return None
+
+
+def encode(action, *fields):
+    """Versioned callback_data for an action; raises ValueError if it would exceed 64 bytes"""
+    data = VERSION + action + "".join(SEPARATOR + str(field) for field in fields)
+    if len(data.encode("utf-8")) > MAX_CALLBACK_BYTES:
+        raise ValueError(f"callback_data longer than {MAX_CALLBACK_BYTES} bytes: {data!r}")
+    return data
+
+
+def decode(data):
+    """(action, fields) of versioned callback_data, or None for other formats"""
+    if not data.startswith(VERSION) or len(data) <= len(VERSION):
+        return None
+    action, *fields = data[len(VERSION):].split(SEPARATOR)
+    return action, fields
+
+
+def answer_callback(nonce, option_index):
+    """callback_data of a quiz answer button"""
+    return encode(ACTION_ANSWER, nonce, option_index)
+
+
+def parse_answer(data):
+    """(nonce, option_index) of an answer button, or None for other callbacks
+
+    The nonce is None for buttons in the legacy "answer_<index>_<option text>" format.
+    """
+    decoded = decode(data)
+    try:
+        if decoded:
+            action, fields = decoded
+            if action != ACTION_ANSWER or len(fields) != 2:
+                return None
+            return fields[0], int(fields[1])
+        if data.startswith("answer_"):
+            return None, int(data.split("_", 2)[1])
+    except (IndexError, ValueError):
+        pass
+    return None
+
+
+# A callback query as handed to the registered handlers
+CallbackQuery = namedtuple("CallbackQuery", "id chat_id message_id user_id data args")
+
+
+class CallbackRouter:
+    """Dispatch table from callback_data to handlers, filled with decorators
+
+    Handlers are registered for an exact callback_data ("get_assignment"),
+    for a prefix ending in "_" ("level_" matches "level_beginner" with the
+    rest as the argument) or for a versioned action id (the fields are the
+    arguments). Every lookup is a dict access. With ack=False the handler
+    answers the callback query itself (e.g. to show an alert).
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.prefixes = {}
+        self.actions = {}
+
+    def on(self, data, ack=True):
+        return self._register(self.routes, data, ack)
+
+    def prefix(self, prefix, ack=True):
+        if not prefix.endswith("_"):
+            raise ValueError(f"Callback prefix must end with '_': {prefix!r}")
+        return self._register(self.prefixes, prefix, ack)
+
+    def action(self, action, ack=True):
+        return self._register(self.actions, action, ack)
+
+    @staticmethod
+    def _register(table, key, ack):
+        if key in table:
+            raise ValueError(f"Callback route {key!r} is already registered")
+
+        def decorator(handler):
+            table[key] = (handler, ack)
+            return handler
+        return decorator
+
+    def resolve(self, data):
+        """(handler, ack, args) for callback_data, or None if nothing handles it"""
+        route = self.routes.get(data)
+        if route:
+            return route + ([],)
+        decoded = decode(data)
+        if decoded:
+            action, fields = decoded
+            route = self.actions.get(action)
+            return route + (fields,) if route else None
+        prefix, separator, rest = data.partition("_")
+        route = self.prefixes.get(prefix + separator)
+        return route + ([rest],) if route else None
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import deque
+from config import logger
+from metrics import registry
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+_STATE_VALUES = {STATE_CLOSED: 0, STATE_HALF_OPEN: 1, STATE_OPEN: 2}
+
+breaker_state = registry.gauge("circuit_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)")
+breaker_rejections = registry.counter("circuit_breaker_rejections_total", "Calls rejected while a circuit breaker was open")
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency while its circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """Count-based circuit breaker over the last `window` calls
+
+    The breaker opens when, after at least `min_calls` calls, the share of
+    failures reaches `error_rate` or the share of calls slower than
+    `slow_seconds` reaches `slow_rate`. After `open_seconds` it lets up to
+    `probes` calls through (half-open): if they all succeed quickly it closes,
+    any failure opens it again.
+    """
+
+    def __init__(self, name, error_rate=0.5, slow_seconds=15.0, slow_rate=0.8,
+                 window=20, min_calls=5, open_seconds=30.0, probes=1):
+        self.name = name
+        self.error_rate = error_rate
+        self.slow_seconds = slow_seconds
+        self.slow_rate = slow_rate
+        self.min_calls = min_calls
+        self.open_seconds = open_seconds
+        self.probes = probes
+        # (failed, slow) per recent call
+        self.outcomes = deque(maxlen=window)
+        self.lock = threading.Lock()
+        self.state = STATE_CLOSED
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self.probe_successes = 0
+        breaker_state.set(0, name=name)
+
+    @property
+    def is_open(self):
+        """True while calls are being rejected (open and the cool-down has not elapsed)"""
+        return self.state == STATE_OPEN and time.monotonic() - self.opened_at < self.open_seconds
+
+    def _set_state(self, state):
+        if state != self.state:
+            logger.warning(f"Circuit breaker '{self.name}': {self.state} -> {state}")
+            self.state = state
+            breaker_state.set(_STATE_VALUES[state], name=self.name)
+
+    def before_call(self):
+        """Reserve a call; raises CircuitOpenError if the breaker rejects it"""
+        with self.lock:
+            if self.state == STATE_OPEN:
+                if time.monotonic() - self.opened_at < self.open_seconds:
+                    breaker_rejections.inc(name=self.name)
+                    raise CircuitOpenError(f"{self.name} is unavailable")
+                self._set_state(STATE_HALF_OPEN)
+                self.probes_in_flight = 0
+                self.probe_successes = 0
+            if self.state == STATE_HALF_OPEN:
+                if self.probes_in_flight >= self.probes:
+                    breaker_rejections.inc(name=self.name)
+                    raise CircuitOpenError(f"{self.name} is being probed")
+                self.probes_in_flight += 1
+
+    def record(self, latency, failed=False):
+        """Report the outcome of a call reserved with before_call()"""
+        slow = latency >= self.slow_seconds
+        with self.lock:
+            if self.state == STATE_HALF_OPEN:
+                self.probes_in_flight -= 1
+                if failed or slow:
+                    self._open()
+                else:
+                    self.probe_successes += 1
+                    if self.probe_successes >= self.probes:
+                        self.outcomes.clear()
+                        self._set_state(STATE_CLOSED)
+                return
+
+            self.outcomes.append((failed, slow))
+            if self.state == STATE_CLOSED and len(self.outcomes) >= self.min_calls:
+                failures = sum(1 for outcome in self.outcomes if outcome[0])
+                slow_calls = sum(1 for outcome in self.outcomes if outcome[1])
+                if failures >= self.error_rate * len(self.outcomes) or slow_calls >= self.slow_rate * len(self.outcomes):
+                    self._open()
+
+    def release(self):
+        """Give back a call reserved with before_call() that ended without an outcome (cancelled)"""
+        with self.lock:
+            if self.state == STATE_HALF_OPEN and self.probes_in_flight:
+                self.probes_in_flight -= 1
+
+    def _open(self):
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        self._set_state(STATE_OPEN)
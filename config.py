@@ -1,4 +1,5 @@
 import os
+import json
 import logging
 from dotenv import load_dotenv
 
@@ -16,12 +17,112 @@ logger = logging.getLogger(__name__)
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_TOKEN", "")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 
-# Validate required environment variables
-if not TELEGRAM_BOT_TOKEN:
-    raise ValueError("TELEGRAM_BOT_TOKEN environment variable is required")
+# Required environment variables; checked by validate_config() when a bot or sender starts,
+# so that importing modules (tests, benchmarks, tools) works without them
+REQUIRED_SETTINGS = {"TELEGRAM_TOKEN": TELEGRAM_BOT_TOKEN, "OPENAI_API_KEY": OPENAI_API_KEY}
 
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable is required")
+
+def validate_config(*names):
+    """Raise ValueError if any of the required settings (all by default) is missing"""
+    missing = [name for name in names or REQUIRED_SETTINGS if not REQUIRED_SETTINGS.get(name)]
+    if missing:
+        raise ValueError(f"Required environment variables are not set: {', '.join(missing)}")
+
+# Хранилище сессий викторины: memory, postgres, redis или redis-local
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "86400"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Шардированный запуск: число воркеров и общий бюджет параллельных запросов к OpenAI
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", str(os.cpu_count() or 1)))
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "16"))
+
+# Ограничения исходящих запросов к Telegram (сообщений в секунду)
+TELEGRAM_GLOBAL_RATE = float(os.getenv("TELEGRAM_GLOBAL_RATE", "30"))
+TELEGRAM_PER_CHAT_RATE = float(os.getenv("TELEGRAM_PER_CHAT_RATE", "1"))
+TELEGRAM_PER_CHAT_BURST = int(os.getenv("TELEGRAM_PER_CHAT_BURST", "3"))
+TELEGRAM_MAX_RETRIES = int(os.getenv("TELEGRAM_MAX_RETRIES", "3"))
+
+# HTTP-клиент Telegram: адрес API, пул соединений и таймауты (секунды)
+TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "https://api.telegram.org")
+TELEGRAM_MAX_CONNECTIONS = int(os.getenv("TELEGRAM_MAX_CONNECTIONS", "50"))
+TELEGRAM_MAX_KEEPALIVE = int(os.getenv("TELEGRAM_MAX_KEEPALIVE", "20"))
+TELEGRAM_SEND_TIMEOUT = float(os.getenv("TELEGRAM_SEND_TIMEOUT", "15"))
+TELEGRAM_POLL_TIMEOUT = int(os.getenv("TELEGRAM_POLL_TIMEOUT", "30"))
+
+# Сколько последних отрисованных сообщений помнить, чтобы не отправлять повторные одинаковые правки
+TELEGRAM_RENDER_CACHE_SIZE = int(os.getenv("TELEGRAM_RENDER_CACHE_SIZE", "10000"))
+
+# Метрики: порт локального эндпоинта /metrics (0 — выключен) и период сводки в логе (секунды)
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_LOG_INTERVAL = int(os.getenv("METRICS_LOG_INTERVAL", "300"))
+
+# Учёт токенов OpenAI: период сброса в таблицу llm_usage (секунды), размер пачки
+# и дневной лимит токенов на пользователя (0 — без лимита)
+LLM_USAGE_FLUSH_INTERVAL = int(os.getenv("LLM_USAGE_FLUSH_INTERVAL", "30"))
+LLM_USAGE_BATCH_SIZE = int(os.getenv("LLM_USAGE_BATCH_SIZE", "200"))
+LLM_USER_DAILY_TOKEN_BUDGET = int(os.getenv("LLM_USER_DAILY_TOKEN_BUDGET", "0"))
+
+# Смещение getUpdates сохраняется в bot_state каждые N обновлений или T секунд;
+# повторно доставленные обновления и нажатия кнопок пропускаются
+UPDATE_OFFSET_FLUSH_EVERY = int(os.getenv("UPDATE_OFFSET_FLUSH_EVERY", "50"))
+UPDATE_OFFSET_FLUSH_INTERVAL = float(os.getenv("UPDATE_OFFSET_FLUSH_INTERVAL", "5"))
+RECENT_UPDATES_SIZE = int(os.getenv("RECENT_UPDATES_SIZE", "10000"))
+PROCESSED_CALLBACK_TTL_HOURS = int(os.getenv("PROCESSED_CALLBACK_TTL_HOURS", "48"))
+
+# Маршрутизация моделей OpenAI по типу генерации (и уровню Блума для уроков: ключ "lesson:<уровень>").
+# timeout — секунды на попытку; при таймауте запрос повторяется на fallback-модели (None — без повтора).
+# Переопределяется JSON-объектом в переменной окружения MODEL_ROUTES, например
+# MODEL_ROUTES='{"feedback": {"model": "gpt-4o"}}'
+MODEL_ROUTES = {
+    "lesson": {"model": "gpt-4o-mini", "max_tokens": 800, "temperature": 0.7, "timeout": 20, "fallback": None},
+    "lesson:4": {"model": "gpt-4o", "max_tokens": 1000, "temperature": 0.7, "timeout": 25, "fallback": "gpt-4o-mini"},
+    "lesson:5": {"model": "gpt-4o", "max_tokens": 1000, "temperature": 0.7, "timeout": 25, "fallback": "gpt-4o-mini"},
+    "lesson:6": {"model": "gpt-4o", "max_tokens": 1000, "temperature": 0.8, "timeout": 25, "fallback": "gpt-4o-mini"},
+    "feedback": {"model": "gpt-4o-mini", "max_tokens": 150, "temperature": 0.6, "timeout": 8, "fallback": None},
+    "study_plan": {"model": "gpt-4o", "max_tokens": 2000, "temperature": 0.7, "timeout": 45, "fallback": "gpt-4o-mini"},
+    "ritual": {"model": "gpt-4o-mini", "max_tokens": 250, "temperature": 0.7, "timeout": 10, "fallback": None},
+}
+for _route_key, _route in json.loads(os.getenv("MODEL_ROUTES", "{}")).items():
+    MODEL_ROUTES[_route_key] = {**MODEL_ROUTES.get(_route_key.split(":")[0], {}), **MODEL_ROUTES.get(_route_key, {}), **_route}
+
+# Предохранитель OpenAI: доля ошибок или медленных (> OPENAI_BREAKER_SLOW_SECONDS) вызовов
+# среди последних OPENAI_BREAKER_WINDOW, после которой запросы не отправляются OPENAI_BREAKER_OPEN_SECONDS
+# секунд, а задания выдаются из банка уроков
+OPENAI_BREAKER_ERROR_RATE = float(os.getenv("OPENAI_BREAKER_ERROR_RATE", "0.5"))
+OPENAI_BREAKER_SLOW_SECONDS = float(os.getenv("OPENAI_BREAKER_SLOW_SECONDS", "15"))
+OPENAI_BREAKER_SLOW_RATE = float(os.getenv("OPENAI_BREAKER_SLOW_RATE", "0.8"))
+OPENAI_BREAKER_WINDOW = int(os.getenv("OPENAI_BREAKER_WINDOW", "20"))
+OPENAI_BREAKER_MIN_CALLS = int(os.getenv("OPENAI_BREAKER_MIN_CALLS", "5"))
+OPENAI_BREAKER_OPEN_SECONDS = float(os.getenv("OPENAI_BREAKER_OPEN_SECONDS", "30"))
+
+# Сколько вопросов запрашивать у OpenAI за один урок; остальные выдаются из сессии без нового запроса
+QUESTIONS_PER_LESSON = int(os.getenv("QUESTIONS_PER_LESSON", "5"))
+
+# Предварительная генерация следующего урока, пока пользователь отвечает: сколько секунд готовый
+# урок ждёт в памяти (0 — выключено) и готовить ли урок и после неверного ответа
+PREFETCH_TTL_SECONDS = int(os.getenv("PREFETCH_TTL_SECONDS", "600"))
+PREFETCH_ON_WRONG_ANSWER = os.getenv("PREFETCH_ON_WRONG_ANSWER", "1") == "1"
+
+# Уровни Блума, задания для которых собираются локально из словаря, без запроса к OpenAI
+# (пустая строка — всегда OpenAI), размер пула слов в памяти и как часто его обновлять (секунды)
+LOCAL_EXERCISE_BLOOM_LEVELS = frozenset(
+    int(level) for level in os.getenv("LOCAL_EXERCISE_BLOOM_LEVELS", "1,2").split(",") if level.strip()
+)
+EXERCISE_WORD_POOL_SIZE = int(os.getenv("EXERCISE_WORD_POOL_SIZE", "5000"))
+EXERCISE_POOL_TTL_SECONDS = int(os.getenv("EXERCISE_POOL_TTL_SECONDS", "3600"))
+
+# Индекс дистракторов (похожих слов для неверных вариантов ответа), собираемый офлайн
+# командой python distractor_index.py, и сколько дистракторов хранится для каждого слова
+DISTRACTOR_INDEX_PATH = os.getenv("DISTRACTOR_INDEX_PATH", "distractors.idx")
+DISTRACTORS_PER_WORD = int(os.getenv("DISTRACTORS_PER_WORD", "8"))
+
+# Уровни Блума, на которых ответ вводится сообщением, а не выбирается кнопкой (например "3"); для них
+# OpenAI просят короткие ответы из одного слова или фразы, а ответ проверяется локально с учётом
+# кириллицы/латиницы, диакритики, порядка слов и опечаток. По умолчанию выключено — только кнопки
+TYPED_ANSWER_BLOOM_LEVELS = frozenset(
+    int(level) for level in os.getenv("TYPED_ANSWER_BLOOM_LEVELS", "").split(",") if level.strip()
+)
 
 # Количество правильных ответов, необходимых для перехода на следующий уровень Блума
 # Индекс 0 не используется, так как уровни начинаются с 1
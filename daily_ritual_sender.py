@@ -2,36 +2,25 @@
 
 import asyncio
 import logging
-import json
-import httpx
 from datetime import datetime
 from database import db
 from openai_service import openai_service
+from llm_usage import usage_tracker
+from telegram_api import get_telegram_api
+from telegram_outbox import PRIORITY_PUSH
+from rendering import RITUAL_KEYBOARD
+import services
 from config import TELEGRAM_BOT_TOKEN, logger
 
 class DailyRitualSender:
     def __init__(self, token):
         self.token = token
-        self.base_url = f"https://api.telegram.org/bot{token}"
-        self.session = httpx.AsyncClient(timeout=60.0)
+        self.api = get_telegram_api(token)
     
     async def send_message(self, chat_id, text, reply_markup=None):
         """Send a message to a chat"""
-        data = {
-            "chat_id": chat_id,
-            "text": text,
-            "parse_mode": "Markdown"
-        }
-        if reply_markup:
-            data["reply_markup"] = json.dumps(reply_markup)
-        
-        try:
-            response = await self.session.post(f"{self.base_url}/sendMessage", data=data)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Failed to send message to {chat_id}: {e}")
-            return {"ok": False}
+        # Broadcasts go with the lowest priority; the outbox enforces Telegram rate limits
+        return await self.api.send_message(chat_id, text, reply_markup, priority=PRIORITY_PUSH)
     
     async def generate_ritual_message(self, user_id):
         """Generate a ritual message for a user"""
@@ -44,28 +33,24 @@ class DailyRitualSender:
                 return None
             
             # Get the word and its meaning
-            word = word_data.get('word', '')
-            meaning = word_data.get('meaning_ru', '')
+            word = word_data.get('isv', '')
+            meaning = word_data.get('ru', '')
             
             # Get user avatar for personalized content
             user_data = db.get_user(user_id)
             avatar = user_data.get('avatar') if user_data else None
             
-            # Generate ritual text using OpenAI
-            ritual_text = await openai_service.generate_word_ritual(word, meaning, avatar)
+            # Use a pre-generated text from the nightly batch if there is one, otherwise ask OpenAI
+            ritual_text = db.get_bank_ritual(word, avatar)
+            if not ritual_text:
+                ritual_text = await openai_service.generate_word_ritual(word, meaning, avatar, user_id=user_id)
             
             # Format the ritual message
             message = f"🔮 **Ритуал словеси**\n\n"
             message += f"{ritual_text}"
             
             # Create keyboard with options
-            keyboard = {
-                "inline_keyboard": [
-                    [{"text": "🔮 Получить новое заклинание", "callback_data": "get_word_ritual"}],
-                    [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
-                    [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
-                ]
-            }
+            keyboard = RITUAL_KEYBOARD
             
             return {"message": message, "keyboard": keyboard}
             
@@ -101,9 +86,6 @@ class DailyRitualSender:
                     ritual_data["message"], 
                     ritual_data["keyboard"]
                 )
-                
-                # Sleep a bit to avoid hitting Telegram API rate limits
-                await asyncio.sleep(0.1)
             
             logger.info("Daily ritual sending completed")
             
@@ -111,12 +93,14 @@ class DailyRitualSender:
             logger.error(f"Error sending daily ritual: {e}")
     
     async def close(self):
-        """Close the HTTP session"""
-        await self.session.aclose()
+        """Flush OpenAI usage records and close the Telegram client"""
+        usage_tracker.flush()
+        await self.api.close()
 
 async def main():
     """Main function to send daily rituals"""
     logger.info("Starting daily ritual sender")
+    await services.init(TELEGRAM_BOT_TOKEN)
     
     # Create sender instance
     sender = DailyRitualSender(TELEGRAM_BOT_TOKEN)
@@ -1,7 +1,8 @@
 import os
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, Json, execute_values
 from config import logger
+from metrics import instrument_methods
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -20,25 +21,54 @@ class Database:
         }
         logger.info(f"Database connection params: host={os.getenv('PGHOST')}, db={os.getenv('PGDATABASE')}, user={os.getenv('PGUSER')}, port={os.getenv('PGPORT')}")
 
-        self.connection = None
-        self.connect()
-        self.create_tables()
+        # Nothing is opened here: importing the module must stay cheap and work without a database
+        self._connection = None
+        self.tables_ready = False
+    
+    @property
+    def connection(self):
+        """The PostgreSQL connection, opened on first use"""
+        if self._connection is None:
+            self.connect()
+        return self._connection
+    
+    def init(self):
+        """Connect and create the tables now rather than on the first query"""
+        self.ensure_connection()
+        return self.tables_ready
     
     def connect(self):
-        """Connect to PostgreSQL database"""
+        """Connect to PostgreSQL database; the first connection also creates the tables"""
         try:
-            if self.connection:
-                self.connection.close()
-            self.connection = psycopg2.connect(**self.connection_params)
+            if self._connection:
+                self._connection.close()
+                # A failed reconnect must not leave the closed connection behind
+                self._connection = None
+            self._connection = psycopg2.connect(**self.connection_params)
             logger.info("Connected to PostgreSQL database")
         except Exception as e:
             logger.error(f"Database connection failed: {e}")
             raise
+        if not self.tables_ready:
+            self.create_tables()
+    
+    def rollback(self):
+        """Roll back the failed transaction; without an open connection there is nothing to roll back
+        
+        Error handlers call this instead of self.connection.rollback(): the lazy property
+        would try to reconnect and raise again while the database is unreachable.
+        """
+        if self._connection is None or self._connection.closed:
+            return
+        try:
+            self._connection.rollback()
+        except Exception as e:
+            logger.warning(f"Rollback failed: {e}")
     
     def ensure_connection(self):
         """Ensure database connection is alive"""
         try:
-            if not self.connection or self.connection.closed:
+            if not self._connection or self._connection.closed:
                 self.connect()
             else:
                 # Test connection
@@ -150,25 +180,160 @@ class Database:
                     )
                 """)
                 
-                # Words table for the "Ritual of the Word" feature
+                # Interslavic dictionary for lessons and the "Ritual of the Word" feature,
+                # filled by dictionary_importer.py; (isv, addition, part_of_speech) is the natural key
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS words (
                         id SERIAL PRIMARY KEY,
-                        word VARCHAR(255) NOT NULL,
-                        meaning_ru TEXT,
-                        part_of_speech VARCHAR(50),
+                        source_id INTEGER,
+                        isv VARCHAR(255) NOT NULL,
+                        addition VARCHAR(255) NOT NULL DEFAULT '',
+                        part_of_speech VARCHAR(50) NOT NULL DEFAULT '',
+                        ru TEXT,
+                        en TEXT,
                         level VARCHAR(50),
                         tag VARCHAR(100),
-                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                     )
                 """)
                 
+                # Migrate the original words table (word, meaning_ru, part_of_speech)
+                cursor.execute("""
+                    DO $$
+                    BEGIN
+                        IF EXISTS (
+                            SELECT 1 FROM information_schema.columns
+                            WHERE table_name = 'words' AND column_name = 'word'
+                        ) THEN
+                            ALTER TABLE words RENAME COLUMN word TO isv;
+                            ALTER TABLE words RENAME COLUMN meaning_ru TO ru;
+                            ALTER TABLE words
+                                ADD COLUMN source_id INTEGER,
+                                ADD COLUMN addition VARCHAR(255) NOT NULL DEFAULT '',
+                                ADD COLUMN en TEXT,
+                                ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+                            UPDATE words SET part_of_speech = '' WHERE part_of_speech IS NULL;
+                            ALTER TABLE words
+                                ALTER COLUMN part_of_speech SET DEFAULT '',
+                                ALTER COLUMN part_of_speech SET NOT NULL;
+                        END IF;
+                    END $$
+                """)
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS words_natural_key ON words (isv, addition, part_of_speech)
+                """)
+                
+                # Quiz sessions shared between bot workers
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS quiz_sessions (
+                        user_id BIGINT PRIMARY KEY,
+                        data BYTEA NOT NULL,
+                        answered BOOLEAN DEFAULT FALSE,
+                        nonce VARCHAR(32),
+                        expires_at TIMESTAMP NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                cursor.execute("ALTER TABLE quiz_sessions ADD COLUMN IF NOT EXISTS nonce VARCHAR(32)")
+
+                # OpenAI usage per call, flushed in batches by llm_usage.UsageTracker
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS llm_usage (
+                        id BIGSERIAL PRIMARY KEY,
+                        user_id BIGINT,
+                        feature VARCHAR(50) NOT NULL,
+                        model VARCHAR(100) NOT NULL,
+                        prompt_tokens INTEGER DEFAULT 0,
+                        completion_tokens INTEGER DEFAULT 0,
+                        cached_tokens INTEGER DEFAULT 0,
+                        latency_ms INTEGER,
+                        status VARCHAR(20) NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS llm_usage_user_created_idx
+                    ON llm_usage (user_id, created_at)
+                """)
+
+                # Validated generated lessons, served while OpenAI is unavailable
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS lesson_bank (
+                        id SERIAL PRIMARY KEY,
+                        topic VARCHAR(255) NOT NULL,
+                        bloom_level INTEGER NOT NULL,
+                        data JSONB NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                cursor.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS lesson_bank_question_idx
+                    ON lesson_bank (topic, bloom_level, md5(data->>'question'))
+                """)
+
+                # Pre-generated ritual texts per word and avatar (filled by batch_generation)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS ritual_bank (
+                        id SERIAL PRIMARY KEY,
+                        word VARCHAR(255) NOT NULL,
+                        avatar VARCHAR(50) NOT NULL DEFAULT '',
+                        text TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS ritual_bank_word_idx ON ritual_bank (word, avatar)
+                """)
+
+                # Telegram file_ids of uploaded media, so each file is uploaded only once
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS telegram_files (
+                        name VARCHAR(255) PRIMARY KEY,
+                        digest VARCHAR(64) NOT NULL,
+                        file_id TEXT NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+
+                # Persistent bot state, e.g. the getUpdates offset
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS bot_state (
+                        name VARCHAR(100) PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+
+                # Updates received by the sharded runner and not handled yet, so that polling can move on
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS pending_updates (
+                        bot VARCHAR(100) NOT NULL,
+                        update_id BIGINT NOT NULL,
+                        data JSONB NOT NULL,
+                        received_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (bot, update_id)
+                    )
+                """)
+
+                # Callback queries already handled, so redelivered updates are not processed twice
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS processed_callbacks (
+                        callback_query_id VARCHAR(64) PRIMARY KEY,
+                        processed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                """)
+                cursor.execute("""
+                    CREATE INDEX IF NOT EXISTS processed_callbacks_processed_at
+                    ON processed_callbacks (processed_at)
+                """)
+
                 # Check if words table is empty and populate it with some initial words
                 cursor.execute("SELECT COUNT(*) FROM words")
                 word_count = cursor.fetchone()[0]
                 
                 if word_count == 0:
-                    # Populate with some initial words
+                    # Populate with some initial words until the full dictionary is imported
                     initial_words = [
                         ("svoboda", "свобода, воля", "n.", "beginner", "basic"),
                         ("ljubiti", "любить", "v.", "beginner", "basic"),
@@ -192,9 +357,9 @@ class Database:
                         ("zlo", "зло", "n.", "beginner", "basic"),
                     ]
                     
-                    cursor.executemany("""
-                        INSERT INTO words (word, meaning_ru, part_of_speech, level, tag)
-                        VALUES (%s, %s, %s, %s, %s)
+                    execute_values(cursor, """
+                        INSERT INTO words (isv, ru, part_of_speech, level, tag) VALUES %s
+                        ON CONFLICT (isv, addition, part_of_speech) DO NOTHING
                     """, initial_words)
                     
                     logger.info(f"Populated words table with {len(initial_words)} initial words")
@@ -202,9 +367,10 @@ class Database:
                 
                 self.connection.commit()
                 logger.info("Database tables created successfully")
+                self.tables_ready = True
         except Exception as e:
             logger.error(f"Failed to create tables: {e}")
-            self.connection.rollback()
+            self.rollback()
     
     def save_user(self, user_id, username=None, first_name=None, level=None, goal=None, avatar=None):
         """Save or update user information"""
@@ -227,7 +393,7 @@ class Database:
                 logger.info(f"User {user_id} saved successfully")
         except Exception as e:
             logger.error(f"Failed to save user: {e}")
-            self.connection.rollback()
+            self.rollback()
     
     def get_user(self, user_id):
         """Get user information"""
@@ -253,7 +419,7 @@ class Database:
                 logger.info(f"Progress saved for user {user_id}")
         except Exception as e:
             logger.error(f"Failed to save progress: {e}")
-            self.connection.rollback()
+            self.rollback()
     
     def get_user_progress(self, user_id):
         """Get user progress history"""
@@ -360,7 +526,7 @@ class Database:
                 return study_plan_id
         except Exception as e:
             logger.error(f"Failed to save study plan: {e}")
-            self.connection.rollback()
+            self.rollback()
             return None
     
     def get_user_study_plan(self, user_id):
@@ -566,11 +732,11 @@ class Database:
                         return True
                     except Exception as e:
                         logger.warning(f"Failed to add current_topic_id column: {e}")
-                        self.connection.rollback()
+                        self.rollback()
                         return False
         except Exception as e:
             logger.error(f"Failed to set current topic: {e}")
-            self.connection.rollback()
+            self.rollback()
             return False
     
     def update_topic_progress(self, user_id, topic_id, new_bloom_level, is_completed, is_correct=False):
@@ -635,7 +801,7 @@ class Database:
                 return True
         except Exception as e:
             logger.error(f"Failed to update topic progress: {e}")
-            self.connection.rollback()
+            self.rollback()
             return False
     
     def get_topic_name(self, topic_id):
@@ -664,14 +830,47 @@ class Database:
         try:
             self.ensure_connection()
             with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
-                # Получаем случайные слова из словаря
-                query = "SELECT * FROM words ORDER BY RANDOM() LIMIT %s"
+                # Получаем случайные слова из словаря с ключами, которые ожидает промпт урока
+                query = """
+                    SELECT id, isv, addition, part_of_speech AS "partOfSpeech", ru, en, level, tag
+                    FROM words ORDER BY RANDOM() LIMIT %s
+                """
                 cursor.execute(query, [count])
                 return cursor.fetchall()
         except Exception as e:
             logger.error(f"Failed to get random words: {e}")
             return []
             
+    def get_exercise_words(self, count=5000):
+        """Random words with a Russian translation, for locally built exercises"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT id, isv, addition, part_of_speech AS "partOfSpeech", ru, level
+                    FROM words WHERE ru IS NOT NULL AND ru <> ''
+                    ORDER BY RANDOM() LIMIT %s
+                """, (count,))
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to get exercise words: {e}")
+            return []
+            
+    def get_dictionary_words(self):
+        """Every word with a Russian translation, for building the distractor index"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT id, isv, part_of_speech AS "partOfSpeech", ru
+                    FROM words WHERE ru IS NOT NULL AND ru <> ''
+                    ORDER BY id
+                """)
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to get dictionary words: {e}")
+            return []
+            
     def get_random_word_for_ritual(self):
         """Get a single random word for the 'Ritual of the Word' feature
         
@@ -682,15 +881,18 @@ class Database:
             self.ensure_connection()
             with self.connection.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cursor:
                 # Get a random word from the dictionary
-                query = "SELECT * FROM words ORDER BY RANDOM() LIMIT 1"
+                query = """
+                    SELECT id, isv, addition, part_of_speech AS "partOfSpeech", ru, en, level, tag
+                    FROM words WHERE ru IS NOT NULL AND ru <> '' ORDER BY RANDOM() LIMIT 1
+                """
                 cursor.execute(query)
                 word = cursor.fetchone()
                 
                 # If no word found, return a default word
                 if not word:
                     return {
-                        "word": "svoboda",
-                        "meaning_ru": "свобода, воля"
+                        "isv": "svoboda",
+                        "ru": "свобода, воля"
                     }
                     
                 return word
@@ -698,8 +900,8 @@ class Database:
             logger.error(f"Failed to get random word for ritual: {e}")
             # Return a default word if there's an error
             return {
-                "word": "svoboda",
-                "meaning_ru": "свобода, воля"
+                "isv": "svoboda",
+                "ru": "свобода, воля"
             }
             
     def get_all_active_users(self):
@@ -795,7 +997,7 @@ class Database:
                 return True
         except Exception as e:
             logger.error(f"Failed to update progress: {e}")
-            self.connection.rollback()
+            self.rollback()
             return False
 
     def get_current_topic(self, user_id):
@@ -921,8 +1123,380 @@ class Database:
                 return True
         except Exception as e:
             logger.error(f"Failed to set current topic: {e}")
-            self.connection.rollback()
+            self.rollback()
             return False
 
-# Global database instance
+    def save_quiz_session(self, user_id, data, answered, ttl_seconds, nonce=None):
+        """Create or replace a serialized quiz session"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO quiz_sessions (user_id, data, answered, nonce, expires_at)
+                    VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+                    ON CONFLICT (user_id)
+                    DO UPDATE SET
+                        data = EXCLUDED.data,
+                        answered = EXCLUDED.answered,
+                        nonce = EXCLUDED.nonce,
+                        expires_at = EXCLUDED.expires_at,
+                        updated_at = CURRENT_TIMESTAMP
+                """, (user_id, psycopg2.Binary(data), answered, nonce, ttl_seconds))
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to save quiz session: {e}")
+            self.rollback()
+            return False
+
+    def get_quiz_session(self, user_id):
+        """Get a serialized quiz session if it has not expired"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT data, answered FROM quiz_sessions
+                    WHERE user_id = %s AND expires_at > CURRENT_TIMESTAMP
+                """, (user_id,))
+                return cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Failed to get quiz session: {e}")
+            return None
+
+    def claim_quiz_session(self, user_id, nonce=None):
+        """Atomically mark a quiz session as answered; with a nonce, only the session with that nonce
+
+        Returns:
+        bytes: The serialized session, or None if it is missing, expired or already answered
+        """
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    UPDATE quiz_sessions
+                    SET answered = TRUE, updated_at = CURRENT_TIMESTAMP
+                    WHERE user_id = %s AND NOT answered AND expires_at > CURRENT_TIMESTAMP
+                      AND (%s::text IS NULL OR nonce = %s)
+                    RETURNING data
+                """, (user_id, nonce, nonce))
+                result = cursor.fetchone()
+                self.connection.commit()
+                return bytes(result[0]) if result else None
+        except Exception as e:
+            logger.error(f"Failed to claim quiz session: {e}")
+            self.rollback()
+            return None
+
+    def delete_quiz_session(self, user_id):
+        """Delete a quiz session"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("DELETE FROM quiz_sessions WHERE user_id = %s", (user_id,))
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to delete quiz session: {e}")
+            self.rollback()
+            return False
+
+    def save_llm_usage(self, records):
+        """Insert a batch of OpenAI usage records
+
+        Parameters:
+        records (list): Tuples of (user_id, feature, model, prompt_tokens,
+                        completion_tokens, cached_tokens, latency_ms, status, created_at)
+        """
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO llm_usage (
+                        user_id, feature, model, prompt_tokens, completion_tokens,
+                        cached_tokens, latency_ms, status, created_at
+                    ) VALUES %s
+                """, records)
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to save LLM usage: {e}")
+            self.rollback()
+            return False
+
+    def get_llm_usage_summary(self, hours=24):
+        """Aggregate OpenAI usage per feature and model over the last `hours`"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor(cursor_factory=RealDictCursor) as cursor:
+                cursor.execute("""
+                    SELECT feature, model,
+                           COUNT(*) AS calls,
+                           SUM(prompt_tokens) AS prompt_tokens,
+                           SUM(completion_tokens) AS completion_tokens,
+                           SUM(cached_tokens) AS cached_tokens,
+                           PERCENTILE_CONT(0.95) WITHIN GROUP (ORDER BY latency_ms) AS p95_latency_ms,
+                           COUNT(*) FILTER (WHERE status <> 'ok') AS errors
+                    FROM llm_usage
+                    WHERE created_at > CURRENT_TIMESTAMP - make_interval(hours => %s)
+                    GROUP BY feature, model
+                    ORDER BY SUM(prompt_tokens + completion_tokens) DESC
+                """, (hours,))
+                return cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Failed to get LLM usage summary: {e}")
+            return []
+
+    def get_user_llm_tokens(self, user_id, since):
+        """Total tokens spent on a user since the datetime `since`"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT COALESCE(SUM(prompt_tokens + completion_tokens), 0)
+                    FROM llm_usage
+                    WHERE user_id = %s AND created_at >= %s
+                """, (user_id, since))
+                return cursor.fetchone()[0]
+        except Exception as e:
+            logger.error(f"Failed to get user LLM tokens: {e}")
+            return 0
+
+    def save_bank_lesson(self, topic, bloom_level, lesson_data):
+        """Store a validated lesson in the offline lesson bank (duplicates are ignored)"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO lesson_bank (topic, bloom_level, data)
+                    VALUES (%s, %s, %s)
+                    ON CONFLICT DO NOTHING
+                """, (topic, bloom_level, Json(lesson_data)))
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to save lesson to bank: {e}")
+            self.rollback()
+            return False
+
+    def save_bank_lessons(self, lessons):
+        """Bulk-store validated lessons: a list of (topic, bloom_level, lesson_data)"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO lesson_bank (topic, bloom_level, data) VALUES %s
+                    ON CONFLICT DO NOTHING
+                """, [(topic, bloom_level, Json(data)) for topic, bloom_level, data in lessons], page_size=500)
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to save lessons to bank: {e}")
+            self.rollback()
+            return False
+
+    def get_bank_lesson(self, topic, bloom_level):
+        """Get a random banked lesson of the topic and Bloom level
+
+        Returns:
+        dict: Lesson data as produced by generate_lesson_and_quiz, or None if the bank has none
+        """
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT data FROM lesson_bank
+                    WHERE topic = %s AND bloom_level = %s
+                    ORDER BY random()
+                    LIMIT 1
+                """, (topic, bloom_level))
+                result = cursor.fetchone()
+                return result[0] if result else None
+        except Exception as e:
+            logger.error(f"Failed to get lesson from bank: {e}")
+            return None
+
+    def save_bank_rituals(self, rituals):
+        """Bulk-store ritual texts: a list of (word, avatar, text)"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO ritual_bank (word, avatar, text) VALUES %s
+                """, [(word, avatar or '', text) for word, avatar, text in rituals], page_size=500)
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to save rituals to bank: {e}")
+            self.rollback()
+            return False
+
+    def get_bank_ritual(self, word, avatar=None):
+        """Get a random pre-generated ritual text for a word and avatar, or None"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    SELECT text FROM ritual_bank
+                    WHERE word = %s AND avatar = %s
+                    ORDER BY random()
+                    LIMIT 1
+                """, (word, avatar or ''))
+                result = cursor.fetchone()
+                return result[0] if result else None
+        except Exception as e:
+            logger.error(f"Failed to get ritual from bank: {e}")
+            return None
+
+    def get_study_plan_topics(self):
+        """Distinct topic names across all study plans"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT DISTINCT topic FROM study_plan_items WHERE topic IS NOT NULL ORDER BY topic")
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Failed to get study plan topics: {e}")
+            return []
+
+    def get_telegram_file_ids(self):
+        """All stored Telegram file_ids: {name: (digest, file_id)}"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT name, digest, file_id FROM telegram_files")
+                return {name: (digest, file_id) for name, digest, file_id in cursor.fetchall()}
+        except Exception as e:
+            logger.error(f"Failed to get Telegram file ids: {e}")
+            return {}
+
+    def save_telegram_file_ids(self, files):
+        """Store Telegram file_ids: a list of (name, digest, file_id)"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO telegram_files (name, digest, file_id) VALUES %s
+                    ON CONFLICT (name) DO UPDATE
+                    SET digest = EXCLUDED.digest, file_id = EXCLUDED.file_id, updated_at = CURRENT_TIMESTAMP
+                """, files)
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to save Telegram file ids: {e}")
+            self.rollback()
+            return False
+
+    def get_bot_state(self, name):
+        """Stored value of a bot_state entry, or None"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("SELECT value FROM bot_state WHERE name = %s", (name,))
+                row = cursor.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            logger.error(f"Failed to get bot state {name}: {e}")
+            return None
+
+    def set_bot_state(self, name, value):
+        """Store a bot_state entry"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO bot_state (name, value) VALUES (%s, %s)
+                    ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value, updated_at = CURRENT_TIMESTAMP
+                """, (name, value))
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to save bot state {name}: {e}")
+            self.rollback()
+            return False
+
+    def save_pending_updates(self, bot, updates):
+        """Store received updates until they are handled; False if they could not be stored"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                execute_values(cursor, """
+                    INSERT INTO pending_updates (bot, update_id, data) VALUES %s
+                    ON CONFLICT DO NOTHING
+                """, [(bot, update["update_id"], Json(update)) for update in updates])
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to save pending updates: {e}")
+            self.rollback()
+            return False
+
+    def get_pending_updates(self, bot):
+        """Stored updates not handled yet, oldest first"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT data FROM pending_updates WHERE bot = %s ORDER BY update_id", (bot,)
+                )
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"Failed to get pending updates: {e}")
+            return []
+
+    def delete_pending_updates(self, bot, update_ids):
+        """Forget handled updates"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM pending_updates WHERE bot = %s AND update_id = ANY(%s)", (bot, list(update_ids))
+                )
+                self.connection.commit()
+                return True
+        except Exception as e:
+            logger.error(f"Failed to delete pending updates: {e}")
+            self.rollback()
+            return False
+
+    def claim_callback_query(self, callback_query_id):
+        """Record a callback query as processed; False if it already was
+
+        If the database cannot be reached the query is let through, a
+        duplicate is better than a button that does nothing.
+        """
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO processed_callbacks (callback_query_id) VALUES (%s)
+                    ON CONFLICT DO NOTHING
+                """, (callback_query_id,))
+                claimed = cursor.rowcount == 1
+                self.connection.commit()
+                return claimed
+        except Exception as e:
+            logger.error(f"Failed to claim callback query {callback_query_id}: {e}")
+            self.rollback()
+            return True
+
+    def prune_processed_callbacks(self, hours):
+        """Delete processed callback records older than `hours`; Telegram keeps updates for 24 hours"""
+        try:
+            self.ensure_connection()
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    "DELETE FROM processed_callbacks WHERE processed_at < CURRENT_TIMESTAMP - make_interval(hours => %s)",
+                    (hours,)
+                )
+                self.connection.commit()
+                return cursor.rowcount
+        except Exception as e:
+            logger.error(f"Failed to prune processed callbacks: {e}")
+            self.rollback()
+            return 0
+
+# Record the duration of every query method in bot_stage_seconds{stage="db"}
+instrument_methods(Database, "db", exclude=("connect", "ensure_connection", "create_tables", "init", "rollback"))
+
+# Global database instance; connects on first use or on db.init()
 db = Database()
\ No newline at end of file
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""Bulk import of the Interslavic dictionary into the words table
+
+Reads the official dictionary export (CSV with a header row, or JSON: a list
+of objects or a list of rows whose first row is the header), streams it in
+batches into a temporary staging table with COPY and upserts everything in
+one statement on the natural key (isv, addition, part_of_speech). Re-running
+an import only touches entries whose translations changed.
+
+    python dictionary_importer.py interslavic-dictionary.csv
+"""
+
+import argparse
+import csv
+import io
+import json
+import time
+from psycopg2 import sql
+from config import logger
+
+# Columns of the official export that are imported; everything else is ignored
+SOURCE_FIELDS = ("id", "isv", "addition", "partOfSpeech", "ru", "en")
+
+STAGING_COLUMNS = ("line", "source_id", "isv", "addition", "part_of_speech", "ru", "en")
+
+MAX_ISV_LENGTH = 255
+MAX_ADDITION_LENGTH = 255
+MAX_PART_OF_SPEECH_LENGTH = 50
+
+
+def read_entries(path):
+    """Yield dictionary entries as dicts from a CSV/TSV or JSON export"""
+    if path.endswith(".json"):
+        with open(path, encoding="utf-8") as source:
+            data = json.load(source)
+        if data and isinstance(data[0], list):
+            header, *rows = data
+            for row in rows:
+                yield dict(zip(header, row))
+        else:
+            yield from data
+        return
+
+    with open(path, encoding="utf-8-sig", newline="") as source:
+        delimiter = "\t" if path.endswith(".tsv") else ","
+        yield from csv.DictReader(source, delimiter=delimiter)
+
+
+def _text(value):
+    return " ".join(str(value).split()) if value is not None else ""
+
+
+def normalize_entry(entry):
+    """(source_id, isv, addition, part_of_speech, ru, en) for an entry, or None if it cannot be stored"""
+    isv = _text(entry.get("isv"))
+    if not isv or len(isv) > MAX_ISV_LENGTH:
+        return None
+    try:
+        source_id = int(entry.get("id"))
+    except (TypeError, ValueError):
+        source_id = None
+    return (
+        source_id,
+        isv,
+        _text(entry.get("addition"))[:MAX_ADDITION_LENGTH],
+        _text(entry.get("partOfSpeech"))[:MAX_PART_OF_SPEECH_LENGTH],
+        _text(entry.get("ru")) or None,
+        _text(entry.get("en")) or None
+    )
+
+
+class DictionaryImporter:
+    """COPY dictionary entries into a staging table and upsert them into the words table"""
+
+    def __init__(self, connection, table="words", batch_size=10000):
+        self.connection = connection
+        self.table = sql.Identifier(table)
+        self.batch_size = batch_size
+
+    def run(self, entries):
+        """Import an iterable of entries in one transaction; returns import statistics"""
+        stats = {"read": 0, "skipped": 0, "inserted": 0, "updated": 0}
+        started = time.perf_counter()
+        try:
+            with self.connection.cursor() as cursor:
+                cursor.execute("""
+                    CREATE TEMP TABLE words_staging (
+                        line INTEGER, source_id INTEGER, isv TEXT, addition TEXT,
+                        part_of_speech TEXT, ru TEXT, en TEXT
+                    ) ON COMMIT DROP
+                """)
+
+                batch = []
+                for entry in entries:
+                    stats["read"] += 1
+                    row = normalize_entry(entry)
+                    if row is None:
+                        stats["skipped"] += 1
+                        continue
+                    batch.append((stats["read"],) + row)
+                    if len(batch) >= self.batch_size:
+                        self._copy(cursor, batch)
+                        batch = []
+                        elapsed = time.perf_counter() - started
+                        logger.info(f"Staged {stats['read']} entries ({stats['read'] / elapsed:.0f} rows/s)")
+                if batch:
+                    self._copy(cursor, batch)
+
+                stats["inserted"], stats["updated"] = self._upsert(cursor)
+            self.connection.commit()
+        except Exception:
+            self.connection.rollback()
+            raise
+
+        stats["seconds"] = time.perf_counter() - started
+        stats["rows_per_second"] = stats["read"] / stats["seconds"] if stats["seconds"] else 0.0
+        logger.info(
+            f"Imported dictionary: {stats['read']} entries read, {stats['inserted']} inserted, "
+            f"{stats['updated']} updated, {stats['skipped']} skipped "
+            f"in {stats['seconds']:.1f}s ({stats['rows_per_second']:.0f} rows/s)"
+        )
+        return stats
+
+    @staticmethod
+    def _copy(cursor, rows):
+        buffer = io.StringIO()
+        csv.writer(buffer).writerows(rows)
+        buffer.seek(0)
+        # Empty unquoted CSV fields are NULL
+        cursor.copy_expert(
+            f"COPY words_staging ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv)", buffer
+        )
+
+    def _upsert(self, cursor):
+        """Merge the staging table into the words table; returns (inserted, updated)"""
+        # A key repeated in the export keeps its last occurrence; unchanged rows are not rewritten
+        cursor.execute(sql.SQL("""
+            WITH upserted AS (
+                INSERT INTO {table} AS words (source_id, isv, addition, part_of_speech, ru, en)
+                SELECT DISTINCT ON (isv, addition, part_of_speech)
+                    source_id, isv, COALESCE(addition, ''), COALESCE(part_of_speech, ''), ru, en
+                FROM words_staging
+                ORDER BY isv, addition, part_of_speech, line DESC
+                ON CONFLICT (isv, addition, part_of_speech) DO UPDATE
+                SET source_id = EXCLUDED.source_id, ru = EXCLUDED.ru, en = EXCLUDED.en,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE (words.source_id, words.ru, words.en)
+                    IS DISTINCT FROM (EXCLUDED.source_id, EXCLUDED.ru, EXCLUDED.en)
+                RETURNING xmax = 0 AS inserted
+            )
+            SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM upserted
+        """).format(table=self.table))
+        return cursor.fetchone()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Import the Interslavic dictionary into the words table")
+    parser.add_argument("path", help="dictionary export: .csv, .tsv or .json")
+    parser.add_argument("--batch-size", type=int, default=10000, help="entries per COPY into the staging table")
+    return parser.parse_args(argv)
+
+
+def main(args):
+    from database import db
+    db.ensure_connection()
+    DictionaryImporter(db.connection, batch_size=args.batch_size).run(read_entries(args.path))
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""Precomputed distractors (wrong multiple-choice options) for every dictionary word
+
+A good wrong option looks like the right one: a word of the same part of
+speech and a similar length, a letter or two away from the target or
+sharing its root. Finding such words means comparing the whole dictionary,
+so it is done offline:
+
+    python distractor_index.py --output distractors.idx
+
+For every word the k closest neighbours are stored as row numbers in one
+flat int32 array next to a table of (isv, first Russian meaning) strings.
+The bot loads the file at startup and a lookup is a dict access and a slice.
+Neighbours never repeat the target's meaning or spelling, nor each other's.
+
+Edit-distance candidates come from single-deletion keys (two words one
+edit apart share a key), root candidates from the words next to the target
+in alphabetical order within its part of speech.
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import namedtuple
+from answer_matching import edit_distance, fold
+from config import DISTRACTOR_INDEX_PATH, DISTRACTORS_PER_WORD, logger
+from exercise_engine import pos_category, primary_sense
+
+Distractor = namedtuple("Distractor", "isv sense")
+
+MAGIC = b"DIX1"
+HEADER = struct.Struct("<4sII")
+
+# A word further than this many edits is not an edit-distance neighbour
+MAX_EDIT_DISTANCE = 3
+# Common prefix that counts as a shared root
+ROOT_LENGTH = 4
+# Deletion keys shared by more words than this (short, common patterns) give no useful neighbours
+MAX_KEY_BUCKET = 200
+
+
+def _common_prefix(first, second):
+    length = 0
+    for char, other in zip(first, second):
+        if char != other:
+            break
+        length += 1
+    return length
+
+
+def _deletion_keys(word):
+    return {word} | {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+class DistractorIndex:
+    """Word id -> up to k Distractor(isv, sense) neighbours, loaded from the offline-built file"""
+
+    def __init__(self):
+        # (word id -> row, flat neighbour rows, entries, k), replaced as a whole on load
+        self._data = ({}, array("i"), [], 0)
+
+    def __len__(self):
+        return len(self._data[0])
+
+    @staticmethod
+    def _entries(rows):
+        """Unique (id, isv, sense, category) entries of dictionary rows"""
+        entries, seen = [], set()
+        for row in rows:
+            if not row.get("isv") or not row.get("ru"):
+                continue
+            sense = primary_sense(row["ru"])
+            if sense and (row["isv"], sense) not in seen:
+                seen.add((row["isv"], sense))
+                entries.append((row["id"], row["isv"], sense, pos_category(row.get("partOfSpeech"))))
+        return entries
+
+    @classmethod
+    def build(cls, rows, k=DISTRACTORS_PER_WORD):
+        """An index over dictionary rows (id, isv, partOfSpeech, ru)"""
+        entries = cls._entries(rows)
+        folded = [fold(isv) for _, isv, _, _ in entries]
+        by_key, ordered = {}, {}
+        for row, (_, _, _, category) in enumerate(entries):
+            for key in _deletion_keys(folded[row]):
+                by_key.setdefault((category, key), []).append(row)
+            ordered.setdefault(category, []).append(row)
+        rank = {}
+        for rows_in_category in ordered.values():
+            rows_in_category.sort(key=folded.__getitem__)
+            rank.update((row, position) for position, row in enumerate(rows_in_category))
+
+        neighbours = array("i")
+        for row, (_, isv, sense, category) in enumerate(entries):
+            word = folded[row]
+            candidates = set()
+            for key in _deletion_keys(word):
+                bucket = by_key[(category, key)]
+                if len(bucket) <= MAX_KEY_BUCKET:
+                    candidates.update(bucket)
+            same_category = ordered[category]
+            position = rank[row]
+            candidates.update(same_category[max(0, position - 2 * k):position + 2 * k + 1])
+
+            scored = []
+            for candidate in candidates:
+                other = folded[candidate]
+                if other == word or entries[candidate][2] == sense:
+                    continue
+                distance = edit_distance(word, other, MAX_EDIT_DISTANCE)
+                if _common_prefix(word, other) >= ROOT_LENGTH:
+                    distance -= 1
+                scored.append((distance, abs(len(other) - len(word)), other, candidate))
+            scored.sort()
+
+            chosen, spellings, senses = [], {word}, {sense}
+            for _, _, other, candidate in scored:
+                if other not in spellings and entries[candidate][2] not in senses:
+                    spellings.add(other)
+                    senses.add(entries[candidate][2])
+                    chosen.append(candidate)
+                    if len(chosen) == k:
+                        break
+            neighbours.extend(chosen + [-1] * (k - len(chosen)))
+
+        index = cls()
+        index._data = (
+            {word_id: row for row, (word_id, _, _, _) in enumerate(entries)},
+            neighbours, [Distractor(isv, sense) for _, isv, sense, _ in entries], k
+        )
+        return index
+
+    def save(self, path):
+        rows, neighbours, entries, k = self._data
+        ids = array("i", [0] * len(entries))
+        for word_id, row in rows.items():
+            ids[row] = word_id
+        neighbours = array("i", neighbours)
+        if sys.byteorder == "big":
+            ids.byteswap()
+            neighbours.byteswap()
+        strings = "\n".join(f"{entry.isv}\t{entry.sense}" for entry in entries).encode("utf-8")
+        with open(path, "wb") as target:
+            target.write(HEADER.pack(MAGIC, len(entries), k))
+            target.write(ids.tobytes())
+            target.write(neighbours.tobytes())
+            target.write(strings)
+
+    def load(self, path=DISTRACTOR_INDEX_PATH):
+        """Replace the index with the one in the file; returns the number of words"""
+        with open(path, "rb") as source:
+            data = source.read()
+        magic, count, k = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a distractor index")
+        offset = HEADER.size
+        ids = array("i")
+        ids.frombytes(data[offset:offset + 4 * count])
+        offset += 4 * count
+        neighbours = array("i")
+        neighbours.frombytes(data[offset:offset + 4 * count * k])
+        offset += 4 * count * k
+        if sys.byteorder == "big":
+            ids.byteswap()
+            neighbours.byteswap()
+        lines = data[offset:].decode("utf-8").split("\n") if count else []
+        entries = [Distractor(*line.split("\t", 1)) for line in lines]
+        self._data = ({word_id: row for row, word_id in enumerate(ids)}, neighbours, entries, k)
+        logger.info(f"Loaded distractors for {count} words from {path}")
+        return count
+
+    def distractors(self, word_id, k=None):
+        """Up to k Distractor(isv, sense) for the word, closest first; empty if the word is not indexed"""
+        rows, neighbours, entries, stored = self._data
+        row = rows.get(word_id)
+        if row is None:
+            return []
+        start = row * stored
+        return [entries[other] for other in neighbours[start:start + min(k or stored, stored)] if other >= 0]
+
+    def annotate(self, words, k=3):
+        """Copies of dictionary word dicts with the isv of their distractors, for the lesson prompt"""
+        annotated = []
+        for word in words:
+            distractors = self.distractors(word.get("id"), k)
+            annotated.append({**word, "distractors": [entry.isv for entry in distractors]} if distractors else word)
+        return annotated
+
+
+# Global distractor index instance; empty until load() is called
+distractor_index = DistractorIndex()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the distractor index from the words table")
+    parser.add_argument("--output", default=DISTRACTOR_INDEX_PATH, help="index file to write")
+    parser.add_argument("--k", type=int, default=DISTRACTORS_PER_WORD, help="distractors stored per word")
+    return parser.parse_args(argv)
+
+
+def main(args):
+    from database import db
+    started = time.perf_counter()
+    rows = db.get_dictionary_words()
+    index = DistractorIndex.build(rows, args.k)
+    index.save(args.output)
+    logger.info(
+        f"Indexed {len(index)} of {len(rows)} words into {args.output} "
+        f"({os.path.getsize(args.output) / 1024:.0f} KiB) in {time.perf_counter() - started:.1f} s"
+    )
+
+if __name__ == "__main__":
+    main(parse_args())
@@ -1,87 +1,70 @@
 #!/usr/bin/env python3
 
 import asyncio
-import json
 import logging
-import httpx
 import random
 from datetime import datetime
 from database import db
 from openai_service import openai_service
-from config import REQUIRED_CORRECT_ANSWERS, TELEGRAM_BOT_TOKEN, logger
+from session_store import create_session_store
+from telegram_api import get_telegram_api
+from metrics import instrument, start_metrics_reporting
+from llm_usage import usage_tracker
+from prefetch import Prefetcher
+from inflight import InFlightGenerations
+from exercise_engine import exercise_engine
+from distractor_index import distractor_index
+from answer_matching import EXACT, answer_matcher, grade_answer
+from avatar_media import AvatarMediaCache
+from update_tracker import UpdateTracker, duplicate_updates
+from rendering import (
+    ASSIGNMENT_AND_PLAN_KEYBOARD, ASSIGNMENT_ERROR_KEYBOARD, AVATAR_KEYBOARD, BACK_TO_MENU_KEYBOARD,
+    GET_ASSIGNMENT_KEYBOARD, GOAL_KEYBOARD, INTRO_KEYBOARD, LEVEL_COMPLETED, LEVEL_KEYBOARD, MAIN_MENU_KEYBOARD,
+    NEW_ASSIGNMENT_KEYBOARD, PROGRESS_KEYBOARD, QUIZ_RESULT_KEYBOARD, RETRY_START_KEYBOARD, RITUAL_KEYBOARD,
+    STALE_QUIZ_KEYBOARD, STUDY_PLAN_KEYBOARD, STUDY_PLAN_ONLY_KEYBOARD, STUDY_PLAN_READY_KEYBOARD, TOPIC_KEYBOARD,
+    TYPED_ANSWER_HINT, answer_keyboard, lesson_text, level_down_line, level_up_line, month_name_genitive, study_plan_text
+)
+import services
+from callback_codec import (
+    ACTION_ANSWER, CallbackQuery, CallbackRouter, new_nonce, nonce_age, parse_answer
+)
+from config import (
+    REQUIRED_CORRECT_ANSWERS, QUESTIONS_PER_LESSON, TELEGRAM_BOT_TOKEN, METRICS_PORT, METRICS_LOG_INTERVAL,
+    LLM_USAGE_FLUSH_INTERVAL, LOCAL_EXERCISE_BLOOM_LEVELS, PREFETCH_ON_WRONG_ANSWER, SESSION_TTL_SECONDS,
+    TYPED_ANSWER_BLOOM_LEVELS, logger
+)
+
+# callback_data -> handler, filled by the @callbacks decorators on OldChurchSlavonicBot
+callbacks = CallbackRouter()
 
 class OldChurchSlavonicBot:
     def __init__(self, token):
         self.token = token
-        self.base_url = f"https://api.telegram.org/bot{token}"
-        self.session = httpx.AsyncClient(timeout=60.0)
-        self.quiz_sessions = {}
+        self.api = get_telegram_api(token)
+        self.quiz_sessions = create_session_store()
         self.user_states = {}  # Track user onboarding state
+        self.prefetcher = Prefetcher()  # Next lessons generated while users answer
+        self.generations = InFlightGenerations()  # Assignments being generated, one per user
+        self.avatar_media = AvatarMediaCache(self.api)  # Avatar images by Telegram file_id
+        self.updates = UpdateTracker(token)  # Durable getUpdates offset, skips redelivered updates
     
     async def send_message(self, chat_id, text, reply_markup=None):
         """Send a message to a chat"""
-        data = {
-            "chat_id": chat_id,
-            "text": text,
-            "parse_mode": "Markdown"
-        }
-        if reply_markup:
-            data["reply_markup"] = json.dumps(reply_markup)
-        
-        try:
-            response = await self.session.post(f"{self.base_url}/sendMessage", data=data)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Failed to send message: {e}")
-            return {"ok": False}
+        return await self.api.send_message(chat_id, text, reply_markup)
     
     async def edit_message(self, chat_id, message_id, text, reply_markup=None):
         """Edit a message"""
-        data = {
-            "chat_id": chat_id,
-            "message_id": message_id,
-            "text": text,
-            "parse_mode": "Markdown"
-        }
-        if reply_markup:
-            data["reply_markup"] = json.dumps(reply_markup)
-        
-        try:
-            response = await self.session.post(f"{self.base_url}/editMessageText", data=data)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Failed to edit message: {e}")
-            return {"ok": False}
+        return await self.api.edit_message(chat_id, message_id, text, reply_markup)
     
-    async def answer_callback_query(self, callback_query_id, text=None):
+    async def answer_callback_query(self, callback_query_id, text=None, show_alert=False):
         """Answer a callback query"""
-        data = {"callback_query_id": callback_query_id}
-        if text:
-            data["text"] = text
-        
-        try:
-            response = await self.session.post(f"{self.base_url}/answerCallbackQuery", data=data)
-            return response.json()
-        except Exception as e:
-            logger.error(f"Failed to answer callback: {e}")
-            return {"ok": False}
+        return await self.api.answer_callback_query(callback_query_id, text, show_alert)
     
     async def get_updates(self, offset=None):
         """Get updates from Telegram"""
-        params = {"timeout": 10}  # Reduced timeout
-        if offset:
-            params["offset"] = offset
-        
-        try:
-            response = await self.session.get(f"{self.base_url}/getUpdates", params=params)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Failed to get updates: {e}")
-            return {"ok": False, "error": str(e)}
+        return await self.api.get_updates(offset)
     
+    @instrument("handler")
     async def handle_start_command(self, chat_id, user):
         """Handle /start command with intro message"""
         user_id = user['id']
@@ -109,15 +92,11 @@ class OldChurchSlavonicBot:
             "⚔️ Да начнем путь учения!"
         )
         
-        keyboard = {
-            "inline_keyboard": [[{
-                "text": "Дальше →",
-                "callback_data": "next_intro"
-            }]]
-        }
+        keyboard = INTRO_KEYBOARD
         
         await self.send_message(chat_id, intro_message, keyboard)
     
+    @instrument("handler")
     async def handle_level_selection(self, chat_id, message_id):
         """Handle level selection step"""
         level_message = (
@@ -132,17 +111,12 @@ class OldChurchSlavonicBot:
     "Избери степень — и путь твой начнётся."
 )
 
-        keyboard = {
-    "inline_keyboard": [
-        [{"text": "🔸 Я — начатый", "callback_data": "level_beginner"}],
-        [{"text": "🔸 Знаю понемногу", "callback_data": "level_intermediate"}],
-        [{"text": "🔸 Старец словесный", "callback_data": "level_advanced"}]
-    ]
-}
+        keyboard = LEVEL_KEYBOARD
 
         
         await self.edit_message(chat_id, message_id, level_message, keyboard)
     
+    @instrument("handler")
     async def handle_goal_selection(self, chat_id, message_id, level):
         """Handle goal selection step"""
         goal_message = (
@@ -162,17 +136,11 @@ class OldChurchSlavonicBot:
         # Store level in user state temporarily
         self.user_states[chat_id] = {'level': level}
         
-        keyboard = {
-            "inline_keyboard": [
-                [{"text": "⚖️ Хощу разумѣти тексты", "callback_data": "goal_texts"}],
-                [{"text": "🎙️ Желаю глаголати", "callback_data": "goal_speaking"}],
-                [{"text": "🎭 Интересъ мой — ритуалъ и образъ", "callback_data": "goal_ritual"}],
-                [{"text": "🪶 Ищу вдохновения", "callback_data": "goal_inspiration"}]
-            ]
-        }
+        keyboard = GOAL_KEYBOARD
         
         await self.edit_message(chat_id, message_id, goal_message, keyboard)
     
+    @instrument("handler")
     async def handle_avatar_selection(self, chat_id, message_id, goal, user_id):
         """Handle avatar selection step"""
         # Get stored level from user state
@@ -193,65 +161,34 @@ class OldChurchSlavonicBot:
         
         await self.edit_message(chat_id, message_id, avatar_intro_message)
         
-        # Отправляем сообщение с описанием Ведуньи
+        # Описания аватаров уходят одним альбомом; изображения загружаются в Telegram только один раз
         vedunya_message = (
             "📜 Се есть Ведунья — светлая душа, наставница тиха и премудра.\n\n"
             "Речи ея — ласковы, добры и вдохновенны. Глаголет ясно, с любовию и разумением, яко мати, чтит ученика и не взыщет в нем вины.\n"
             "Учение с нею — яко свет во тьме, яко утро ясное."
         )
-        
-        # Отправляем изображение с описанием
-        with open('avatars/vedunia.png', 'rb') as photo:
-            await self.session.post(
-                f"{self.base_url}/sendPhoto",
-                data={"chat_id": chat_id, "caption": vedunya_message},
-                files={"photo": photo}
-            )
-        
-        # Отправляем сообщение с описанием Болгара
         bolgar_message = (
             "📜 Болгар — воин ведающий, друг словесный и крепкий духом.\n\n"
             "Являет мудрость без гордыни, речь его проста и ясна, но суть — глубока.\n"
             "Глаголет с почтением и силой, не ведает усталости в наставлении. С ним учение — яко дружеский пир разума."
         )
-        
-        # Отправляем изображение с описанием
-        with open('avatars/bolgar.png', 'rb') as photo:
-            await self.session.post(
-                f"{self.base_url}/sendPhoto",
-                data={"chat_id": chat_id, "caption": bolgar_message},
-                files={"photo": photo}
-            )
-        
-        # Отправляем сообщение с описанием Старца
         starec_message = (
             "📜 Старец — древний путник ведения, очи ясны, голос тих и ободряющ.\n\n"
             "Глаголет речью плавной, яко река веков. Образен, ясен, тепел, и мудростью обвивает, не давит.\n"
             "Учит, яко дед внука любимого: с терпением, шуткою да притчею."
         )
-        
-        # Отправляем изображение с описанием
-        with open('avatars/starec.png', 'rb') as photo:
-            await self.session.post(
-                f"{self.base_url}/sendPhoto",
-                data={"chat_id": chat_id, "caption": starec_message},
-                files={"photo": photo}
-            )
-        
-        # Отправляем сообщение с описанием Поляка
         polyak_message = (
             "📜 Поляк — молод духом и весел, яко ветер степной.\n\n"
             "Глаголет скоро, живо, со смехом и словцем игривым. Не знает скуки, любит словеса яркие и речи просты.\n"
             "С ним учение — не труд тяжкий, но приключение озарённое смехом и легкостью."
         )
         
-        # Отправляем изображение с описанием
-        with open('avatars/polyak.png', 'rb') as photo:
-            await self.session.post(
-                f"{self.base_url}/sendPhoto",
-                data={"chat_id": chat_id, "caption": polyak_message},
-                files={"photo": photo}
-            )
+        await self.avatar_media.send(chat_id, [
+            ('avatars/vedunia.png', vedunya_message),
+            ('avatars/bolgar.png', bolgar_message),
+            ('avatars/starec.png', starec_message),
+            ('avatars/polyak.png', polyak_message)
+        ])
         
         # Отправляем сообщение с выбором аватара
         avatar_choice_message = (
@@ -259,17 +196,11 @@ class OldChurchSlavonicBot:
             "Глаголи имя избранного, и путь твой обретёт голос."
         )
         
-        keyboard = {
-            "inline_keyboard": [
-                [{"text": "🔹 Ведунья", "callback_data": "avatar_vedunia"}],
-                [{"text": "🔹 Болгар", "callback_data": "avatar_bolgar"}],
-                [{"text": "🔹 Старец", "callback_data": "avatar_starec"}],
-                [{"text": "🔹 Поляк", "callback_data": "avatar_polyak"}]
-            ]
-        }
+        keyboard = AVATAR_KEYBOARD
         
         await self.send_message(chat_id, avatar_choice_message, keyboard)
     
+    @instrument("handler")
     async def complete_onboarding(self, chat_id, message_id, avatar, user_id):
         """Complete onboarding and show main menu"""
         # Get stored level and goal from user state
@@ -291,6 +222,7 @@ class OldChurchSlavonicBot:
         # Generate study plan
         await self.generate_study_plan(chat_id, message_id, user_id, level, goal)
     
+    @instrument("handler")
     async def generate_study_plan(self, chat_id, message_id, user_id, level, goal):
         """Generate a study plan for the user"""
         # Show loading message
@@ -302,7 +234,7 @@ class OldChurchSlavonicBot:
             avatar = user_data.get('avatar') if user_data else None
             
             # Generate study plan using OpenAI with avatar style
-            study_plan_items = await openai_service.generate_study_plan(level, goal, avatar)
+            study_plan_items = await openai_service.generate_study_plan(level, goal, avatar, user_id=user_id)
             
             # Save study plan to database
             db.save_study_plan(user_id, level, goal, study_plan_items)
@@ -317,12 +249,7 @@ class OldChurchSlavonicBot:
                 "Нажмите кнопку ниже, чтобы начать обучение или просмотреть полный учебный план."
             )
             
-            keyboard = {
-                "inline_keyboard": [
-                    [{"text": "📖 Начать обучение", "callback_data": "get_assignment"}],
-                    [{"text": "📋 Учебный план", "callback_data": "show_study_plan"}]
-                ]
-            }
+            keyboard = STUDY_PLAN_READY_KEYBOARD
             
             await self.edit_message(chat_id, message_id, success_message, keyboard)
             
@@ -332,32 +259,27 @@ class OldChurchSlavonicBot:
                 chat_id, 
                 message_id,
                 "😔 Произошла ошибка при создании учебного плана. Попробуйте снова.",
-                {"inline_keyboard": [[{"text": "🔄 Попробовать снова", "callback_data": "start"}]]}
+                RETRY_START_KEYBOARD
             )
             # Show main menu as fallback
             user_data = db.get_user(user_id)
             first_name = user_data.get('first_name', 'друг') if user_data else 'друг'
             await self.show_main_menu(chat_id, first_name, message_id)
     
+    @instrument("handler")
     async def show_main_menu(self, chat_id, first_name, message_id=None):
         """Show main menu"""
         message = f"Радуйся, {first_name}! Что желаеши творити днесь?\n\n"
         message += "Избери путь свой в учении языка межславянского:"
         
-        keyboard = {
-            "inline_keyboard": [
-                [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
-                [{"text": "📋 Учебный план", "callback_data": "show_study_plan"}],
-                [{"text": "🔮 Получить заклинание дня", "callback_data": "get_word_ritual"}],
-                [{"text": "📜 Моя летопись", "callback_data": "show_progress"}]
-            ]
-        }
+        keyboard = MAIN_MENU_KEYBOARD
         
         if message_id:
             await self.edit_message(chat_id, message_id, message, keyboard)
         else:
             await self.send_message(chat_id, message, keyboard)
     
+    @instrument("handler")
     async def show_study_plan(self, chat_id, message_id, user_id):
         """Show the user's study plan"""
         try:
@@ -373,7 +295,7 @@ class OldChurchSlavonicBot:
                         chat_id,
                         message_id,
                         "У вас еще нет учебного плана. Начните обучение с команды /start.",
-                        {"inline_keyboard": [[{"text": "🏠 Главное меню", "callback_data": "main_menu"}]]}
+                        BACK_TO_MENU_KEYBOARD
                     )
                     return
                 
@@ -390,7 +312,7 @@ class OldChurchSlavonicBot:
                 
                 try:
                     # Генерируем план с помощью OpenAI
-                    study_plan_items = await openai_service.generate_study_plan(level, goal)
+                    study_plan_items = await openai_service.generate_study_plan(level, goal, user_id=user_id)
                     
                     # Сохраняем план в базу данных
                     db.save_study_plan(user_id, level, goal, study_plan_items)
@@ -404,7 +326,7 @@ class OldChurchSlavonicBot:
                             chat_id,
                             message_id,
                             "😔 Произошла ошибка при создании учебного плана. Попробуйте снова.",
-                            {"inline_keyboard": [[{"text": "🏠 Главное меню", "callback_data": "main_menu"}]]}
+                            BACK_TO_MENU_KEYBOARD
                         )
                         return
                 except Exception as e:
@@ -413,35 +335,15 @@ class OldChurchSlavonicBot:
                         chat_id,
                         message_id,
                         "😔 Произошла ошибка при создании учебного плана. Попробуйте снова.",
-                        {"inline_keyboard": [[{"text": "🏠 Главное меню", "callback_data": "main_menu"}]]}
+                        BACK_TO_MENU_KEYBOARD
                     )
                     return
                 
-            # Format message with study plan
-            message = "📚 **Ваш учебный план**\n\n"
-            
-            for item in study_plan["items"]:
-                # Add status emoji
-                status = "✅" if item["is_completed"] else "🔄" if item["current_bloom_level"] > 1 else "⏳"
-                
-                # Add stars to indicate current Bloom's level
-                bloom_stars = "⭐" * item["current_bloom_level"]
-                
-                message += f"{status} **{item['topic']}**\n"
-                message += f"_{item['description']}_\n"
-                message += f"Прогресс: {bloom_stars} ({item['current_bloom_level']}/6)\n\n"
+            # Topics with status and Bloom level stars
+            message = study_plan_text(study_plan["items"])
             
             # Add navigation buttons
-            keyboard = {
-                "inline_keyboard": [
-                    [
-                        {"text": "◀️ Предыдущая тема", "callback_data": "prev_topic"},
-                        {"text": "Следующая тема ▶️", "callback_data": "next_topic"}
-                    ],
-                    [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
-                    [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
-                ]
-            }
+            keyboard = STUDY_PLAN_KEYBOARD
             
             await self.edit_message(chat_id, message_id, message, keyboard)
                 
@@ -451,9 +353,10 @@ class OldChurchSlavonicBot:
                 chat_id,
                 message_id,
                 "😔 Произошла ошибка при загрузке учебного плана.",
-                {"inline_keyboard": [[{"text": "🏠 Главное меню", "callback_data": "main_menu"}]]}
+                BACK_TO_MENU_KEYBOARD
             )
     
+    @instrument("handler")
     async def handle_next_topic(self, chat_id, message_id, user_id):
         """Navigate to the next topic"""
         try:
@@ -465,7 +368,7 @@ class OldChurchSlavonicBot:
                     chat_id, 
                     message_id,
                     "Вы уже прошли все темы в учебном плане! 🎉",
-                    {"inline_keyboard": [[{"text": "📖 Получить задание", "callback_data": "get_assignment"}]]}
+                    GET_ASSIGNMENT_KEYBOARD
                 )
                 return
                 
@@ -477,28 +380,20 @@ class OldChurchSlavonicBot:
                     chat_id, 
                     message_id,
                     "Это последняя тема в вашем учебном плане.",
-                    {"inline_keyboard": [
-                        [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
-                        [{"text": "📋 Учебный план", "callback_data": "show_study_plan"}]
-                    ]}
+                    ASSIGNMENT_AND_PLAN_KEYBOARD
                 )
                 return
                 
-            # Update current topic
+            # Update current topic; a lesson prefetched for the old one is no longer needed
             db.set_current_topic(user_id, next_topic["id"])
+            self.prefetcher.cancel(user_id)
             
             # Send information about the new topic
             message = f"📚 **Новая тема: {next_topic['topic']}**\n\n"
             message += f"_{next_topic['description']}_\n\n"
             message += "Нажмите кнопку ниже, чтобы получить задание по этой теме."
             
-            keyboard = {
-                "inline_keyboard": [
-                    [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
-                    [{"text": "📋 Учебный план", "callback_data": "show_study_plan"}],
-                    [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
-                ]
-            }
+            keyboard = TOPIC_KEYBOARD
             
             await self.edit_message(chat_id, message_id, message, keyboard)
             
@@ -508,9 +403,10 @@ class OldChurchSlavonicBot:
                 chat_id, 
                 message_id,
                 "😔 Произошла ошибка при переходе к следующей теме.",
-                {"inline_keyboard": [[{"text": "📋 Учебный план", "callback_data": "show_study_plan"}]]}
+                STUDY_PLAN_ONLY_KEYBOARD
             )
     
+    @instrument("handler")
     async def handle_prev_topic(self, chat_id, message_id, user_id):
         """Navigate to the previous topic"""
         try:
@@ -522,7 +418,7 @@ class OldChurchSlavonicBot:
                     chat_id, 
                     message_id,
                     "У вас нет активной темы. Начните обучение с получения задания.",
-                    {"inline_keyboard": [[{"text": "📖 Получить задание", "callback_data": "get_assignment"}]]}
+                    GET_ASSIGNMENT_KEYBOARD
                 )
                 return
                 
@@ -534,28 +430,20 @@ class OldChurchSlavonicBot:
                     chat_id, 
                     message_id,
                     "Это первая тема в вашем учебном плане.",
-                    {"inline_keyboard": [
-                        [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
-                        [{"text": "📋 Учебный план", "callback_data": "show_study_plan"}]
-                    ]}
+                    ASSIGNMENT_AND_PLAN_KEYBOARD
                 )
                 return
                 
-            # Update current topic
+            # Update current topic; a lesson prefetched for the old one is no longer needed
             db.set_current_topic(user_id, prev_topic["id"])
+            self.prefetcher.cancel(user_id)
             
             # Send information about the new topic
             message = f"📚 **Возврат к теме: {prev_topic['topic']}**\n\n"
             message += f"_{prev_topic['description']}_\n\n"
             message += "Нажмите кнопку ниже, чтобы получить задание по этой теме."
             
-            keyboard = {
-                "inline_keyboard": [
-                    [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
-                    [{"text": "📋 Учебный план", "callback_data": "show_study_plan"}],
-                    [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
-                ]
-            }
+            keyboard = TOPIC_KEYBOARD
             
             await self.edit_message(chat_id, message_id, message, keyboard)
             
@@ -565,15 +453,22 @@ class OldChurchSlavonicBot:
                 chat_id, 
                 message_id,
                 "😔 Произошла ошибка при переходе к предыдущей теме.",
-                {"inline_keyboard": [[{"text": "📋 Учебный план", "callback_data": "show_study_plan"}]]}
+                STUDY_PLAN_ONLY_KEYBOARD
             )
 
     
+    @instrument("handler")
     async def handle_get_assignment(self, chat_id, message_id, user_id):
         """Handle get assignment request"""
+        # The previous session may still hold follow-up questions generated with its lesson
+        previous_session = await self.quiz_sessions.aget(user_id)
+        
         # Clear any existing session
-        if user_id in self.quiz_sessions:
-            del self.quiz_sessions[user_id]
+        await self.quiz_sessions.adelete(user_id)
+        
+        if previous_session and previous_session.get('pending_questions'):
+            if await self.serve_follow_up_question(chat_id, message_id, user_id, previous_session):
+                return
         
         # Show loading message
         await self.edit_message(chat_id, message_id, "⏳ Генерируем новое задание...")
@@ -604,7 +499,7 @@ class OldChurchSlavonicBot:
                             level = user_data.get('level')
                             goal = user_data.get('goal')
                             avatar = user_data.get('avatar')
-                            study_plan_items = await openai_service.generate_study_plan(level, goal, avatar)
+                            study_plan_items = await openai_service.generate_study_plan(level, goal, avatar, user_id=user_id)
                             
                             # Save to database
                             db.save_study_plan(user_id, level, goal, study_plan_items)
@@ -617,7 +512,7 @@ class OldChurchSlavonicBot:
                                 chat_id,
                                 message_id,
                                 "😔 Произошла ошибка при создании учебного плана.",
-                                {"inline_keyboard": [[{"text": "🏠 Главное меню", "callback_data": "main_menu"}]]}
+                                BACK_TO_MENU_KEYBOARD
                             )
                             return
                     else:
@@ -626,7 +521,7 @@ class OldChurchSlavonicBot:
                             chat_id,
                             message_id,
                             "Для получения заданий необходимо сначала завершить настройку. Начните с команды /start.",
-                            {"inline_keyboard": [[{"text": "🏠 Главное меню", "callback_data": "main_menu"}]]}
+                            BACK_TO_MENU_KEYBOARD
                         )
                         return
                 
@@ -644,141 +539,201 @@ class OldChurchSlavonicBot:
                 # Fallback if no study plan exists despite our attempts
                 topic_name = "Основы межславянского языка"
             
-            # Получаем слова из словаря для использования в задании
-            try:
-                # Получаем случайные слова из словаря
-                dictionary_words = db.get_random_words()
-                logger.info(f"Got {len(dictionary_words)} dictionary words for assignment")
-                
-                # Выбираем слова в зависимости от уровня пользователя и уровня Блума
-                # Получаем уровень пользователя
-                user_data = db.get_user(user_id)
-                user_level = user_data.get('level', 'beginner') if user_data else 'beginner'
-                
-                # Фильтруем слова в зависимости от уровня сложности
-                filtered_words = []
-                
-                # Простой алгоритм фильтрации на основе уровня пользователя и Блума
-                for word in dictionary_words:
-                    # Для начинающих выбираем слова с высокой понятностью
-                    if user_level == 'beginner':
-                        # Для начальных уровней Блума выбираем существительные
-                        if bloom_level <= 2 and word.get('partOfSpeech') and 'n.' in word.get('partOfSpeech'):
-                            filtered_words.append(word)
-                        # Для уровня 3-4 добавляем прилагательные
-                        elif bloom_level in [3, 4] and word.get('partOfSpeech') and 'adj.' in word.get('partOfSpeech'):
-                            filtered_words.append(word)
-                        # Для высоких уровней добавляем глаголы
-                        elif bloom_level >= 5 and word.get('partOfSpeech') and 'v.' in word.get('partOfSpeech'):
-                            filtered_words.append(word)
-                    # Для среднего уровня добавляем больше разнообразия
-                    elif user_level == 'intermediate':
-                        # Добавляем слова с учетом уровня Блума
-                        if bloom_level <= 3 or word.get('partOfSpeech'):
-                            filtered_words.append(word)
-                    # Для продвинутого уровня добавляем все слова
-                    else:  # advanced
-                        filtered_words.append(word)
-                
-                # Если после фильтрации осталось мало слов, добавляем еще из общего списка
-                if len(filtered_words) < 5:
-                    # Добавляем случайные слова до минимума 5
-                    remaining_words = [w for w in dictionary_words if w not in filtered_words]
-                    import random
-                    random.shuffle(remaining_words)
-                    filtered_words.extend(remaining_words[:max(5 - len(filtered_words), 0)])
-                
-                # Ограничиваем количество слов до 10 для промпта
-                if len(filtered_words) > 10:
-                    import random
-                    filtered_words = random.sample(filtered_words, 10)
-                
-                logger.info(f"Filtered to {len(filtered_words)} words based on user level '{user_level}' and Bloom level {bloom_level}")
-                dictionary_words = filtered_words
-            except Exception as e:
-                logger.error(f"Error processing dictionary words: {e}")
-                dictionary_words = []
-            
-            # Get user avatar for personalized content
-            user_data = db.get_user(user_id)
-            avatar = user_data.get('avatar') if user_data else None
-            
-            # Generate lesson and quiz based on topic, Bloom's level, dictionary words and avatar style
-            lesson_data = await openai_service.generate_lesson_and_quiz(topic_name, bloom_level, dictionary_words, avatar)
-            
-            # Store session
-            self.quiz_sessions[user_id] = {
-                'lesson': lesson_data['lesson'],
-                'question': lesson_data['question'],
-                'options': lesson_data['options'],
-                'correct_answer': lesson_data['correct_answer'],
-                'answered': False,
-                'chat_id': chat_id,
-                'message_id': message_id,
-                'topic_id': current_topic["id"] if current_topic else None,
-                'bloom_level': bloom_level
-            }
-            
-            # Format message
-            bloom_levels = [
-                "Запоминание",  # Remember
-                "Понимание",     # Understand
-                "Применение",   # Apply
-                "Анализ",        # Analyze
-                "Оценка",        # Evaluate
-                "Творчество"    # Create
-            ]
-            
-            message = f"📚 **Урок: {topic_name}**\n"
-            message += f"**Уровень: {bloom_levels[bloom_level-1]}** (уровень {bloom_level} из 6)\n\n"
-            message += f"{lesson_data['lesson']}\n\n"
-            message += f"❓ **Вопрос:**\n{lesson_data['question']}"
-            
-            # Create keyboard with options
-            keyboard = {"inline_keyboard": []}
-            for i, option in enumerate(lesson_data['options']):
-                keyboard["inline_keyboard"].append([{
-                    "text": option,
-                    "callback_data": f"answer_{i}_{option[:20]}"  # Truncate for callback limit
-                }])
+            # A lesson prefetched while the user answered the previous quiz is used if still valid
+            topic_id = current_topic["id"] if current_topic else None
+            lesson_data = await self.prefetcher.take(user_id, (topic_id, bloom_level)) if topic_id else None
+            if lesson_data is None:
+                try:
+                    lesson_data = await self.generate_lesson(user_id, topic_name, bloom_level)
+                except Exception as e:
+                    # OpenAI is failing (or its circuit breaker is open): serve a banked lesson instead
+                    lesson_data = db.get_bank_lesson(topic_name, bloom_level)
+                    if not lesson_data:
+                        raise
+                    logger.warning(f"Serving banked lesson for '{topic_name}' (level {bloom_level}): {e}")
             
-            await self.edit_message(chat_id, message_id, message, keyboard)
+            questions = lesson_data.get('questions') or [lesson_data]
+            await self.show_quiz_question(
+                chat_id, message_id, user_id, topic_name, topic_id, bloom_level,
+                lesson_data, questions[1:], 1, len(questions)
+            )
             
         except Exception as e:
             logger.error(f"Error generating assignment: {e}")
-            error_keyboard = {
-                "inline_keyboard": [
-                    [{"text": "📖 Попробовать снова", "callback_data": "get_assignment"}],
-                    [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
-                ]
-            }
+            error_keyboard = ASSIGNMENT_ERROR_KEYBOARD
             await self.edit_message(
                 chat_id, message_id, 
                 f"😔 Ошибка при создании задания: {str(e)}", 
                 error_keyboard
             )
     
-    async def answer_callback_query(self, callback_query_id, text=None, show_alert=False):
-        """Answer a callback query"""
-        data = {
-            "callback_query_id": callback_query_id,
-            "show_alert": show_alert
-        }
-        if text:
-            data["text"] = text
+    async def generate_lesson(self, user_id, topic_name, bloom_level):
+        """Generate a lesson with several questions for the topic and Bloom level and keep it in the lesson bank"""
+        if self.uses_local_exercises(bloom_level):
+            # Vocabulary questions are built from the dictionary in milliseconds, without OpenAI
+            lesson_data = exercise_engine.generate(topic_name, bloom_level, QUESTIONS_PER_LESSON)
+            if lesson_data:
+                return lesson_data
+            logger.warning(f"Not enough dictionary words for a local lesson at level {bloom_level}, using OpenAI")
         
+        # Получаем слова из словаря для использования в задании
         try:
-            response = await self.session.post(f"{self.base_url}/answerCallbackQuery", data=data)
-            response.raise_for_status()
-            return response.json()
+            # Получаем случайные слова из словаря
+            dictionary_words = db.get_random_words()
+            logger.info(f"Got {len(dictionary_words)} dictionary words for assignment")
+            
+            # Выбираем слова в зависимости от уровня пользователя и уровня Блума
+            # Получаем уровень пользователя
+            user_data = db.get_user(user_id)
+            user_level = user_data.get('level', 'beginner') if user_data else 'beginner'
+            
+            # Фильтруем слова в зависимости от уровня сложности
+            filtered_words = []
+            
+            # Простой алгоритм фильтрации на основе уровня пользователя и Блума
+            for word in dictionary_words:
+                # Для начинающих выбираем слова с высокой понятностью
+                if user_level == 'beginner':
+                    # Для начальных уровней Блума выбираем существительные
+                    if bloom_level <= 2 and word.get('partOfSpeech') and 'n.' in word.get('partOfSpeech'):
+                        filtered_words.append(word)
+                    # Для уровня 3-4 добавляем прилагательные
+                    elif bloom_level in [3, 4] and word.get('partOfSpeech') and 'adj.' in word.get('partOfSpeech'):
+                        filtered_words.append(word)
+                    # Для высоких уровней добавляем глаголы
+                    elif bloom_level >= 5 and word.get('partOfSpeech') and 'v.' in word.get('partOfSpeech'):
+                        filtered_words.append(word)
+                # Для среднего уровня добавляем больше разнообразия
+                elif user_level == 'intermediate':
+                    # Добавляем слова с учетом уровня Блума
+                    if bloom_level <= 3 or word.get('partOfSpeech'):
+                        filtered_words.append(word)
+                # Для продвинутого уровня добавляем все слова
+                else:  # advanced
+                    filtered_words.append(word)
+            
+            # Если после фильтрации осталось мало слов, добавляем еще из общего списка
+            if len(filtered_words) < 5:
+                # Добавляем случайные слова до минимума 5
+                remaining_words = [w for w in dictionary_words if w not in filtered_words]
+                import random
+                random.shuffle(remaining_words)
+                filtered_words.extend(remaining_words[:max(5 - len(filtered_words), 0)])
+            
+            # Ограничиваем количество слов до 10 для промпта
+            if len(filtered_words) > 10:
+                import random
+                filtered_words = random.sample(filtered_words, 10)
+            
+            logger.info(f"Filtered to {len(filtered_words)} words based on user level '{user_level}' and Bloom level {bloom_level}")
+            # Look-alike words from the distractor index make better wrong options than invented ones
+            dictionary_words = distractor_index.annotate(filtered_words)
         except Exception as e:
-            logger.error(f"Failed to answer callback query: {e}")
-            return {"ok": False}
+            logger.error(f"Error processing dictionary words: {e}")
+            dictionary_words = []
+        
+        # Get user avatar for personalized content
+        user_data = db.get_user(user_id)
+        avatar = user_data.get('avatar') if user_data else None
+        
+        # Generate lesson and quiz based on topic, Bloom's level, dictionary words and avatar style.
+        # One call returns several questions; the follow-ups are served from the session
+        lesson_data = await openai_service.generate_lesson_and_quiz(
+            topic_name, bloom_level, dictionary_words, avatar, user_id=user_id,
+            question_count=QUESTIONS_PER_LESSON, typed=bloom_level in TYPED_ANSWER_BLOOM_LEVELS
+        )
+        db.save_bank_lesson(topic_name, bloom_level, lesson_data)
+        return lesson_data
     
-    async def handle_quiz_answer(self, chat_id, message_id, user_id, callback_data, callback_query_id=None):
-        """Handle quiz answer"""
-        session = self.quiz_sessions.get(user_id)
-        if not session or session.get('answered'):
+    @staticmethod
+    def uses_local_exercises(bloom_level):
+        return bloom_level in LOCAL_EXERCISE_BLOOM_LEVELS and exercise_engine.supports(bloom_level)
+    
+    def prefetch_lesson(self, user_id, topic_name, topic_id, bloom_level):
+        """Start generating the lesson the user is likely to ask for next"""
+        # Local lessons are built on demand, there is nothing to gain from building them ahead
+        if topic_id and not self.uses_local_exercises(bloom_level):
+            self.prefetcher.start(
+                user_id, (topic_id, bloom_level),
+                lambda: self.generate_lesson(user_id, topic_name, bloom_level)
+            )
+    
+    async def serve_follow_up_question(self, chat_id, message_id, user_id, previous_session):
+        """Show the next question of an already generated lesson without calling OpenAI
+        
+        Returns False if the user has moved to another topic or Bloom level since.
+        """
+        current_topic = db.get_current_topic(user_id)
+        if not current_topic or current_topic["id"] != previous_session.get('topic_id'):
+            return False
+        bloom_level = current_topic.get("current_bloom_level", 1)
+        if bloom_level != previous_session.get('bloom_level'):
+            return False
+        
+        next_question, *pending_questions = previous_session['pending_questions']
+        await self.show_quiz_question(
+            chat_id, message_id, user_id, current_topic.get("topic", ""),
+            current_topic["id"], bloom_level,
+            {'lesson': previous_session['lesson'], **next_question}, pending_questions,
+            previous_session.get('question_number', 1) + 1, previous_session.get('question_count', 1)
+        )
+        return True
+    
+    async def show_quiz_question(self, chat_id, message_id, user_id, topic_name, topic_id, bloom_level,
+                                 lesson_data, pending_questions=(), question_number=1, question_count=1):
+        """Store the quiz session for a question and show it with its answer buttons"""
+        session = {
+            'lesson': lesson_data['lesson'],
+            'question': lesson_data['question'],
+            'options': lesson_data['options'],
+            'correct_answer': lesson_data['correct_answer'],
+            'answered': False,
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'topic_id': topic_id,
+            'bloom_level': bloom_level,
+            'nonce': new_nonce()
+        }
+        if pending_questions:
+            session['pending_questions'] = list(pending_questions)
+        else:
+            # Last question of the lesson: the next assignment needs a new lesson, start it now
+            self.prefetch_lesson(user_id, topic_name, topic_id, bloom_level)
+        if question_count > 1:
+            session['question_number'] = question_number
+            session['question_count'] = question_count
+        typed = bloom_level in TYPED_ANSWER_BLOOM_LEVELS
+        if typed:
+            session['typed'] = True
+            # Normalize the answer and the options now rather than when the user replies
+            answer_matcher(lesson_data['correct_answer'], tuple(lesson_data['options']))
+        await self.quiz_sessions.aset(user_id, session)
+        
+        message = lesson_text(
+            topic_name, bloom_level, lesson_data['lesson'], lesson_data['question'], question_number, question_count
+        )
+        
+        if typed:
+            await self.edit_message(chat_id, message_id, message + TYPED_ANSWER_HINT, BACK_TO_MENU_KEYBOARD)
+        else:
+            keyboard = answer_keyboard(session['nonce'], lesson_data['options'])
+            await self.edit_message(chat_id, message_id, message, keyboard)
+    
+    @instrument("handler")
+    async def handle_quiz_answer(self, chat_id, message_id, user_id, option_index, callback_query_id=None, nonce=None):
+        """Handle quiz answer
+        
+        nonce identifies the quiz the button belongs to; None for buttons in the legacy format.
+        """
+        # A quiz older than the session TTL is recognised from the callback alone
+        age = nonce_age(nonce) if nonce is not None else 0
+        if age is None or age > SESSION_TTL_SECONDS:
+            session = None
+        else:
+            # Claim the session atomically so that the answer is counted only once; a button of an
+            # earlier quiz of this user does not match the nonce and leaves the current one open
+            session = await self.quiz_sessions.aclaim(user_id, nonce)
+        if not session:
             # Отвечаем на callback_query, чтобы убрать индикатор загрузки
             if callback_query_id:
                 await self.answer_callback_query(callback_query_id, "Вы уже ответили на этот вопрос или сессия истекла.")
@@ -787,17 +742,12 @@ class OldChurchSlavonicBot:
             await self.send_message(
                 chat_id, 
                 "Вы уже ответили на этот вопрос или сессия истекла.",
-                {"inline_keyboard": [[{"text": "Получить новое задание", "callback_data": "get_assignment"}]]}
+                STALE_QUIZ_KEYBOARD
             )
             return
         
-        # Mark as answered
-        session['answered'] = True
-        
         # Parse answer
         try:
-            parts = callback_data.split("_", 2)
-            option_index = int(parts[1])
             user_answer = session['options'][option_index]  # Get full answer from session
             
             # Отвечаем на callback_query с ответом пользователя (отобразится как всплывающее уведомление от имени пользователя)
@@ -806,132 +756,7 @@ class OldChurchSlavonicBot:
             
             # Check if answer is correct
             is_correct = user_answer == session['correct_answer']
-            
-            # Get topic information
-            topic_id = session.get('topic_id')
-            current_bloom_level = session.get('bloom_level', 1)
-            
-            # Update progress based on answer correctness
-            new_bloom_level = current_bloom_level
-            if topic_id:
-                if is_correct:
-                    # Получаем текущее количество правильных ответов для этого уровня
-                    # И требуемое количество для перехода на следующий уровень
-                    required_answers = REQUIRED_CORRECT_ANSWERS[current_bloom_level] if current_bloom_level < len(REQUIRED_CORRECT_ANSWERS) else 5
-                    
-                    # Обновляем прогресс в базе данных
-                    db.update_topic_progress(user_id, topic_id, current_bloom_level, False, is_correct=True)
-                    
-                    # Получаем обновленные данные о прогрессе
-                    cursor = db.connection.cursor()
-                    cursor.execute("""
-                        SELECT correct_answers_count 
-                        FROM study_progress 
-                        WHERE user_id = %s AND study_plan_item_id = %s
-                    """, (user_id, topic_id))
-                    progress_data = cursor.fetchone()
-                    correct_answers_count = progress_data[0] if progress_data else 1
-                    
-                    # Проверяем, достаточно ли правильных ответов для перехода на следующий уровень
-                    if correct_answers_count >= required_answers and current_bloom_level < 6:
-                        # Если достаточно, увеличиваем уровень Блума (max 6)
-                        new_bloom_level = min(current_bloom_level + 1, 6)
-                        # Если достигнут уровень 6, помечаем тему как завершенную
-                        is_completed = (new_bloom_level == 6)
-                        
-                        # Обновляем уровень Блума и сбрасываем счетчик правильных ответов
-                        db.update_topic_progress(user_id, topic_id, new_bloom_level, is_completed, is_correct=False)
-                        
-                        # Если тема завершена, переходим к следующей теме
-                        if is_completed:
-                            next_topic = db.get_next_topic(user_id, topic_id)
-                            if next_topic:
-                                db.set_current_topic(user_id, next_topic["id"])
-                else:
-                    # Если ответ неверный, уменьшаем уровень Блума (min 1) и сбрасываем счетчик
-                    new_bloom_level = max(current_bloom_level - 1, 1)
-                    db.update_topic_progress(user_id, topic_id, new_bloom_level, False, is_correct=False)
-            
-            # Save progress to history
-            topic_name = "" if not topic_id else db.get_topic_name(topic_id)
-            db.save_progress(
-                user_id, 
-                topic_name,  # lesson_topic 
-                session['question'], 
-                user_answer,  # user_answer
-                session['correct_answer'],  # correct_answer
-                is_correct  # is_correct
-            )
-            
-            # Format response message with Bloom's taxonomy information
-            bloom_levels = [
-                "Запоминание",  # Remember
-                "Понимание",     # Understand
-                "Применение",   # Apply
-                "Анализ",        # Analyze
-                "Оценка",        # Evaluate
-                "Творчество"    # Create
-            ]
-            
-            # Get user avatar for personalized feedback
-            user_data = db.get_user(user_id)
-            avatar = user_data.get('avatar') if user_data else None
-            
-            # Generate personalized feedback based on avatar style
-            try:
-                feedback = await openai_service.generate_feedback(
-                    session['question'],
-                    user_answer,
-                    session['correct_answer'],
-                    is_correct,
-                    avatar=avatar
-                )
-                
-                # Add the feedback to the response
-                personalized_feedback = f"{feedback}\n\n"
-            except Exception as e:
-                logger.error(f"Error generating personalized feedback: {e}")
-                personalized_feedback = ""
-            
-            # Ответ пользователя отображается через всплывающее уведомление
-            
-            # Формируем сообщение с обратной связью
-            if is_correct:
-                response = f"🎉 **Правильно!**\n\n{personalized_feedback}"
-                
-                if topic_id and new_bloom_level > current_bloom_level:
-                    if new_bloom_level == 6:
-                        response += f"🌟 **Поздравляем!** Вы полностью освоили эту тему!\n\n"
-                    else:
-                        response += f"⬆️ Вы перешли на уровень **{bloom_levels[new_bloom_level-1]}** (уровень {new_bloom_level} из 6)\n\n"
-            else:
-                response = f"🚫 **Неверно**\n\n{personalized_feedback}"
-                response += f"Правильный ответ: {session['correct_answer']}\n\n"
-                
-                if topic_id and new_bloom_level < current_bloom_level:
-                    response += f"⬇️ Вам нужно больше практики. Возврат на уровень **{bloom_levels[new_bloom_level-1]}** (уровень {new_bloom_level} из 6)\n\n"
-            
-            # Add buttons for next actions
-            keyboard = {
-                "inline_keyboard": [
-                    [{"text": "📖 Получить новое задание", "callback_data": "get_assignment"}],
-                    [{"text": "📋 Учебный план", "callback_data": "show_study_plan"}],
-                    [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
-                ]
-            }
-            
-            # Отправляем обратную связь как новое сообщение
-            await self.send_message(chat_id, response, keyboard)
-            
-            # Удаляем кнопки из исходного сообщения с заданием, но оставляем само сообщение
-            # Получаем исходное сообщение с заданием
-            original_message = f"📚 **Урок: {topic_name}**\n"
-            original_message += f"**Уровень: {bloom_levels[current_bloom_level-1]}** (уровень {current_bloom_level} из 6)\n\n"
-            original_message += f"{session['lesson']}\n\n"
-            original_message += f"❓ **Вопрос:**\n{session['question']}"
-            
-            # Обновляем исходное сообщение, убирая кнопки
-            await self.edit_message(chat_id, message_id, original_message)
+            await self.finish_quiz_answer(chat_id, message_id, user_id, session, user_answer, is_correct)
             
         except Exception as e:
             logger.error(f"Error handling quiz answer: {e}")
@@ -942,9 +767,169 @@ class OldChurchSlavonicBot:
             await self.send_message(
                 chat_id,
                 f"😔 Произошла ошибка при обработке ответа.",
-                {"inline_keyboard": [[{"text": "📖 Получить новое задание", "callback_data": "get_assignment"}]]}
+                NEW_ASSIGNMENT_KEYBOARD
             )
     
+    @instrument("handler")
+    async def handle_typed_answer(self, chat_id, user_id, text):
+        """Grade an answer sent as a message to a question that asks for one
+        
+        Returns False if the user has no such question open, the message is then not an answer.
+        """
+        session = await self.quiz_sessions.aget(user_id)
+        if not session or not session.get('typed') or session.get('answered'):
+            return False
+        # Claim the session atomically so that the answer is counted only once
+        session = await self.quiz_sessions.aclaim(user_id)
+        if not session:
+            return False
+        
+        try:
+            grade = grade_answer(text, session['correct_answer'], session['options'])
+            await self.finish_quiz_answer(
+                chat_id, session['message_id'], user_id, session, text, grade.is_correct,
+                exact=grade.kind == EXACT
+            )
+        except Exception as e:
+            logger.error(f"Error handling typed answer: {e}")
+            await self.send_message(
+                chat_id,
+                f"😔 Произошла ошибка при обработке ответа.",
+                NEW_ASSIGNMENT_KEYBOARD
+            )
+        return True
+    
+    async def finish_quiz_answer(self, chat_id, message_id, user_id, session, user_answer, is_correct, exact=True):
+        """Record a graded answer, update the Bloom level and send the feedback
+        
+        exact is False for a typed answer accepted despite differences in script, diacritics,
+        word order or a typo; the feedback then shows the correct spelling.
+        """
+        # Get topic information
+        topic_id = session.get('topic_id')
+        current_bloom_level = session.get('bloom_level', 1)
+        
+        # Update progress based on answer correctness
+        new_bloom_level = current_bloom_level
+        topic_changed = False
+        if topic_id:
+            if is_correct:
+                # Получаем текущее количество правильных ответов для этого уровня
+                # И требуемое количество для перехода на следующий уровень
+                required_answers = REQUIRED_CORRECT_ANSWERS[current_bloom_level] if current_bloom_level < len(REQUIRED_CORRECT_ANSWERS) else 5
+                
+                # Обновляем прогресс в базе данных
+                db.update_topic_progress(user_id, topic_id, current_bloom_level, False, is_correct=True)
+                
+                # Получаем обновленные данные о прогрессе
+                cursor = db.connection.cursor()
+                cursor.execute("""
+                    SELECT correct_answers_count 
+                    FROM study_progress 
+                    WHERE user_id = %s AND study_plan_item_id = %s
+                """, (user_id, topic_id))
+                progress_data = cursor.fetchone()
+                correct_answers_count = progress_data[0] if progress_data else 1
+                
+                # Проверяем, достаточно ли правильных ответов для перехода на следующий уровень
+                if correct_answers_count >= required_answers and current_bloom_level < 6:
+                    # Если достаточно, увеличиваем уровень Блума (max 6)
+                    new_bloom_level = min(current_bloom_level + 1, 6)
+                    # Если достигнут уровень 6, помечаем тему как завершенную
+                    is_completed = (new_bloom_level == 6)
+                    
+                    # Обновляем уровень Блума и сбрасываем счетчик правильных ответов
+                    db.update_topic_progress(user_id, topic_id, new_bloom_level, is_completed, is_correct=False)
+                    
+                    # Если тема завершена, переходим к следующей теме
+                    if is_completed:
+                        next_topic = db.get_next_topic(user_id, topic_id)
+                        if next_topic:
+                            db.set_current_topic(user_id, next_topic["id"])
+                            topic_changed = True
+            else:
+                # Если ответ неверный, уменьшаем уровень Блума (min 1) и сбрасываем счетчик
+                new_bloom_level = max(current_bloom_level - 1, 1)
+                db.update_topic_progress(user_id, topic_id, new_bloom_level, False, is_correct=False)
+        
+        # Save progress to history
+        topic_name = "" if not topic_id else db.get_topic_name(topic_id)
+        db.save_progress(
+            user_id, 
+            topic_name,  # lesson_topic 
+            session['question'], 
+            user_answer,  # user_answer
+            session['correct_answer'],  # correct_answer
+            is_correct  # is_correct
+        )
+        
+        # The next assignment is a new lesson if the level changed or the lesson has no questions left:
+        # generate it while the user reads the feedback
+        if topic_id and (new_bloom_level != current_bloom_level or not session.get('pending_questions')):
+            if topic_changed:
+                self.prefetcher.cancel(user_id)
+            elif is_correct or PREFETCH_ON_WRONG_ANSWER:
+                self.prefetch_lesson(user_id, topic_name, topic_id, new_bloom_level)
+            elif new_bloom_level != current_bloom_level:
+                # The prefetched lesson is for the level the user has just left
+                self.prefetcher.cancel(user_id)
+            # Otherwise a lesson prefetched for this topic and level is still the right one
+        
+        # Get user avatar for personalized feedback
+        user_data = db.get_user(user_id)
+        avatar = user_data.get('avatar') if user_data else None
+        
+        # Generate personalized feedback based on avatar style
+        try:
+            feedback = await openai_service.generate_feedback(
+                session['question'],
+                user_answer,
+                session['correct_answer'],
+                is_correct,
+                avatar=avatar,
+                user_id=user_id
+            )
+            
+            # Add the feedback to the response
+            personalized_feedback = f"{feedback}\n\n"
+        except Exception as e:
+            logger.error(f"Error generating personalized feedback: {e}")
+            personalized_feedback = ""
+        
+        # Ответ пользователя отображается через всплывающее уведомление
+        
+        # Формируем сообщение с обратной связью
+        if is_correct:
+            response = f"🎉 **Правильно!**\n\n{personalized_feedback}"
+            if not exact:
+                response += f"Точное написание: {session['correct_answer']}\n\n"
+            
+            if topic_id and new_bloom_level > current_bloom_level:
+                if new_bloom_level == 6:
+                    response += LEVEL_COMPLETED
+                else:
+                    response += level_up_line(new_bloom_level)
+        else:
+            response = f"🚫 **Неверно**\n\n{personalized_feedback}"
+            response += f"Правильный ответ: {session['correct_answer']}\n\n"
+            
+            if topic_id and new_bloom_level < current_bloom_level:
+                response += level_down_line(new_bloom_level)
+        
+        # Add buttons for next actions
+        keyboard = QUIZ_RESULT_KEYBOARD
+        
+        # Отправляем обратную связь как новое сообщение
+        await self.send_message(chat_id, response, keyboard)
+        
+        # Удаляем кнопки из исходного сообщения с заданием, но оставляем само сообщение
+        # Получаем исходное сообщение с заданием
+        original_message = lesson_text(topic_name, current_bloom_level, session['lesson'], session['question'])
+        
+        # Обновляем исходное сообщение, убирая кнопки
+        await self.edit_message(chat_id, message_id, original_message)
+    
+    @instrument("handler")
     async def handle_word_ritual(self, chat_id, message_id, user_id):
         """Handle the 'Ritual of the Word' feature"""
         # Show loading message
@@ -959,33 +944,27 @@ class OldChurchSlavonicBot:
                     chat_id,
                     message_id,
                     "😔 Не удалось получить слово для ритуала. Попробуйте позже.",
-                    {"inline_keyboard": [[{"text": "🏠 Главное меню", "callback_data": "main_menu"}]]}
+                    BACK_TO_MENU_KEYBOARD
                 )
                 return
             
             # Get the word and its meaning
-            word = word_data.get('word', '')
-            meaning = word_data.get('meaning_ru', '')
+            word = word_data.get('isv', '')
+            meaning = word_data.get('ru', '')
             
             # Get user avatar for personalized content
             user_data = db.get_user(user_id)
             avatar = user_data.get('avatar') if user_data else None
             
             # Generate ritual text using OpenAI
-            ritual_text = await openai_service.generate_word_ritual(word, meaning, avatar)
+            ritual_text = await openai_service.generate_word_ritual(word, meaning, avatar, user_id=user_id)
             
             # Format the ritual message
             message = f"🔮 **Ритуал словеси**\n\n"
             message += f"{ritual_text}"
             
             # Create keyboard with options
-            keyboard = {
-                "inline_keyboard": [
-                    [{"text": "🔮 Получить новое заклинание", "callback_data": "get_word_ritual"}],
-                    [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
-                    [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
-                ]
-            }
+            keyboard = RITUAL_KEYBOARD
             
             await self.edit_message(chat_id, message_id, message, keyboard)
             
@@ -995,9 +974,10 @@ class OldChurchSlavonicBot:
                 chat_id,
                 message_id,
                 "😔 Произошла ошибка при создании ритуала. Попробуйте снова.",
-                {"inline_keyboard": [[{"text": "🏠 Главное меню", "callback_data": "main_menu"}]]}
+                BACK_TO_MENU_KEYBOARD
             )
     
+    @instrument("handler")
     async def show_progress(self, chat_id, message_id, user_id):
         """Show user progress as a chronicle"""
         user_data = db.get_user(user_id)
@@ -1011,21 +991,12 @@ class OldChurchSlavonicBot:
         first_name = user_data.get('first_name', 'Странник')
         
         # Generate chronicle using current date in Inter-Slavic style
-        current_year = datetime.now().year
+        today = datetime.now()
+        current_year = today.year
         byzantine_year = current_year + 5508  # Byzantine calendar
-        month_name = datetime.now().strftime("%B")
-        day = datetime.now().day
-        
-        # Russian month names in old style
-        month_names = {
-            "January": "января", "February": "февраля", "March": "марта",
-            "April": "апреля", "May": "мая", "June": "июня",
-            "July": "июля", "August": "августа", "September": "сентября",
-            "October": "октября", "November": "ноября", "December": "декабря"
-        }
         
         chronicle = f"📜 **Летопись ученого инока {first_name}**\n\n"
-        chronicle += f"В лето {byzantine_year} ({current_year} от Р.Х.), месяца {month_names.get(month_name, month_name)} {day} дня...\n\n"
+        chronicle += f"В лето {byzantine_year} ({current_year} от Р.Х.), месяца {month_name_genitive(today.month)} {today.day} дня...\n\n"
         
         # Add statistics
         total = stats.get('total_lessons', 0)
@@ -1049,88 +1020,155 @@ class OldChurchSlavonicBot:
         
         chronicle += f"\n*Аще тако преуспеет {first_name}, и будет ему даровано знание глаголицы...*"
         
-        keyboard = {
-            "inline_keyboard": [
-                [{"text": "📖 Получить задание", "callback_data": "get_assignment"}],
-                [{"text": "🏠 Главное меню", "callback_data": "main_menu"}]
-            ]
-        }
+        keyboard = PROGRESS_KEYBOARD
         
         await self.edit_message(chat_id, message_id, chronicle, keyboard)
     
+    # Callback routes: adapters from a CallbackQuery to the handlers above
+    
+    @callbacks.on("next_intro")
+    async def on_next_intro(self, query):
+        await self.handle_level_selection(query.chat_id, query.message_id)
+    
+    @callbacks.prefix("level_")
+    async def on_level(self, query):
+        await self.handle_goal_selection(query.chat_id, query.message_id, query.args[0])
+    
+    @callbacks.prefix("goal_")
+    async def on_goal(self, query):
+        await self.handle_avatar_selection(query.chat_id, query.message_id, query.args[0], query.user_id)
+    
+    @callbacks.prefix("avatar_")
+    async def on_avatar(self, query):
+        await self.complete_onboarding(query.chat_id, query.message_id, query.args[0], query.user_id)
+    
+    @callbacks.on("get_assignment", ack=False)
+    async def on_get_assignment(self, query):
+        # Runs in the background so that a double tap or navigation is handled meanwhile
+        _, started = self.generations.start(
+            query.user_id, lambda: self.handle_get_assignment(query.chat_id, query.message_id, query.user_id)
+        )
+        await self.answer_callback_query(query.id, None if started else "⏳ Задание уже готовится...")
+    
+    @callbacks.action(ACTION_ANSWER, ack=False)
+    @callbacks.prefix("answer_", ack=False)  # legacy "answer_<index>_<option text>" buttons
+    async def on_answer(self, query):
+        # handle_quiz_answer answers the callback query itself with the chosen option
+        answer = parse_answer(query.data)
+        if answer is None:
+            await self.answer_callback_query(query.id, "Эта кнопка устарела.")
+            return
+        nonce, option_index = answer
+        await self.handle_quiz_answer(query.chat_id, query.message_id, query.user_id, option_index, query.id, nonce)
+    
+    @callbacks.on("show_progress")
+    async def on_show_progress(self, query):
+        self.generations.cancel(query.user_id)
+        await self.show_progress(query.chat_id, query.message_id, query.user_id)
+    
+    @callbacks.on("show_study_plan")
+    async def on_show_study_plan(self, query):
+        self.generations.cancel(query.user_id)
+        await self.show_study_plan(query.chat_id, query.message_id, query.user_id)
+    
+    @callbacks.on("get_word_ritual")
+    async def on_get_word_ritual(self, query):
+        self.generations.cancel(query.user_id)
+        await self.handle_word_ritual(query.chat_id, query.message_id, query.user_id)
+    
+    @callbacks.on("next_topic")
+    async def on_next_topic(self, query):
+        self.generations.cancel(query.user_id)
+        await self.handle_next_topic(query.chat_id, query.message_id, query.user_id)
+    
+    @callbacks.on("prev_topic")
+    async def on_prev_topic(self, query):
+        self.generations.cancel(query.user_id)
+        await self.handle_prev_topic(query.chat_id, query.message_id, query.user_id)
+    
+    @callbacks.on("main_menu")
+    async def on_main_menu(self, query):
+        self.prefetcher.cancel(query.user_id)
+        self.generations.cancel(query.user_id)
+        user_data = db.get_user(query.user_id)
+        first_name = user_data.get('first_name', 'друг') if user_data else 'друг'
+        await self.show_main_menu(query.chat_id, first_name, query.message_id)
+    
+    async def process_update(self, update):
+        """Dispatch a single Telegram update to its handler"""
+        # Handle messages
+        if "message" in update:
+            message = update["message"]
+            chat_id = message["chat"]["id"]
+            user = message["from"]
+            text = message.get("text", "")
+            
+            if text in ["/start", "/help"]:
+                self.generations.cancel(user["id"])
+                await self.handle_start_command(chat_id, user)
+            elif text and not text.startswith("/"):
+                # Any other text is an answer if the user has a question waiting for a typed one
+                await self.handle_typed_answer(chat_id, user["id"], text)
+        
+        # Handle callback queries
+        elif "callback_query" in update:
+            query = update["callback_query"]
+            chat_id = query["message"]["chat"]["id"]
+            message_id = query["message"]["message_id"]
+            user_id = query["from"]["id"]
+            data = query["data"]
+            
+            route = callbacks.resolve(data)
+            if route is None:
+                logger.warning(f"Unknown callback data: {data}")
+                await self.answer_callback_query(query["id"], "Эта кнопка устарела.")
+                return
+            handler, ack, args = route
+            # A callback redelivered after a restart must not answer a quiz or generate a lesson twice
+            if not db.claim_callback_query(query["id"]):
+                duplicate_updates.inc(reason="callback")
+                logger.info(f"Skipping already processed callback query {query['id']}")
+                return
+            if ack:
+                await self.answer_callback_query(query["id"])
+            await handler(self, CallbackQuery(query["id"], chat_id, message_id, user_id, data, args))
+    
     async def run(self):
         """Main bot loop"""
         logger.info("Starting Enhanced Inter-Slavic Bot...")
-        offset = None
         
-        while True:
-            try:
-                updates = await self.get_updates(offset)
-                
-                if updates.get("ok"):
-                    for update in updates.get("result", []):
-                        offset = update["update_id"] + 1
-                        
-                        # Handle messages
-                        if "message" in update:
-                            message = update["message"]
-                            chat_id = message["chat"]["id"]
-                            user = message["from"]
-                            text = message.get("text", "")
-                            
-                            if text in ["/start", "/help"]:
-                                await self.handle_start_command(chat_id, user)
-                        
-                        # Handle callback queries
-                        elif "callback_query" in update:
-                            query = update["callback_query"]
-                            chat_id = query["message"]["chat"]["id"]
-                            message_id = query["message"]["message_id"]
-                            user_id = query["from"]["id"]
-                            data = query["data"]
-                            
-                            await self.answer_callback_query(query["id"])
-                            
-                            # Handle different callback types
-                            if data == "next_intro":
-                                await self.handle_level_selection(chat_id, message_id)
-                            elif data.startswith("level_"):
-                                level = data.replace("level_", "")
-                                await self.handle_goal_selection(chat_id, message_id, level)
-                            elif data.startswith("goal_"):
-                                goal = data.replace("goal_", "")
-                                await self.handle_avatar_selection(chat_id, message_id, goal, user_id)
-                            elif data.startswith("avatar_"):
-                                avatar = data.replace("avatar_", "")
-                                await self.complete_onboarding(chat_id, message_id, avatar, user_id)
-                            elif data == "get_assignment":
-                                await self.handle_get_assignment(chat_id, message_id, user_id)
-                            elif data.startswith("answer_"):
-                                # Передаем callback_query_id в метод handle_quiz_answer
-                                await self.handle_quiz_answer(chat_id, message_id, user_id, data, query["id"])
-                            elif data == "show_progress":
-                                await self.show_progress(chat_id, message_id, user_id)
-                            elif data == "show_study_plan":
-                                await self.show_study_plan(chat_id, message_id, user_id)
-                            elif data == "get_word_ritual":
-                                await self.handle_word_ritual(chat_id, message_id, user_id)
-                            elif data == "next_topic":
-                                await self.handle_next_topic(chat_id, message_id, user_id)
-                            elif data == "prev_topic":
-                                await self.handle_prev_topic(chat_id, message_id, user_id)
-                            elif data == "main_menu":
-                                user_data = db.get_user(user_id)
-                                first_name = user_data.get('first_name', 'друг') if user_data else 'друг'
-                                await self.show_main_menu(chat_id, first_name, message_id)
-                
-                await asyncio.sleep(2)  # Increased sleep time
-                
-            except Exception as e:
-                logger.error(f"Error in bot loop: {e}", exc_info=True)
-                await asyncio.sleep(10)  # Longer sleep on error
+        try:
+            while True:
+                try:
+                    updates = await self.get_updates(self.updates.offset)
+                    
+                    if updates.get("ok"):
+                        for update in updates.get("result", []):
+                            update_id = update["update_id"]
+                            if self.updates.is_duplicate(update_id):
+                                continue
+                            try:
+                                await self.process_update(update)
+                            finally:
+                                # A failing update is not retried, like before
+                                self.updates.mark_processed(update_id)
+                        # Also writes the offset out when polling is idle
+                        self.updates.maybe_flush()
+                    else:
+                        # getUpdates long-polls on the server, only back off on errors
+                        await asyncio.sleep(2)
+                    
+                except Exception as e:
+                    logger.error(f"Error in bot loop: {e}", exc_info=True)
+                    await asyncio.sleep(10)  # Longer sleep on error
+        finally:
+            self.updates.flush()
 
 async def main():
+    await services.init(TELEGRAM_BOT_TOKEN)
     bot = OldChurchSlavonicBot(TELEGRAM_BOT_TOKEN)
+    await start_metrics_reporting(METRICS_PORT, METRICS_LOG_INTERVAL)
+    asyncio.create_task(usage_tracker.run_flusher(LLM_USAGE_FLUSH_INTERVAL))
     await bot.run()
 
 if __name__ == "__main__":
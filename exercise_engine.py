@@ -0,0 +1,285 @@
+"""Quiz questions built locally from the words table, without an OpenAI call
+
+For the lower Bloom levels ("Слово дня", "Найди смысл") a question is a
+dictionary lookup: what a word means, how a Russian word is said in
+Interslavic, which word does not belong. The engine keeps a pool of words in
+memory, grouped by part of speech and level, and builds lessons in the same
+format OpenAIService.generate_lesson_and_quiz returns, so the bot serves them
+unchanged. Distractors are the target's look-alikes from the distractor
+index, or else words of the same part of speech and level from the pool.
+"""
+
+import asyncio
+import random
+import threading
+import time
+from config import EXERCISE_WORD_POOL_SIZE, EXERCISE_POOL_TTL_SECONDS, logger
+from metrics import registry
+from prompts import TASK_TYPES
+
+local_exercises = registry.counter("local_exercises_total", "Questions built by the local exercise engine by kind")
+
+KIND_MEANING = "meaning"
+KIND_REVERSE = "reverse"
+KIND_ODD_ONE_OUT = "odd_one_out"
+
+# Question kinds per Bloom level: recall at level 1, recognising meaning and category at level 2
+LEVEL_KINDS = {
+    1: (KIND_MEANING, KIND_REVERSE),
+    2: (KIND_MEANING, KIND_REVERSE, KIND_ODD_ONE_OUT),
+}
+
+OPTION_COUNT = 4
+
+# The lesson part of a local assignment; it must not give the answers away
+LESSON_INTROS = {
+    1: "Тема «{topic}». Слово дня: вспомни, что значат слова межславянского словаря и как они звучат. "
+       "Межславянский понятен носителям всех славянских языков, многие слова узнаются сразу.",
+    2: "Тема «{topic}». Найди смысл: узнай значение слова по его облику и отличи, к какой части речи "
+       "относятся слова. Существительные чаще оканчиваются на -a, -o или согласный, глаголы — на -ti.",
+}
+
+# Part-of-speech categories by the prefix of the dictionary's part_of_speech ("v. tr. ipf.", "m.anim.", ...)
+NOUN, VERB, ADJECTIVE, ADVERB, OTHER = "noun", "verb", "adjective", "adverb", "other"
+CATEGORY_PLURALS = {
+    NOUN: "существительные", VERB: "глаголы", ADJECTIVE: "прилагательные", ADVERB: "наречия",
+}
+
+
+def pos_category(part_of_speech):
+    """Coarse part of speech of a dictionary entry"""
+    pos = (part_of_speech or "").strip().lower()
+    if pos.startswith("v."):
+        return VERB
+    if pos.startswith("adj."):
+        return ADJECTIVE
+    if pos.startswith("adv."):
+        return ADVERB
+    if pos[:2] in ("m.", "f.", "n.") or pos.startswith("m/f"):
+        return NOUN
+    return OTHER
+
+
+def primary_sense(translation):
+    """First meaning of a translation such as "мир, покой" (a short, unambiguous option text)"""
+    return translation.replace(";", ",").split(",")[0].strip()
+
+
+class _Word:
+    __slots__ = ("id", "isv", "sense", "category", "level")
+
+    def __init__(self, row):
+        self.id = row["id"]
+        self.isv = row["isv"]
+        self.sense = primary_sense(row["ru"])
+        self.category = pos_category(row.get("partOfSpeech"))
+        self.level = row.get("level") or ""
+
+
+class ExerciseEngine:
+    """Builds multiple-choice lessons from a cached pool of dictionary words"""
+
+    def __init__(self, database=None, pool_size=EXERCISE_WORD_POOL_SIZE, ttl=EXERCISE_POOL_TTL_SECONDS, index=None):
+        self._database = database
+        self._index = index
+        self.pool_size = pool_size
+        self.ttl = ttl
+        self.words = []
+        # (category, level) -> words and category -> words, for picking distractors
+        self.by_group = {}
+        self.by_category = {}
+        self.loaded_at = None
+        self.lock = threading.Lock()
+        # The running background reload, if any
+        self.refreshing = None
+
+    @property
+    def database(self):
+        if self._database is None:
+            from database import db
+            self._database = db
+        return self._database
+
+    def supports(self, bloom_level):
+        return bloom_level in LEVEL_KINDS
+
+    def load(self, rows=None):
+        """(Re)load the word pool from the database, or from the given rows"""
+        if rows is None:
+            rows = self.database.get_exercise_words(self.pool_size)
+        if not rows:
+            # get_exercise_words returns nothing when the database is down: keep the old pool, retry next time
+            logger.warning("No exercise words loaded, keeping the previous pool")
+            return len(self.words)
+        words = []
+        seen = set()
+        for row in rows:
+            if not row.get("isv") or not row.get("ru"):
+                continue
+            word = _Word(row)
+            # Homographs with the same first meaning would make two options identical
+            if word.sense and (word.isv, word.sense) not in seen:
+                seen.add((word.isv, word.sense))
+                words.append(word)
+        by_group, by_category = {}, {}
+        for word in words:
+            by_group.setdefault((word.category, word.level), []).append(word)
+            by_category.setdefault(word.category, []).append(word)
+        with self.lock:
+            self.words, self.by_group, self.by_category = words, by_group, by_category
+            self.loaded_at = time.monotonic()
+        logger.info(f"Exercise engine loaded {len(words)} words")
+        return len(words)
+
+    def refresh(self):
+        """Reload the pool in a worker thread; returns the task of the reload already running, if any"""
+        if self.refreshing is None or self.refreshing.done():
+            self.refreshing = asyncio.ensure_future(asyncio.to_thread(self.load))
+            self.refreshing.add_done_callback(self._refreshed)
+        return self.refreshing
+
+    @staticmethod
+    def _refreshed(task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"Failed to load the exercise word pool: {task.exception()}")
+
+    def _ensure_loaded(self):
+        """Start a reload of a missing or expired pool without waiting for it
+        
+        The words table query must not hold up the event loop: until the reload
+        finishes the stale pool is served, and without any pool generate()
+        returns None so the lesson comes from OpenAI.
+        """
+        if self.loaded_at is not None and time.monotonic() - self.loaded_at <= self.ttl:
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            # Outside the bot (scripts, benchmarks) loading in place blocks nothing
+            self.load()
+            return
+        self.refresh()
+
+    @property
+    def index(self):
+        if self._index is None:
+            from distractor_index import distractor_index
+            self._index = distractor_index
+        return self._index
+
+    def _distractors(self, target, key, count, generator):
+        """`count` words whose `key` differs from the target's and from each other, closest group first
+
+        Words spelled like the target or sharing its meaning (synonyms) are skipped: they would be a second
+        right answer. The look-alikes from the distractor index come first; the pool fills in for words it
+        does not cover.
+        """
+        chosen, values = [], {key(target)}
+        groups = (
+            self.index.distractors(target.id),
+            self.by_group.get((target.category, target.level), ()),
+            self.by_category.get(target.category, ()),
+            self.words
+        )
+        for group in groups:
+            for word in generator.sample(group, min(len(group), count * 4)) if group else ():
+                if word.isv == target.isv or word.sense == target.sense:
+                    continue
+                if key(word) not in values:
+                    values.add(key(word))
+                    chosen.append(word)
+                    if len(chosen) == count:
+                        return chosen
+        return None
+
+    def _options(self, correct, wrong, generator):
+        options = [correct] + wrong
+        generator.shuffle(options)
+        return options
+
+    def _meaning(self, target, generator):
+        wrong = self._distractors(target, lambda word: word.sense, OPTION_COUNT - 1, generator)
+        if wrong is None:
+            return None
+        return {
+            "question": f"Что означает межславянское слово «{target.isv}»?",
+            "options": self._options(target.sense, [word.sense for word in wrong], generator),
+            "correct_answer": target.sense
+        }
+
+    def _reverse(self, target, generator):
+        wrong = self._distractors(target, lambda word: word.isv, OPTION_COUNT - 1, generator)
+        if wrong is None:
+            return None
+        return {
+            "question": f"Как на межславянском будет «{target.sense}»?",
+            "options": self._options(target.isv, [word.isv for word in wrong], generator),
+            "correct_answer": target.isv
+        }
+
+    def _odd_one_out(self, target, generator):
+        """Three words of the target's part of speech and one of another; the other one is the answer"""
+        if target.category not in CATEGORY_PLURALS:
+            return None
+        other_categories = [category for category in self.by_category if category != target.category]
+        same = self.by_category.get(target.category, ())
+        if not other_categories or len(same) < OPTION_COUNT - 1:
+            return None
+        odd = generator.choice(self.by_category[generator.choice(other_categories)])
+        group = {target.isv}
+        for word in generator.sample(same, min(len(same), OPTION_COUNT * 2)):
+            group.add(word.isv)
+            if len(group) == OPTION_COUNT - 1:
+                break
+        if len(group) < OPTION_COUNT - 1 or odd.isv in group:
+            return None
+        return {
+            "question": f"Какое слово лишнее? Остальные — {CATEGORY_PLURALS[target.category]}.",
+            "options": self._options(odd.isv, sorted(group), generator),
+            "correct_answer": odd.isv
+        }
+
+    def generate(self, topic_name, bloom_level, question_count=1, seed=None):
+        """A lesson in the OpenAI lesson format, or None if the level is not served locally or words are missing"""
+        kinds = LEVEL_KINDS.get(bloom_level)
+        if not kinds:
+            return None
+        started = time.perf_counter()
+        self._ensure_loaded()
+        generator = random.Random(seed)
+        if len(self.words) < OPTION_COUNT:
+            return None
+
+        builders = {KIND_MEANING: self._meaning, KIND_REVERSE: self._reverse, KIND_ODD_ONE_OUT: self._odd_one_out}
+        questions = []
+        # Every question asks about a different word; a few spare attempts cover words without distractors
+        for target in generator.sample(self.words, min(len(self.words), question_count * 3)):
+            kind = kinds[len(questions) % len(kinds)]
+            question = builders[kind](target, generator)
+            if question is None and kind == KIND_ODD_ONE_OUT:
+                kind, question = KIND_MEANING, self._meaning(target, generator)
+            if question is None:
+                continue
+            local_exercises.inc(kind=kind)
+            questions.append(question)
+            if len(questions) == question_count:
+                break
+        if not questions:
+            return None
+
+        lesson = {
+            "lesson": LESSON_INTROS[bloom_level].format(topic=topic_name),
+            "task_type": TASK_TYPES[bloom_level],
+            **questions[0]
+        }
+        if len(questions) > 1:
+            lesson["questions"] = questions
+        logger.info(
+            f"Built {len(questions)} local questions for level {bloom_level} "
+            f"in {(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        return lesson
+
+
+# Global exercise engine instance
+exercise_engine = ExerciseEngine()
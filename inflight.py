@@ -0,0 +1,58 @@
+import asyncio
+from config import logger
+from metrics import registry
+
+generation_requests = registry.counter(
+    "generation_requests_total", "Per-user generation requests by result (started/joined/cancelled)"
+)
+
+
+class InFlightGenerations:
+    """At most one running generation per user, detached from the update loop
+
+    A generation (e.g. a new assignment) runs as a task of its own, so that
+    the next update of the same user is handled while it is still running.
+    Asking again while it runs (a double tap) joins the running task instead
+    of starting a second OpenAI call, and navigating elsewhere cancels it, so
+    a result nobody waits for does not hold an OpenAI slot.
+    """
+
+    def __init__(self):
+        self.tasks = {}
+
+    def running(self, user_id):
+        task = self.tasks.get(user_id)
+        return task is not None and not task.done()
+
+    def start(self, user_id, factory):
+        """(task, started): the user's running generation, or a new one running factory()"""
+        task = self.tasks.get(user_id)
+        if task is not None and not task.done():
+            generation_requests.inc(result="joined")
+            return task, False
+        task = asyncio.create_task(factory())
+        self.tasks[user_id] = task
+        task.add_done_callback(lambda done: self._finished(user_id, done))
+        generation_requests.inc(result="started")
+        return task, True
+
+    def _finished(self, user_id, task):
+        if self.tasks.get(user_id) is task:
+            del self.tasks[user_id]
+        if not task.cancelled() and task.exception():
+            logger.error(f"Generation for user {user_id} failed: {task.exception()}")
+
+    def cancel(self, user_id):
+        """Cancel the user's running generation; True if there was one"""
+        task = self.tasks.pop(user_id, None)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        generation_requests.inc(result="cancelled")
+        return True
+
+    async def wait(self, user_id):
+        """Wait until the user's running generation (if any) has finished"""
+        task = self.tasks.get(user_id)
+        if task is not None:
+            await asyncio.wait([task])
@@ -0,0 +1,158 @@
+import asyncio
+import threading
+import time
+from datetime import date, datetime
+from config import LLM_USAGE_BATCH_SIZE, LLM_USER_DAILY_TOKEN_BUDGET
+from metrics import registry
+
+# Generation types reported by OpenAIService
+FEATURE_LESSON = "lesson"
+FEATURE_FEEDBACK = "feedback"
+FEATURE_STUDY_PLAN = "study_plan"
+FEATURE_RITUAL = "ritual"
+
+# Unflushed records beyond this are dropped (oldest first) if the database is down
+MAX_PENDING_RECORDS = 10000
+
+llm_tokens = registry.counter("llm_tokens_total", "OpenAI tokens by feature, model and kind (prompt/completion/cached)")
+llm_calls = registry.counter("llm_calls_total", "OpenAI calls by feature, model and status")
+llm_latency = registry.histogram("llm_latency_seconds", "OpenAI call latency by feature and model")
+
+
+class BudgetExceeded(Exception):
+    """Raised when a user has spent the daily OpenAI token budget"""
+
+
+def usage_tokens(usage):
+    """Extract (prompt, completion, cached) token counts from a response.usage object"""
+    if usage is None:
+        return 0, 0, 0
+    details = getattr(usage, "prompt_tokens_details", None)
+    cached = getattr(details, "cached_tokens", 0) if details else 0
+    return usage.prompt_tokens or 0, usage.completion_tokens or 0, cached or 0
+
+
+class UsageTracker:
+    """Aggregates OpenAI usage in-process and flushes it to the llm_usage table in batches"""
+
+    def __init__(self, database=None, batch_size=LLM_USAGE_BATCH_SIZE, daily_budget=LLM_USER_DAILY_TOKEN_BUDGET):
+        self._database = database
+        self.batch_size = batch_size
+        self.daily_budget = daily_budget
+        self.pending = []
+        self.lock = threading.Lock()
+        # (feature, model) -> [calls, prompt_tokens, completion_tokens, cached_tokens, latency_sum]
+        self.totals = {}
+        # user_id -> tokens spent today; reset when the date changes
+        self.user_tokens = {}
+        self.day = date.today()
+
+    @property
+    def database(self):
+        if self._database is None:
+            from database import db
+            self._database = db
+        return self._database
+
+    def record(self, feature, model, usage=None, latency=0.0, user_id=None, status="ok"):
+        """Account one OpenAI call"""
+        prompt_tokens, completion_tokens, cached_tokens = usage_tokens(usage)
+
+        llm_calls.inc(feature=feature, model=model, status=status)
+        llm_latency.observe(latency, feature=feature, model=model)
+        llm_tokens.inc(prompt_tokens, feature=feature, model=model, kind="prompt")
+        llm_tokens.inc(completion_tokens, feature=feature, model=model, kind="completion")
+        llm_tokens.inc(cached_tokens, feature=feature, model=model, kind="cached")
+
+        with self.lock:
+            totals = self.totals.setdefault((feature, model), [0, 0, 0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += prompt_tokens
+            totals[2] += completion_tokens
+            totals[3] += cached_tokens
+            totals[4] += latency
+
+            if user_id:
+                self._roll_day()
+                self.user_tokens[user_id] = self.user_tokens.get(user_id, 0) + prompt_tokens + completion_tokens
+
+            self.pending.append((
+                user_id, feature, model, prompt_tokens, completion_tokens,
+                cached_tokens, int(latency * 1000), status, datetime.now()
+            ))
+            if len(self.pending) > MAX_PENDING_RECORDS:
+                del self.pending[:len(self.pending) - MAX_PENDING_RECORDS]
+
+    def _roll_day(self):
+        today = date.today()
+        if today != self.day:
+            self.day = today
+            self.user_tokens = {}
+
+    def tokens_today(self, user_id):
+        """Tokens spent on a user today (seeded from the database on first use)
+
+        "Today" is the local calendar day, both here and in the database query:
+        records are stamped with the local time, and the budget resets at midnight
+        whether or not the process was restarted in between.
+        """
+        with self.lock:
+            self._roll_day()
+            day = self.day
+            spent = self.user_tokens.get(user_id)
+        if spent is None:
+            spent = self.database.get_user_llm_tokens(user_id, since=datetime.combine(day, datetime.min.time()))
+            with self.lock:
+                # Calls recorded while we were querying are already in the dict
+                spent = self.user_tokens[user_id] = self.user_tokens.get(user_id, 0) + spent
+        return spent
+
+    def check_budget(self, user_id):
+        """Raise BudgetExceeded if the user has no tokens left today"""
+        if not self.daily_budget or not user_id:
+            return
+        if self.tokens_today(user_id) >= self.daily_budget:
+            raise BudgetExceeded(f"User {user_id} exceeded the daily budget of {self.daily_budget} tokens")
+
+    def flush(self):
+        """Write pending records to the database; keeps them if the insert fails"""
+        with self.lock:
+            records, self.pending = self.pending, []
+        if not records:
+            return 0
+        if self.database.save_llm_usage(records):
+            return len(records)
+        with self.lock:
+            self.pending = records + self.pending
+        return 0
+
+    async def run_flusher(self, interval):
+        """Flush every `interval` seconds, or sooner once a full batch is pending"""
+        last_flush = time.monotonic()
+        while True:
+            await asyncio.sleep(min(interval, 1.0))
+            if len(self.pending) >= self.batch_size or time.monotonic() - last_flush >= interval:
+                self.flush()
+                last_flush = time.monotonic()
+
+    def summary(self):
+        """Per (feature, model) totals since process start, most expensive first"""
+        with self.lock:
+            rows = [
+                {
+                    "feature": feature,
+                    "model": model,
+                    "calls": calls,
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "cached_tokens": cached_tokens,
+                    "avg_latency": latency_sum / calls if calls else 0.0
+                }
+                for (feature, model), (calls, prompt_tokens, completion_tokens, cached_tokens, latency_sum)
+                in self.totals.items()
+            ]
+        return sorted(rows, key=lambda row: row["prompt_tokens"] + row["completion_tokens"], reverse=True)
+
+
+# Global usage tracker
+usage_tracker = UsageTracker()
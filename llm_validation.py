@@ -0,0 +1,242 @@
+import json
+import re
+from metrics import registry
+
+MIN_OPTIONS = 2
+MAX_OPTIONS = 4
+
+# Answer letters as the model tends to use them: Cyrillic (LESSON_PROMPT) and Latin
+OPTION_LETTERS = ("АБВГ", "ABCD")
+
+# "Б) вода", "b. voda", "2 - voda" -> "вода" / "voda"
+_OPTION_PREFIX = re.compile(r"^\s*(?:[А-ГA-Da-dа-г]|[1-4])\s*[).:\-–]\s+")
+
+validation_results = registry.counter("llm_validation_total", "Validated LLM outputs by kind and result (valid/repaired/invalid)")
+validation_repairs = registry.counter("llm_repairs_total", "Repairs applied to LLM outputs by kind and repair")
+
+
+class LLMValidationError(ValueError):
+    """LLM output that cannot be repaired into the expected shape"""
+
+
+def compile_schema(fields):
+    """Compile {name: (type, required)} into a function returning a list of problems
+
+    The checks are built once, so validating a response is a tight loop over
+    prepared closures instead of re-interpreting the schema on every call.
+    """
+    checks = []
+    for name, (expected_type, required) in fields.items():
+        def check(data, name=name, expected_type=expected_type, required=required):
+            if name not in data or data[name] is None:
+                return f"missing {name}" if required else None
+            if not isinstance(data[name], expected_type):
+                return f"{name} is {type(data[name]).__name__}"
+            return None
+        checks.append(check)
+
+    def validate(data):
+        if not isinstance(data, dict):
+            return [f"expected an object, got {type(data).__name__}"]
+        return [problem for problem in (check(data) for check in checks) if problem]
+    return validate
+
+
+_validate_lesson = compile_schema({
+    "lesson": (str, True),
+    "question": (str, True),
+    "options": (list, True),
+    "correct_answer": (str, True),
+    "task_type": (str, False),
+})
+
+_validate_plan_item = compile_schema({
+    "topic": (str, True),
+    "description": (str, True),
+    "bloom_level": (int, True),
+})
+
+
+def parse_json(content):
+    """json.loads that also accepts a response wrapped in a ```json fence"""
+    content = content.strip()
+    if content.startswith("```"):
+        content = content.strip("`")
+        content = content[content.find("\n") + 1:] if content.lower().startswith("json") else content
+    return json.loads(content)
+
+
+def _normalize(text):
+    return " ".join(str(text).split()).casefold()
+
+
+def _match_answer(answer, options):
+    """Index of the option an answer refers to, or None"""
+    if answer in options:
+        return options.index(answer)
+    normalized = [_normalize(option) for option in options]
+    key = _normalize(answer)
+    if key in normalized:
+        return normalized.index(key)
+    # Bare letter or number: "Б", "b)", "2"
+    bare = key.rstrip(").:").strip()
+    if len(bare) == 1:
+        for letters in OPTION_LETTERS:
+            index = letters.casefold().find(bare)
+            if 0 <= index < len(options):
+                return index
+        if bare.isdigit() and 1 <= int(bare) <= len(options):
+            return int(bare) - 1
+    # "Б) вода" -> "вода"
+    stripped = _normalize(_OPTION_PREFIX.sub("", str(answer)))
+    if stripped in normalized:
+        return normalized.index(stripped)
+    return None
+
+
+def repair_lesson(data):
+    """Validate a generated lesson and repair it in place where that is deterministic
+
+    Repairs: strings are coerced and stripped, "А) "-style prefixes are
+    removed from options, duplicate and empty options are dropped, options
+    are trimmed to MAX_OPTIONS (always keeping the correct one), and a
+    correct_answer given as a letter, number or differently-cased text is
+    mapped to the option text. Raises LLMValidationError if the lesson is
+    still unusable.
+    """
+    repairs = []
+    if isinstance(data, dict):
+        for key in ("lesson", "question", "correct_answer", "task_type"):
+            if isinstance(data.get(key), (int, float)):
+                data[key] = str(data[key])
+                repairs.append("coerce_type")
+        if isinstance(data.get("options"), list):
+            options = [str(option).strip() for option in data["options"] if str(option).strip()]
+            if all(_OPTION_PREFIX.match(option) for option in options):
+                options = [_OPTION_PREFIX.sub("", option) for option in options]
+                repairs.append("strip_prefix")
+            unique = list(dict.fromkeys(options))
+            if len(unique) != len(data["options"]):
+                repairs.append("dedupe")
+            data["options"] = unique
+
+    problems = _validate_lesson(data)
+    if problems:
+        return _reject("lesson", problems)
+
+    options = data["options"]
+    index = _match_answer(data["correct_answer"], options)
+    if index is None:
+        return _reject("lesson", [f"correct_answer {data['correct_answer']!r} is not an option"])
+    if options[index] != data["correct_answer"]:
+        data["correct_answer"] = options[index]
+        repairs.append("map_answer")
+
+    if len(options) > MAX_OPTIONS:
+        correct = options[index]
+        others = [option for option in options if option != correct][:MAX_OPTIONS - 1]
+        # Keep the correct option where it was if it still fits, otherwise put it last
+        data["options"] = others[:index] + [correct] + others[index:] if index < MAX_OPTIONS else others + [correct]
+        repairs.append("trim_options")
+    if len(data["options"]) < MIN_OPTIONS:
+        return _reject("lesson", [f"only {len(data['options'])} distinct options"])
+
+    for key in ("lesson", "question"):
+        data[key] = data[key].strip()
+    return _accept("lesson", data, repairs)
+
+
+def repair_question_set(data):
+    """Validate a multi-question lesson: {"lesson", "task_type", "questions": [...]}
+
+    Every question is repaired like a single lesson; unusable questions are
+    dropped. Returns the lesson with the first question at the top level (so
+    it can be used wherever a single-question lesson is expected) and all
+    usable questions in "questions". A single-question response is accepted too.
+    """
+    if not isinstance(data, dict):
+        return _reject("question_set", [f"expected an object, got {type(data).__name__}"])
+    raw_questions = data.get("questions")
+    if not isinstance(raw_questions, list):
+        raw_questions = [data]
+
+    questions = []
+    for raw_question in raw_questions:
+        if not isinstance(raw_question, dict):
+            continue
+        candidate = {key: raw_question.get(key) for key in ("question", "options", "correct_answer")}
+        candidate["lesson"] = data.get("lesson")
+        try:
+            repaired = repair_lesson(candidate)
+        except LLMValidationError:
+            continue
+        question = {key: repaired[key] for key in ("question", "options", "correct_answer")}
+        if question["question"] not in (existing["question"] for existing in questions):
+            questions.append(question)
+
+    if not questions:
+        return _reject("question_set", ["no usable questions"])
+    if len(questions) < len(raw_questions):
+        validation_repairs.inc(kind="question_set", repair="drop_question")
+    validation_results.inc(kind="question_set", result="repaired" if len(questions) < len(raw_questions) else "valid")
+    lesson = {"lesson": data["lesson"].strip(), **questions[0], "questions": questions}
+    if isinstance(data.get("task_type"), str):
+        lesson["task_type"] = data["task_type"]
+    return lesson
+
+
+def repair_study_plan(data):
+    """Validate a generated study plan and return its list of items
+
+    Accepts {"study_plan": [...]}, a bare list or an object with a single
+    list value. Items without a topic are dropped, a missing description
+    becomes empty and bloom_level is coerced into 1-6.
+    """
+    repairs = []
+    if isinstance(data, dict):
+        if isinstance(data.get("study_plan"), list):
+            data = data["study_plan"]
+        else:
+            lists = [value for value in data.values() if isinstance(value, list)]
+            if len(lists) == 1:
+                data = lists[0]
+                repairs.append("unwrap")
+    if not isinstance(data, list):
+        return _reject("study_plan", ["no list of topics"])
+
+    items = []
+    for item in data:
+        if not isinstance(item, dict) or not str(item.get("topic") or "").strip():
+            repairs.append("drop_item")
+            continue
+        item["topic"] = str(item["topic"]).strip()
+        if not isinstance(item.get("description"), str):
+            item["description"] = str(item.get("description") or "")
+            repairs.append("coerce_type")
+        try:
+            level = min(6, max(1, int(item.get("bloom_level", 1))))
+        except (TypeError, ValueError):
+            level = 1
+        if level != item.get("bloom_level"):
+            item["bloom_level"] = level
+            repairs.append("bloom_level")
+        problems = _validate_plan_item(item)
+        if problems:
+            return _reject("study_plan", problems)
+        items.append(item)
+
+    if not items:
+        return _reject("study_plan", ["no usable topics"])
+    return _accept("study_plan", items, repairs)
+
+
+def _accept(kind, data, repairs):
+    for repair in set(repairs):
+        validation_repairs.inc(kind=kind, repair=repair)
+    validation_results.inc(kind=kind, result="repaired" if repairs else "valid")
+    return data
+
+
+def _reject(kind, problems):
+    validation_results.inc(kind=kind, result="invalid")
+    raise LLMValidationError(f"Invalid {kind}: {'; '.join(problems)}")
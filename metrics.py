@@ -0,0 +1,258 @@
+import asyncio
+import bisect
+import functools
+import inspect
+import threading
+import time
+from config import logger
+
+
+def _labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Counter:
+    """Monotonically increasing value"""
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self.values.get(_labels_key(labels), 0)
+
+
+class Gauge:
+    """Value that can go up and down (queue depth, in-flight requests)"""
+
+    def __init__(self, name, help_text=""):
+        self.name = name
+        self.help_text = help_text
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self.lock:
+            self.values[_labels_key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _labels_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        return self.values.get(_labels_key(labels), 0)
+
+
+class Histogram:
+    """Bucketed distribution of observed values (seconds by default)"""
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # labels -> [per-bucket counts (+ overflow), sum, count]
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _labels_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self.series.get(_labels_key(labels))
+        return series[2] if series else 0
+
+    def quantile(self, fraction, **labels):
+        """Estimate a quantile by linear interpolation inside the matching bucket"""
+        series = self.series.get(_labels_key(labels))
+        if not series or not series[2]:
+            return 0.0
+        rank = fraction * series[2]
+        seen = 0
+        for index, bucket_count in enumerate(series[0]):
+            if seen + bucket_count >= rank and bucket_count:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else lower * 2 or 1.0
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Process-wide collection of named metrics"""
+
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name, help_text, **kwargs):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = metric_class(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name, help_text=""):
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name, help_text=""):
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=Histogram.DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        for name, metric in sorted(self.metrics.items()):
+            if isinstance(metric, Histogram):
+                lines.append(f"# HELP {name} {metric.help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, (bucket_counts, total, count) in sorted(metric.series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(metric.buckets + (float("inf"),), bucket_counts):
+                        cumulative += bucket_count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_format_labels(key + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {total}")
+                    lines.append(f"{name}_count{_format_labels(key)} {count}")
+            else:
+                metric_type = "counter" if isinstance(metric, Counter) else "gauge"
+                lines.append(f"# HELP {name} {metric.help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for key, value in sorted(metric.values.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        """Short human-readable digest of all histograms, for periodic logging"""
+        parts = []
+        for name, metric in sorted(self.metrics.items()):
+            if not isinstance(metric, Histogram):
+                continue
+            for key, series in sorted(metric.series.items()):
+                labels = dict(key)
+                label_text = ",".join(f"{k}={v}" for k, v in key)
+                parts.append(
+                    f"{name}{{{label_text}}} n={series[2]} "
+                    f"p50={metric.quantile(0.5, **labels) * 1000:.0f}ms "
+                    f"p95={metric.quantile(0.95, **labels) * 1000:.0f}ms"
+                )
+        return "; ".join(parts)
+
+
+def _format_labels(key):
+    if not key:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in key)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(key, escaped)) + "}"
+
+# Global metrics registry
+registry = MetricsRegistry()
+
+# Time spent per stage: handler (bot callbacks), db, openai, telegram
+stage_seconds = registry.histogram("bot_stage_seconds", "Duration of bot handlers and their DB/OpenAI/Telegram calls")
+stage_errors = registry.counter("bot_stage_errors_total", "Exceptions raised per stage")
+
+
+def instrument(stage, name=None):
+    """Decorator recording the duration of a sync or async function in bot_stage_seconds"""
+    def decorator(function):
+        label = name or function.__name__
+
+        if inspect.iscoroutinefunction(function):
+            @functools.wraps(function)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await function(*args, **kwargs)
+                except Exception:
+                    stage_errors.inc(stage=stage, name=label)
+                    raise
+                finally:
+                    stage_seconds.observe(time.perf_counter() - started, stage=stage, name=label)
+            return async_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception:
+                stage_errors.inc(stage=stage, name=label)
+                raise
+            finally:
+                stage_seconds.observe(time.perf_counter() - started, stage=stage, name=label)
+        return wrapper
+    return decorator
+
+
+def instrument_methods(cls, stage, exclude=()):
+    """Wrap every public method of a class with instrument(stage)"""
+    for attribute, value in list(vars(cls).items()):
+        if attribute.startswith("_") or attribute in exclude or not inspect.isfunction(value):
+            continue
+        setattr(cls, attribute, instrument(stage, attribute)(value))
+    return cls
+
+
+async def _serve_metrics(reader, writer):
+    try:
+        request_line = await reader.readline()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        if request_line.split(b" ")[1:2] == [b"/metrics"]:
+            body, status = registry.render_prometheus().encode("utf-8"), "200 OK"
+        else:
+            body, status = b"not found\n", "404 Not Found"
+        writer.write(
+            f"HTTP/1.1 {status}\r\n"
+            "Content-Type: text/plain; version=0.0.4\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: close\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.warning(f"Metrics request failed: {e}")
+    finally:
+        writer.close()
+
+
+async def _log_summary(interval):
+    while True:
+        await asyncio.sleep(interval)
+        summary = registry.summary()
+        if summary:
+            logger.info(f"Metrics: {summary}")
+
+
+async def start_metrics_reporting(port=0, log_interval=0, host="127.0.0.1"):
+    """Serve /metrics on `port` and log a summary every `log_interval` seconds (0 disables)"""
+    tasks = []
+    if port:
+        server = await asyncio.start_server(_serve_metrics, host, port)
+        logger.info(f"Metrics endpoint listening on http://{host}:{port}/metrics")
+        tasks.append(asyncio.create_task(server.serve_forever()))
+    if log_interval:
+        tasks.append(asyncio.create_task(_log_summary(log_interval)))
+    return tasks
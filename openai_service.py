@@ -1,161 +1,137 @@
 import json
+import time
+import asyncio
 import openai
-from openai import OpenAI
-from config import OPENAI_API_KEY, LESSON_PROMPT, logger
+from openai import AsyncOpenAI
+from config import (
+    OPENAI_API_KEY, OPENAI_MAX_CONCURRENCY, MODEL_ROUTES,
+    OPENAI_BREAKER_ERROR_RATE, OPENAI_BREAKER_SLOW_SECONDS, OPENAI_BREAKER_SLOW_RATE,
+    OPENAI_BREAKER_WINDOW, OPENAI_BREAKER_MIN_CALLS, OPENAI_BREAKER_OPEN_SECONDS, logger
+)
+from metrics import instrument_methods
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+from llm_validation import LLMValidationError, parse_json, repair_lesson, repair_question_set, repair_study_plan
+from prompts import feedback_messages, lesson_messages, ritual_messages, study_plan_messages
+from llm_usage import (
+    BudgetExceeded, FEATURE_FEEDBACK, FEATURE_LESSON, FEATURE_RITUAL, FEATURE_STUDY_PLAN, usage_tracker
+)
+
+# Models, token limits and timeouts per generation type live in config.MODEL_ROUTES
+_client = None
+
+# Completion tokens added to a lesson's budget for every question beyond the first
+TOKENS_PER_EXTRA_QUESTION = 200
+
+
+def get_client():
+    """The process-wide AsyncOpenAI client, created on first use so that importing needs no API key"""
+    global _client
+    if _client is None:
+        _client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    return _client
+
+
+def route_for(feature, bloom_level=None):
+    """Model settings for a generation type, with a per-Bloom-level override if configured"""
+    if bloom_level is not None:
+        route = MODEL_ROUTES.get(f"{feature}:{bloom_level}")
+        if route:
+            return route
+    return MODEL_ROUTES[feature]
 
-# the newest OpenAI model is "gpt-4o" which was released May 13, 2024.
-# do not change this unless explicitly requested by the user
-client = OpenAI(api_key=OPENAI_API_KEY)
 
 class OpenAIService:
-    def __init__(self):
-        self.client = client
+    def __init__(self, max_concurrency=OPENAI_MAX_CONCURRENCY):
+        self._client = None
+        self.breaker = CircuitBreaker(
+            "openai",
+            error_rate=OPENAI_BREAKER_ERROR_RATE,
+            slow_seconds=OPENAI_BREAKER_SLOW_SECONDS,
+            slow_rate=OPENAI_BREAKER_SLOW_RATE,
+            window=OPENAI_BREAKER_WINDOW,
+            min_calls=OPENAI_BREAKER_MIN_CALLS,
+            open_seconds=OPENAI_BREAKER_OPEN_SECONDS
+        )
+        self.set_concurrency(max_concurrency)
     
-    async def generate_lesson_and_quiz(self, topic_name=None, bloom_level=1):
-        """
-        Generate a micro-lesson and quiz about Inter-Slavic using OpenAI API
-        based on the specified topic and Bloom's taxonomy level.
-        
-        Parameters:
-        - topic_name: The specific topic to create a lesson about (optional)
-        - bloom_level: Bloom's taxonomy level (1-6)
-                      1 = Remember, 2 = Understand, 3 = Apply,
-                      4 = Analyze, 5 = Evaluate, 6 = Create
-        
-        Returns a dictionary with lesson, question, options, and correct_answer
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+    
+    def set_concurrency(self, max_concurrency):
+        """Limit the number of simultaneous OpenAI requests from this process"""
+        self.max_concurrency = max(1, max_concurrency)
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+    
+    async def _create_completion(self, feature, user_id=None, bloom_level=None, **kwargs):
+        """Call the chat completions API within the concurrency budget
+
+        The model, max_tokens, temperature and timeout come from the feature's
+        route; on timeout the call is retried once on the route's fallback model.
+        Every attempt is accounted in llm_usage under its feature and user.
+        Raises BudgetExceeded if the user has spent the daily token budget and
+        CircuitOpenError without calling the API while OpenAI is failing.
         """
+        usage_tracker.check_budget(user_id)
+        self.breaker.before_call()
+        started = time.perf_counter()
         try:
-            # Define Bloom's taxonomy levels and corresponding task types
-            bloom_taxonomy = {
-                1: "запоминание (вспомнить факты, термины, основные понятия)",
-                2: "понимание (объяснить идеи или концепции, интерпретировать информацию)",
-                3: "применение (использовать информацию в новой ситуации)",
-                4: "анализ (выявить связи между идеями, структурировать информацию)",
-                5: "оценка (обосновать точку зрения, оценить решение)",
-                6: "творчество (создать новый продукт или точку зрения)"
-            }
-            
-            # Create prompt based on topic and Bloom's level
-            if topic_name:
-                prompt = f"""
-                Создай короткий урок и тест по теме "{topic_name}" в изучении межславянского языка.
-                
-                Задание должно соответствовать уровню {bloom_level} по таксономии Блума: {bloom_taxonomy[bloom_level]}.
-                
-                Урок должен быть кратким (3-5 предложений), но информативным, с примерами.
-                
-                Вопрос должен проверять именно уровень {bloom_taxonomy[bloom_level]}.
-                
-                Создай 4 варианта ответа, один из которых правильный.
-                
-                Верни результат в формате JSON с полями:
-                - lesson: текст урока
-                - question: вопрос по материалу урока
-                - options: массив из 4 вариантов ответа
-                - correct_answer: правильный ответ (должен точно совпадать с одним из вариантов в options)
-                """
-            else:
-                # Use default prompt if no topic specified
-                prompt = LESSON_PROMPT
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Ты опытный преподаватель межславянского языка. Создавай качественные образовательные материалы, соответствующие указанному уровню по таксономии Блума."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            # Parse the JSON response
-            content = response.choices[0].message.content
-            lesson_data = json.loads(content)
-            
-            # Validate the response structure
-            required_keys = ["lesson", "question", "options", "correct_answer"]
-            for key in required_keys:
-                if key not in lesson_data:
-                    raise ValueError(f"Missing required key: {key}")
-            
-            # Validate options list
-            if not isinstance(lesson_data["options"], list) or len(lesson_data["options"]) < 2:
-                raise ValueError("Options must be a list with at least 2 items")
-            
-            # Validate correct_answer is in options
-            if lesson_data["correct_answer"] not in lesson_data["options"]:
-                raise ValueError("Correct answer must be one of the options")
-            
-            logger.info("Successfully generated lesson and quiz")
-            return lesson_data
-            
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse OpenAI JSON response: {e}")
-            raise Exception("Ошибка при обработке ответа от AI. Попробуйте снова.")
-        
-        except openai.RateLimitError:
-            logger.error("OpenAI rate limit exceeded")
-            raise Exception("Превышен лимит запросов к AI. Попробуйте позже.")
-        
-        except openai.APIError as e:
-            logger.error(f"OpenAI API error: {e}")
-            raise Exception("Ошибка API. Попробуйте снова через несколько минут.")
-        
-        except Exception as e:
-            logger.error(f"Unexpected error in generate_lesson_and_quiz: {e}")
-            raise Exception("Произошла неожиданная ошибка. Попробуйте снова.")
-    
-    async def generate_feedback(self, question, user_answer, correct_answer, is_correct, avatar=None):
+            response = await self._create_routed_completion(feature, user_id, route_for(feature, bloom_level), kwargs)
+        except (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError):
+            # Timeouts, network errors, 429 and 5xx count against OpenAI; bad requests do not
+            self.breaker.record(time.perf_counter() - started, failed=True)
+            raise
+        except asyncio.CancelledError:
+            # A superseded or abandoned generation says nothing about OpenAI's health
+            self.breaker.release()
+            raise
+        except BaseException:
+            self.breaker.record(time.perf_counter() - started)
+            raise
+        self.breaker.record(time.perf_counter() - started)
+        return response
+
+    async def _create_routed_completion(self, feature, user_id, route, kwargs):
+        models = [route["model"]] + ([route["fallback"]] if route.get("fallback") else [])
+        # With a fallback configured, do not let the client retry the slow model first
+        api = self.client.with_options(max_retries=0) if len(models) > 1 else self.client
+
+        # Callers may raise max_tokens for longer outputs (several questions per lesson)
+        max_tokens = kwargs.pop("max_tokens", route["max_tokens"])
+
+        for attempt, model in enumerate(models):
+            async with self.semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await api.chat.completions.create(
+                        model=model,
+                        max_tokens=max_tokens,
+                        temperature=route["temperature"],
+                        timeout=route["timeout"],
+                        **kwargs
+                    )
+                except openai.APITimeoutError:
+                    usage_tracker.record(feature, model, None, time.perf_counter() - started, user_id, status="timeout")
+                    if attempt == len(models) - 1:
+                        raise
+                    logger.warning(f"OpenAI {feature} timed out on {model}, falling back to {models[attempt + 1]}")
+                    continue
+                except Exception:
+                    usage_tracker.record(feature, model, None, time.perf_counter() - started, user_id, status="error")
+                    raise
+            usage_tracker.record(feature, response.model or model, response.usage, time.perf_counter() - started, user_id)
+            return response
+
+    async def generate_feedback(self, question, user_answer, correct_answer, is_correct, avatar=None, user_id=None):
         """
         Generate feedback for the user's answer using OpenAI
         """
         try:
-            # Define avatar communication styles
-            avatar_styles = {
-                "vedunia": "Speak with warmth, wisdom, and encouragement. Use rich but understandable language. Be supportive and motherly.",
-                "bolgar": "Speak with clarity, depth, and honor. Be friendly and respectful. Convey a sense of being a reliable ally.",
-                "starec": "Speak in a calm, encouraging, and wise manner. Use meditative speech with notes of antiquity. Talk as if a grandfather to a grandson.",
-                "polyak": "Speak in a modern, playful, and lively style. Use youth language, humor, simplicity, and vigor."
-            }
-            
-            # Get the avatar style instruction
-            avatar_style = ""
-            if avatar and avatar in avatar_styles:
-                avatar_style = f"\n\nCommunication style: {avatar_styles[avatar]}\n"
-            
-            feedback_prompt = f"""
-            Пользователь отвечал на вопрос по межславянскому языку:
-            Вопрос: {question}
-            Правильный ответ: {correct_answer}
-            Ответ пользователя: {user_answer}
-            Результат: {'правильно' if is_correct else 'неправильно'}{avatar_style}
-            
-            Дай краткую обратную связь (1-2 предложения) на русском языке. 
-            Если ответ правильный - похвали и добавь интересный факт.
-            Если неправильный - объясни, почему правильный ответ верен.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system",
-                        "content": "Ты преподаватель межславянского языка. Давай конструктивную обратную связь студентам."
-                    },
-                    {
-                        "role": "user",
-                        "content": feedback_prompt
-                    }
-                ],
-                temperature=0.6,
-                max_tokens=200
+            response = await self._create_completion(
+                FEATURE_FEEDBACK, user_id,
+                messages=feedback_messages(question, user_answer, correct_answer, is_correct, avatar)
             )
             
             feedback = response.choices[0].message.content.strip()
@@ -170,87 +146,20 @@ class OpenAIService:
             else:
                 return f"❌ Неправильно. Правильный ответ: {correct_answer}"
 
-    async def generate_study_plan(self, level, goal, avatar=None):
+    async def generate_study_plan(self, level, goal, avatar=None, user_id=None):
         """
         Generate a study plan for learning Inter-Slavic based on user level and goal
         Returns a list of study plan items with topics, descriptions, and Bloom's taxonomy levels
         """
         try:
-            # Define avatar communication styles
-            avatar_styles = {
-                "vedunia": "Speak with warmth, wisdom, and encouragement. Use rich but understandable language. Be supportive and motherly.",
-                "bolgar": "Speak with clarity, depth, and honor. Be friendly and respectful. Convey a sense of being a reliable ally.",
-                "starec": "Speak in a calm, encouraging, and wise manner. Use meditative speech with notes of antiquity. Talk as if a grandfather to a grandson.",
-                "polyak": "Speak in a modern, playful, and lively style. Use youth language, humor, simplicity, and vigor."
-            }
-            
-            # Get the avatar style instruction
-            avatar_style = ""
-            if avatar and avatar in avatar_styles:
-                avatar_style = f"\n\nCommunication style: {avatar_styles[avatar]}\n"
-            
-            prompt = f"""
-            Create a study plan for learning Inter-Slavic (межславянский язык) for a user with level "{level}" 
-            and learning goal "{goal}". The plan should be based on the textbook "Interslavic zonal contructed language: An introduction" 
-            and contain sequential topics for study.{avatar_style}
-            
-            For each topic, provide:
-            1. Topic name (short, 3-5 words)
-            2. Brief description (1-2 sentences)
-            3. Bloom's taxonomy level (from 1 to 6)
-            
-            The study plan should include at least 10 topics, covering:
-            - Alphabet and pronunciation
-            - Basic vocabulary
-            - Grammar fundamentals
-            - Sentence structure
-            - Reading and comprehension
-            - Cultural context
-            
-            Return the result as a JSON array:
-            [
-              {{
-                "topic": "Topic name",
-                "description": "Brief description",
-                "bloom_level": 1
-              }},
-              ...
-            ]
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "You are an expert in Inter-Slavic language and pedagogical design. Create a structured study plan."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                response_format={"type": "json_object"},
-                temperature=0.7,
-                max_tokens=2000
+            response = await self._create_completion(
+                FEATURE_STUDY_PLAN, user_id,
+                messages=study_plan_messages(level, goal, avatar),
+                response_format={"type": "json_object"}
             )
             
-            # Parse the JSON response
-            content = response.choices[0].message.content
-            study_plan_data = json.loads(content)
-            
-            # Ensure we have a list of study plan items
-            if isinstance(study_plan_data, dict) and "study_plan" in study_plan_data:
-                study_plan_items = study_plan_data["study_plan"]
-            elif isinstance(study_plan_data, list):
-                study_plan_items = study_plan_data
-            else:
-                raise ValueError("Invalid study plan format")
-            
-            # Validate each item
-            for item in study_plan_items:
-                if not all(key in item for key in ["topic", "description", "bloom_level"]):
-                    raise ValueError(f"Missing required keys in study plan item: {item}")
+            # Parse the JSON response and validate the list of study plan items
+            study_plan_items = repair_study_plan(parse_json(response.choices[0].message.content))
             
             logger.info(f"Generated study plan with {len(study_plan_items)} topics")
             return study_plan_items
@@ -259,7 +168,8 @@ class OpenAIService:
             logger.error(f"Failed to generate study plan: {e}")
             raise Exception("Error generating study plan. Please try again.")
     
-    async def generate_lesson_and_quiz(self, topic=None, bloom_level=None, dictionary_words=None, avatar=None):
+    async def generate_lesson_and_quiz(self, topic=None, bloom_level=None, dictionary_words=None, avatar=None, user_id=None,
+                                       question_count=1, typed=False):
         """
         Generate a micro-lesson and quiz about Inter-Slavic using OpenAI API
         Returns a dictionary with lesson, question, options, and correct_answer
@@ -268,132 +178,49 @@ class OpenAIService:
         topic (str, optional): Topic for the lesson
         bloom_level (int, optional): Bloom's taxonomy level (1-6)
         dictionary_words (list, optional): List of dictionary words to use in the lesson
+        user_id (int, optional): User the tokens are accounted to
+        question_count (int, optional): Questions to generate for the lesson in one call
+        typed (bool, optional): The answers will be typed, ask for short single answers
         
         If topic and bloom_level are provided, generates content specific to that topic and level
         Otherwise, generates a random lesson
+        
+        With question_count > 1 the result also has "questions": every usable
+        question (the first one is repeated at the top level)
         """
         try:
-            # Define task types based on Bloom's taxonomy level
-            task_types = {
-                1: "Слово дня",
-                2: "Найди смысл",
-                3: "Собери фразу",
-                4: "Что здесь не так?",
-                5: "Сравни переводы",
-                6: "Сочини своё"
-            }
-            
-            # Подготовка словарных слов для использования в промпте
-            dictionary_content = ""
-            if dictionary_words and len(dictionary_words) > 0:
-                dictionary_content = "Use ONLY these Inter-Slavic words in your lesson and quiz:\n\n"
-                for word in dictionary_words:
-                    # Добавляем основную информацию о слове
-                    dictionary_content += f"- {word['isv']} "
-                    if word.get('addition'):
-                        dictionary_content += f"({word['addition']}) "
-                    dictionary_content += f"[{word.get('partOfSpeech', '')}]: "
-                    
-                    # Добавляем переводы на русский и английский
-                    translations = []
-                    if word.get('ru'):
-                        translations.append(f"RU: {word['ru']}")
-                    if word.get('en'):
-                        translations.append(f"EN: {word['en']}")
-                    
-                    dictionary_content += ", ".join(translations) + "\n"
-            
-            # Define avatar communication styles
-            avatar_styles = {
-                "vedunia": "Speak with warmth, wisdom, and encouragement. Use rich but understandable language. Be supportive and motherly.",
-                "bolgar": "Speak with clarity, depth, and honor. Be friendly and respectful. Convey a sense of being a reliable ally.",
-                "starec": "Speak in a calm, encouraging, and wise manner. Use meditative speech with notes of antiquity. Talk as if a grandfather to a grandson.",
-                "polyak": "Speak in a modern, playful, and lively style. Use youth language, humor, simplicity, and vigor."
-            }
-            
-            # Get the avatar style instruction
-            avatar_style = ""
-            if avatar and avatar in avatar_styles:
-                avatar_style = f"\n\nCommunication style: {avatar_styles[avatar]}\n"
-            
-            if topic and bloom_level:
-                # Generate content specific to the topic and Bloom's level
-                task_type = task_types.get(bloom_level, "Слово дня")
-                
-                prompt = f"""
-                Create a micro-lesson about Inter-Slavic (межславянский язык) on the topic "{topic}" 
-                with difficulty level {bloom_level} (Bloom's taxonomy).{avatar_style}
-                
-                Task type: "{task_type}"
-                
-                The lesson should include:
-                1. Brief theoretical explanation (3-5 sentences) in Russian
-                2. One question in the format corresponding to the task type
-                3. Answer options (2-4 options)
-                4. Correct answer
-                
-                Use materials from the textbook "Interslavic zonal contructed language: An introduction".
-                
-                {dictionary_content}
-                
-                Return the result in JSON format:
-                {{
-                  "lesson": "Theoretical explanation",
-                  "task_type": "{task_type}",
-                  "question": "Question",
-                  "options": ["Option 1", "Option 2", "Option 3", "Option 4"],
-                  "correct_answer": "Correct answer"
-                }}
-                """
-                
-                system_prompt = "You are an experienced Inter-Slavic language teacher. Create quality educational materials based on the textbook. Use ONLY the provided Inter-Slavic words to avoid hallucinations."
-            else:
-                # Use the default prompt for random lessons
-                prompt = LESSON_PROMPT
-                system_prompt = "Ты опытный преподаватель межславянского языка. Создавай качественные образовательные материалы для начинающих."
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": system_prompt
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
+            if not (topic and bloom_level):
+                question_count = 1
+            response = await self._create_completion(
+                FEATURE_LESSON, user_id, bloom_level,
+                messages=lesson_messages(topic, bloom_level, dictionary_words, avatar, question_count, typed),
                 response_format={"type": "json_object"},
-                temperature=0.7,
-                max_tokens=1000
+                max_tokens=route_for(FEATURE_LESSON, bloom_level)["max_tokens"] + TOKENS_PER_EXTRA_QUESTION * (question_count - 1)
             )
             
-            # Parse the JSON response
-            content = response.choices[0].message.content
-            lesson_data = json.loads(content)
-            
-            # Validate the response structure
-            required_keys = ["lesson", "question", "options", "correct_answer"]
-            for key in required_keys:
-                if key not in lesson_data:
-                    raise ValueError(f"Missing required key: {key}")
-            
-            # Validate options list
-            if not isinstance(lesson_data["options"], list) or len(lesson_data["options"]) < 2:
-                raise ValueError("Options must be a list with at least 2 items")
-            
-            # Validate correct_answer is in options
-            if lesson_data["correct_answer"] not in lesson_data["options"]:
-                raise ValueError("Correct answer must be one of the options")
+            # Parse the JSON response, then validate it and repair what can be repaired
+            content = parse_json(response.choices[0].message.content)
+            lesson_data = repair_question_set(content) if question_count > 1 else repair_lesson(content)
             
             logger.info("Successfully generated lesson and quiz")
             return lesson_data
             
+        except BudgetExceeded as e:
+            logger.warning(str(e))
+            raise Exception("Дневной лимит заданий исчерпан. Возвращайтесь завтра!")
+        
+        except CircuitOpenError as e:
+            logger.warning(f"Skipping lesson generation: {e}")
+            raise Exception("AI временно недоступен. Попробуйте позже.")
+        
         except json.JSONDecodeError as e:
             logger.error(f"Failed to parse OpenAI JSON response: {e}")
             raise Exception("Ошибка при обработке ответа от AI. Попробуйте снова.")
         
+        except LLMValidationError as e:
+            logger.error(f"Unusable lesson from OpenAI: {e}")
+            raise Exception("Ошибка при обработке ответа от AI. Попробуйте снова.")
+        
         except openai.RateLimitError:
             logger.error("OpenAI rate limit exceeded")
             raise Exception("Превышен лимит запросов к AI. Попробуйте позже.")
@@ -406,7 +233,7 @@ class OpenAIService:
             logger.error(f"Unexpected error in generate_lesson_and_quiz: {e}")
             raise Exception("Произошла неожиданная ошибка. Попробуйте снова.")
 
-    async def generate_word_ritual(self, word, meaning, avatar=None):
+    async def generate_word_ritual(self, word, meaning, avatar=None, user_id=None):
         """
         Generate a ritual text for the "Ritual of the Word" feature
         
@@ -414,56 +241,15 @@ class OpenAIService:
         word (str): The Inter-Slavic word
         meaning (str): The meaning of the word in Russian
         avatar (str, optional): The user's avatar style
+        user_id (int, optional): User the tokens are accounted to
         
         Returns:
         str: The generated ritual text
         """
         try:
-            # Define avatar communication styles
-            avatar_styles = {
-                "vedunia": "Speak with warmth, wisdom, and encouragement. Use rich but understandable language. Be supportive and motherly.",
-                "bolgar": "Speak with clarity, depth, and honor. Be friendly and respectful. Convey a sense of being a reliable ally.",
-                "starec": "Speak in a calm, encouraging, and wise manner. Use meditative speech with notes of antiquity. Talk as if a grandfather to a grandson.",
-                "polyak": "Speak in a modern, playful, and lively style. Use youth language, humor, simplicity, and vigor."
-            }
-            
-            # Get the avatar style instruction
-            avatar_style = ""
-            if avatar and avatar in avatar_styles:
-                avatar_style = f"\n\nCommunication style: {avatar_styles[avatar]}\n"
-            
-            prompt = f"""
-            Ты — волшебный помощник, помогающий человеку постигать межславянский язык с вдохновением и смыслом. 
-            Каждый день ты создаёшь «Ритуал словеси» — короткое послание, основанное на одном слове из межславянского языка.{avatar_style}
-
-            На входе:
-            - Слово (на межславянском): "{word}"
-            - Его значение (на русском): "{meaning}"
-
-            На выходе ты формируешь структуру:
-            1. Настрой/интерпретация (1–2 предложения): как слово может быть принято внутрь — как образ, эмоция, качество.
-            2. Финальная фраза в стиле архаичной магической формулы, например:
-               - «Да пребудет с тобой слово сие»
-               - «Прими гласъ древний въ сердце своє»
-               - «Глаголи днесь въ силе и ясности»
-
-            Не используй старославянские буквы (ѣ, ъ и т.п.), стиль — архаичный, но доступный.
-            """
-            
-            response = self.client.chat.completions.create(
-                model="gpt-4o",
-                messages=[
-                    {
-                        "role": "system", 
-                        "content": "Ты — мудрый наставник в изучении межславянского языка, создающий вдохновляющие ритуальные тексты."
-                    },
-                    {
-                        "role": "user", 
-                        "content": prompt
-                    }
-                ],
-                temperature=0.7,
-                max_tokens=300
+            response = await self._create_completion(
+                FEATURE_RITUAL, user_id,
+                messages=ritual_messages(word, meaning, avatar)
             )
             
             ritual_text = response.choices[0].message.content.strip()
@@ -474,5 +260,8 @@ class OpenAIService:
             logger.error(f"Error generating word ritual: {e}")
             return f"Прими слово сие как дар древних времен. Да будет оно светом на пути твоем."
 
+# Record the duration of every generation in bot_stage_seconds{stage="openai"}
+instrument_methods(OpenAIService, "openai", exclude=("set_concurrency",))
+
 # Create global instance
 openai_service = OpenAIService()
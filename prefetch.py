@@ -0,0 +1,113 @@
+import asyncio
+import time
+from config import PREFETCH_TTL_SECONDS, logger
+from metrics import registry
+
+prefetch_results = registry.counter(
+    "lesson_prefetch_total", "Speculative lesson generations by result (started/hit/miss/expired/cancelled/failed)"
+)
+
+
+class _Prefetch:
+    __slots__ = ("key", "task", "started")
+
+    def __init__(self, key, task):
+        self.key = key
+        self.task = task
+        self.started = time.monotonic()
+
+
+class Prefetcher:
+    """Speculative per-user background generation of the next lesson
+
+    Every user has at most one prefetch in flight, tagged with the key it was
+    generated for (topic id and Bloom level). take() hands the result over
+    only if the key still matches and the prefetch is younger than `ttl`;
+    starting a prefetch for another key or navigating away cancels the old
+    one. Prefetches live in the worker's memory: a user is always served by
+    the same worker, so nothing has to be shared between processes.
+    """
+
+    def __init__(self, ttl=PREFETCH_TTL_SECONDS):
+        self.ttl = ttl
+        self.entries = {}
+        self.last_sweep = time.monotonic()
+
+    @property
+    def enabled(self):
+        return self.ttl > 0
+
+    def _expired(self, entry, now=None):
+        return (now or time.monotonic()) - entry.started > self.ttl
+
+    def start(self, user_id, key, factory):
+        """Run factory() in the background for the user unless the same key is already prefetched"""
+        if not self.enabled:
+            return
+        self._sweep()
+        entry = self.entries.get(user_id)
+        if entry and entry.key == key and not self._expired(entry) and not self._failed(entry.task):
+            return
+        self.cancel(user_id)
+        task = asyncio.create_task(factory())
+        task.add_done_callback(self._log_failure)
+        self.entries[user_id] = _Prefetch(key, task)
+        prefetch_results.inc(result="started")
+
+    def ready(self, user_id, key):
+        """True if a finished, usable prefetch for the key is waiting"""
+        entry = self.entries.get(user_id)
+        return bool(
+            entry and entry.key == key and entry.task.done()
+            and not self._failed(entry.task) and not self._expired(entry)
+        )
+
+    async def take(self, user_id, key):
+        """The prefetched result for the key (waiting for it if still running), or None"""
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            return None
+        if entry.key != key:
+            entry.task.cancel()
+            prefetch_results.inc(result="miss")
+            return None
+        if self._expired(entry):
+            entry.task.cancel()
+            prefetch_results.inc(result="expired")
+            return None
+        try:
+            result = await entry.task
+        except Exception:
+            # Already logged by _log_failure; the caller generates the lesson itself
+            return None
+        prefetch_results.inc(result="hit")
+        return result
+
+    def cancel(self, user_id):
+        """Drop the user's prefetch, cancelling it if it is still running"""
+        entry = self.entries.pop(user_id, None)
+        if entry is None:
+            return
+        if not entry.task.done():
+            entry.task.cancel()
+            prefetch_results.inc(result="cancelled")
+
+    def _sweep(self):
+        """Forget expired prefetches of users who never came back for them"""
+        now = time.monotonic()
+        if now - self.last_sweep < self.ttl:
+            return
+        self.last_sweep = now
+        for user_id in [user_id for user_id, entry in self.entries.items() if self._expired(entry, now)]:
+            self.entries.pop(user_id).task.cancel()
+            prefetch_results.inc(result="expired")
+
+    @staticmethod
+    def _failed(task):
+        return task.done() and (task.cancelled() or task.exception() is not None)
+
+    @staticmethod
+    def _log_failure(task):
+        if not task.cancelled() and task.exception() is not None:
+            prefetch_results.inc(result="failed")
+            logger.warning(f"Lesson prefetch failed: {task.exception()}")
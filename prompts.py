@@ -0,0 +1,210 @@
+"""Prompt registry for OpenAIService and the batch pipeline
+
+Static instructions are cleaned up and turned into ready-made system messages
+once at import. Every request starts with the same system message for its
+generation type, and everything that changes per call (topic, words, answers,
+avatar style) goes into the user message after it. The provider caches
+identical prompt prefixes, so the long static part is only billed and
+processed in full on a cache miss.
+"""
+
+from config import LESSON_PROMPT
+
+
+def clean(text):
+    """Strip indentation and surrounding blank lines from a triple-quoted prompt"""
+    return "\n".join(line.strip() for line in text.strip().splitlines())
+
+
+AVATAR_STYLES = {
+    "vedunia": "Speak with warmth, wisdom, and encouragement. Use rich but understandable language. Be supportive and motherly.",
+    "bolgar": "Speak with clarity, depth, and honor. Be friendly and respectful. Convey a sense of being a reliable ally.",
+    "starec": "Speak in a calm, encouraging, and wise manner. Use meditative speech with notes of antiquity. Talk as if a grandfather to a grandson.",
+    "polyak": "Speak in a modern, playful, and lively style. Use youth language, humor, simplicity, and vigor."
+}
+
+BLOOM_TAXONOMY = {
+    1: "запоминание (вспомнить факты, термины, основные понятия)",
+    2: "понимание (объяснить идеи или концепции, интерпретировать информацию)",
+    3: "применение (использовать информацию в новой ситуации)",
+    4: "анализ (выявить связи между идеями, структурировать информацию)",
+    5: "оценка (обосновать точку зрения, оценить решение)",
+    6: "творчество (создать новый продукт или точку зрения)"
+}
+
+TASK_TYPES = {
+    1: "Слово дня",
+    2: "Найди смысл",
+    3: "Собери фразу",
+    4: "Что здесь не так?",
+    5: "Сравни переводы",
+    6: "Сочини своё"
+}
+
+_STYLE_LINES = {avatar: f"Communication style: {style}" for avatar, style in AVATAR_STYLES.items()}
+
+
+def style_line(avatar):
+    """The avatar style instruction, or an empty string for unknown/no avatar"""
+    return _STYLE_LINES.get(avatar, "")
+
+
+def _system(text):
+    return {"role": "system", "content": clean(text)}
+
+
+LESSON_SYSTEM = _system("""
+    You are an experienced Inter-Slavic language teacher. Create quality educational materials based on the
+    textbook "Interslavic zonal contructed language: An introduction". Use ONLY the provided Inter-Slavic words
+    to avoid hallucinations.
+
+    Every request names a topic, a Bloom's taxonomy level, a task type and the number of questions.
+    Create a micro-lesson about Inter-Slavic (межславянский язык) that includes:
+    1. Brief theoretical explanation (3-5 sentences) in Russian
+    2. Questions in the format corresponding to the task type, each checking a different point of the lesson
+       and exactly the requested Bloom's level
+    3. Answer options (2-4 options) for every question
+    4. The correct answer for every question; it must match one of its options exactly
+
+    If the request asks for one question, return JSON:
+    {"lesson": "Theoretical explanation", "task_type": "Task type", "question": "Question",
+    "options": ["Option 1", "Option 2", "Option 3", "Option 4"], "correct_answer": "Correct answer"}
+
+    If the request asks for several questions, return JSON:
+    {"lesson": "Theoretical explanation", "task_type": "Task type", "questions": [
+    {"question": "Question 1", "options": ["Option 1", "Option 2", "Option 3", "Option 4"], "correct_answer": "Correct answer"},
+    ...]}
+""")
+
+RANDOM_LESSON_MESSAGES = (
+    _system("Ты опытный преподаватель межславянского языка. Создавай качественные образовательные материалы для начинающих."),
+    {"role": "user", "content": clean(LESSON_PROMPT)}
+)
+
+FEEDBACK_SYSTEM = _system("""
+    Ты преподаватель межславянского языка. Давай конструктивную обратную связь студентам.
+    Пользователь отвечал на вопрос по межславянскому языку.
+    Дай краткую обратную связь (1-2 предложения) на русском языке.
+    Если ответ правильный - похвали и добавь интересный факт.
+    Если неправильный - объясни, почему правильный ответ верен.
+""")
+
+STUDY_PLAN_SYSTEM = _system("""
+    You are an expert in Inter-Slavic language and pedagogical design. Create a structured study plan
+    for learning Inter-Slavic (межславянский язык) for the user's level and learning goal.
+    The plan should be based on the textbook "Interslavic zonal contructed language: An introduction"
+    and contain sequential topics for study.
+
+    For each topic, provide:
+    1. Topic name (short, 3-5 words)
+    2. Brief description (1-2 sentences)
+    3. Bloom's taxonomy level (from 1 to 6)
+
+    The study plan should include at least 10 topics, covering:
+    - Alphabet and pronunciation
+    - Basic vocabulary
+    - Grammar fundamentals
+    - Sentence structure
+    - Reading and comprehension
+    - Cultural context
+
+    Return the result as JSON:
+    {"study_plan": [{"topic": "Topic name", "description": "Brief description", "bloom_level": 1}, ...]}
+""")
+
+RITUAL_SYSTEM = _system("""
+    Ты — мудрый наставник в изучении межславянского языка, создающий вдохновляющие ритуальные тексты.
+    Ты — волшебный помощник, помогающий человеку постигать межславянский язык с вдохновением и смыслом.
+    Каждый день ты создаёшь «Ритуал словеси» — короткое послание, основанное на одном слове из межславянского языка.
+
+    На входе: слово (на межславянском) и его значение (на русском).
+
+    На выходе ты формируешь структуру:
+    1. Настрой/интерпретация (1–2 предложения): как слово может быть принято внутрь — как образ, эмоция, качество.
+    2. Финальная фраза в стиле архаичной магической формулы, например:
+    - «Да пребудет с тобой слово сие»
+    - «Прими гласъ древний въ сердце своє»
+    - «Глаголи днесь въ силе и ясности»
+
+    Не используй старославянские буквы (ѣ, ъ и т.п.), стиль — архаичный, но доступный.
+""")
+
+
+def _user(*lines):
+    return {"role": "user", "content": "\n".join(line for line in lines if line)}
+
+
+def dictionary_block(dictionary_words):
+    """The list of dictionary words a lesson may use"""
+    if not dictionary_words:
+        return ""
+    lines = ["Use ONLY these Inter-Slavic words in your lesson and quiz:"]
+    for word in dictionary_words:
+        entry = f"- {word['isv']} "
+        if word.get('addition'):
+            entry += f"({word['addition']}) "
+        entry += f"[{word.get('partOfSpeech', '')}]: "
+        translations = []
+        if word.get('ru'):
+            translations.append(f"RU: {word['ru']}")
+        if word.get('en'):
+            translations.append(f"EN: {word['en']}")
+        entry += ", ".join(translations)
+        if word.get('distractors'):
+            entry += f"; look-alikes for wrong options: {', '.join(word['distractors'])}"
+        lines.append(entry)
+    return "\n".join(lines)
+
+
+# For Bloom levels whose answers are typed (config.TYPED_ANSWER_BLOOM_LEVELS) instead of chosen with a button
+TYPED_ANSWER_LINE = clean("""
+    Answers: typed by the learner, the options are not shown. Ask every question so that it has one short answer:
+    a single Inter-Slavic word or a phrase of at most 3 words with one correct spelling. correct_answer is that
+    answer; options list it together with plausible wrong answers.
+""")
+
+
+def lesson_messages(topic=None, bloom_level=None, dictionary_words=None, avatar=None, question_count=1, typed=False):
+    """Messages for generate_lesson_and_quiz; without topic and level a random beginner lesson"""
+    if not (topic and bloom_level):
+        return list(RANDOM_LESSON_MESSAGES)
+    questions = f"Questions: {question_count} ({question_count} questions in total)" if question_count > 1 else "Questions: 1"
+    return [
+        LESSON_SYSTEM,
+        _user(
+            f'Topic: "{topic}"',
+            f"Bloom's level: {bloom_level} — {BLOOM_TAXONOMY.get(bloom_level, BLOOM_TAXONOMY[1])}",
+            f'Task type: "{TASK_TYPES.get(bloom_level, TASK_TYPES[1])}"',
+            questions,
+            TYPED_ANSWER_LINE if typed else "",
+            style_line(avatar),
+            dictionary_block(dictionary_words)
+        )
+    ]
+
+
+def feedback_messages(question, user_answer, correct_answer, is_correct, avatar=None):
+    """Messages for generate_feedback"""
+    return [
+        FEEDBACK_SYSTEM,
+        _user(
+            f"Вопрос: {question}",
+            f"Правильный ответ: {correct_answer}",
+            f"Ответ пользователя: {user_answer}",
+            f"Результат: {'правильно' if is_correct else 'неправильно'}",
+            style_line(avatar)
+        )
+    ]
+
+
+def study_plan_messages(level, goal, avatar=None):
+    """Messages for generate_study_plan"""
+    return [STUDY_PLAN_SYSTEM, _user(f'Level: "{level}"', f'Learning goal: "{goal}"', style_line(avatar))]
+
+
+def ritual_messages(word, meaning, avatar=None):
+    """Messages for generate_word_ritual"""
+    return [
+        RITUAL_SYSTEM,
+        _user(f'Слово (на межславянском): "{word}"', f'Его значение (на русском): "{meaning}"', style_line(avatar))
+    ]
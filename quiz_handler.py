@@ -1,6 +1,8 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import asyncio
 from config import logger
+from callback_codec import new_nonce
+from session_store import SessionStore, create_session_store
 
 class QuizSession:
     """Represents an active quiz session for a user"""
@@ -13,6 +15,8 @@ class QuizSession:
         self.correct_answer = lesson_data.get("correct_answer", "")
         self.answered = False
         self.user_answer = None
+        # Identifies this quiz in the callback_data of its answer buttons
+        self.nonce = lesson_data.get("nonce") or new_nonce()
     
     def is_correct(self, answer: str) -> bool:
         """Check if the provided answer is correct"""
@@ -22,33 +26,59 @@ class QuizSession:
         """Set the user's answer and mark as answered"""
         self.user_answer = answer
         self.answered = True
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert the session to a dict suitable for a SessionStore"""
+        return {
+            "lesson": self.lesson,
+            "question": self.question,
+            "options": self.options,
+            "correct_answer": self.correct_answer,
+            "answered": self.answered,
+            "user_answer": self.user_answer,
+            "nonce": self.nonce,
+        }
+    
+    @classmethod
+    def from_dict(cls, user_id: int, data: Dict[str, Any]) -> "QuizSession":
+        """Restore a session from a SessionStore dict"""
+        session = cls(user_id, data)
+        session.answered = data.get("answered", False)
+        session.user_answer = data.get("user_answer")
+        return session
 
 class QuizHandler:
     """Manages quiz sessions for multiple users"""
     
-    def __init__(self):
-        self.active_sessions: Dict[int, QuizSession] = {}
+    def __init__(self, store: Optional[SessionStore] = None):
+        self.active_sessions: SessionStore = store or create_session_store()
     
     def create_session(self, user_id: int, lesson_data: Dict[str, Any]) -> QuizSession:
         """Create a new quiz session for a user"""
         session = QuizSession(user_id, lesson_data)
-        self.active_sessions[user_id] = session
+        self.active_sessions.set(user_id, session.to_dict())
         logger.info(f"Created quiz session for user {user_id}")
         return session
     
-    def get_session(self, user_id: int) -> QuizSession:
+    def get_session(self, user_id: int) -> Optional[QuizSession]:
         """Get the active quiz session for a user"""
-        return self.active_sessions.get(user_id)
+        data = self.active_sessions.get(user_id)
+        return QuizSession.from_dict(user_id, data) if data else None
+    
+    def claim_session(self, user_id: int) -> Optional[QuizSession]:
+        """Mark the session as answered, returns None if it was already answered"""
+        data = self.active_sessions.claim(user_id)
+        return QuizSession.from_dict(user_id, data) if data else None
     
     def end_session(self, user_id: int):
         """End the quiz session for a user"""
-        if user_id in self.active_sessions:
-            del self.active_sessions[user_id]
-            logger.info(f"Ended quiz session for user {user_id}")
+        self.active_sessions.delete(user_id)
+        logger.info(f"Ended quiz session for user {user_id}")
     
     def has_active_session(self, user_id: int) -> bool:
         """Check if user has an active quiz session"""
-        return user_id in self.active_sessions and not self.active_sessions[user_id].answered
+        session = self.active_sessions.get(user_id)
+        return session is not None and not session.get("answered")
     
     def format_lesson_message(self, session: QuizSession) -> str:
         """Format the lesson and question message"""
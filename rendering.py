@@ -0,0 +1,174 @@
+"""Pre-serialized keyboards and precompiled message templates shared by the bots
+
+Static inline keyboards are built and JSON-serialized once at import. A
+Keyboard is an immutable str holding the reply_markup JSON; encode_body()
+splices it into the request body verbatim instead of serializing the nested
+dicts again on every send or edit. Quiz option keyboards carry the quiz
+nonce and are serialized once per quiz.
+
+Message fragments that only depend on a small closed set of values (Bloom
+level lines, month names) are rendered once per value; the rest of a screen
+is joined from constant pieces.
+"""
+
+import json
+from callback_codec import answer_callback
+
+# Compact separators, as in the request bodies sent to Telegram
+_SEPARATORS = (",", ":")
+
+
+class Keyboard(str):
+    """An inline keyboard serialized once; it can be passed wherever reply_markup is expected"""
+
+    __slots__ = ()
+
+    def __new__(cls, *rows):
+        """Rows of (text, callback_data) buttons"""
+        markup = {"inline_keyboard": [[{"text": text, "callback_data": data} for text, data in row] for row in rows]}
+        return super().__new__(cls, json.dumps(markup, ensure_ascii=False, separators=_SEPARATORS))
+
+    @property
+    def markup(self):
+        """A fresh dict copy of the keyboard"""
+        return json.loads(self)
+
+
+def encode_body(data):
+    """UTF-8 JSON body of a Bot API call, with a pre-serialized reply_markup spliced in as is"""
+    markup = data.get("reply_markup")
+    if not isinstance(markup, Keyboard):
+        return json.dumps(data, ensure_ascii=False, separators=_SEPARATORS).encode("utf-8")
+    rest = {key: value for key, value in data.items() if key != "reply_markup"}
+    body = json.dumps(rest, ensure_ascii=False, separators=_SEPARATORS)
+    return (body[:-1] + ("," if rest else "") + '"reply_markup":' + markup + "}").encode("utf-8")
+
+
+# Buttons
+MAIN_MENU = ("🏠 Главное меню", "main_menu")
+GET_ASSIGNMENT = ("📖 Получить задание", "get_assignment")
+NEW_ASSIGNMENT = ("📖 Получить новое задание", "get_assignment")
+RETRY_ASSIGNMENT = ("📖 Попробовать снова", "get_assignment")
+STUDY_PLAN = ("📋 Учебный план", "show_study_plan")
+
+# Onboarding
+INTRO_KEYBOARD = Keyboard([("Дальше →", "next_intro")])
+LEVEL_KEYBOARD = Keyboard(
+    [("🔸 Я — начатый", "level_beginner")],
+    [("🔸 Знаю понемногу", "level_intermediate")],
+    [("🔸 Старец словесный", "level_advanced")]
+)
+GOAL_KEYBOARD = Keyboard(
+    [("⚖️ Хощу разумѣти тексты", "goal_texts")],
+    [("🎙️ Желаю глаголати", "goal_speaking")],
+    [("🎭 Интересъ мой — ритуалъ и образъ", "goal_ritual")],
+    [("🪶 Ищу вдохновения", "goal_inspiration")]
+)
+AVATAR_KEYBOARD = Keyboard(
+    [("🔹 Ведунья", "avatar_vedunia")],
+    [("🔹 Болгар", "avatar_bolgar")],
+    [("🔹 Старец", "avatar_starec")],
+    [("🔹 Поляк", "avatar_polyak")]
+)
+STUDY_PLAN_READY_KEYBOARD = Keyboard([("📖 Начать обучение", "get_assignment")], [STUDY_PLAN])
+RETRY_START_KEYBOARD = Keyboard([("🔄 Попробовать снова", "start")])
+
+# Menus and navigation
+MAIN_MENU_KEYBOARD = Keyboard(
+    [GET_ASSIGNMENT],
+    [STUDY_PLAN],
+    [("🔮 Получить заклинание дня", "get_word_ritual")],
+    [("📜 Моя летопись", "show_progress")]
+)
+BACK_TO_MENU_KEYBOARD = Keyboard([MAIN_MENU])
+GET_ASSIGNMENT_KEYBOARD = Keyboard([GET_ASSIGNMENT])
+STUDY_PLAN_ONLY_KEYBOARD = Keyboard([STUDY_PLAN])
+ASSIGNMENT_AND_PLAN_KEYBOARD = Keyboard([GET_ASSIGNMENT], [STUDY_PLAN])
+TOPIC_KEYBOARD = Keyboard([GET_ASSIGNMENT], [STUDY_PLAN], [MAIN_MENU])
+STUDY_PLAN_KEYBOARD = Keyboard(
+    [("◀️ Предыдущая тема", "prev_topic"), ("Следующая тема ▶️", "next_topic")],
+    [GET_ASSIGNMENT],
+    [MAIN_MENU]
+)
+PROGRESS_KEYBOARD = Keyboard([GET_ASSIGNMENT], [MAIN_MENU])
+
+# Quiz
+ASSIGNMENT_ERROR_KEYBOARD = Keyboard([RETRY_ASSIGNMENT], [MAIN_MENU])
+RETRY_ASSIGNMENT_KEYBOARD = Keyboard([RETRY_ASSIGNMENT])
+QUIZ_RESULT_KEYBOARD = Keyboard([NEW_ASSIGNMENT], [STUDY_PLAN], [MAIN_MENU])
+NEW_ASSIGNMENT_KEYBOARD = Keyboard([NEW_ASSIGNMENT])
+STALE_QUIZ_KEYBOARD = Keyboard([("Получить новое задание", "get_assignment")])
+RITUAL_KEYBOARD = Keyboard([("🔮 Получить новое заклинание", "get_word_ritual")], [GET_ASSIGNMENT], [MAIN_MENU])
+
+
+# Shown under a question that is answered with a message instead of a button
+TYPED_ANSWER_HINT = "\n\n✍️ _Напишите ответ сообщением_"
+
+
+def answer_keyboard(nonce, options):
+    """One answer button per quiz option; serialized per quiz since the buttons carry its nonce"""
+    return Keyboard(*([(option, answer_callback(nonce, index))] for index, option in enumerate(options)))
+
+
+# Bloom's taxonomy levels 1-6
+BLOOM_LEVEL_NAMES = ("Запоминание", "Понимание", "Применение", "Анализ", "Оценка", "Творчество")
+MAX_BLOOM_LEVEL = len(BLOOM_LEVEL_NAMES)
+
+_LEVEL_LINES = tuple(
+    f"**Уровень: {name}** (уровень {level} из {MAX_BLOOM_LEVEL})\n\n"
+    for level, name in enumerate(BLOOM_LEVEL_NAMES, 1)
+)
+_LEVEL_UP_LINES = tuple(
+    f"⬆️ Вы перешли на уровень **{name}** (уровень {level} из {MAX_BLOOM_LEVEL})\n\n"
+    for level, name in enumerate(BLOOM_LEVEL_NAMES, 1)
+)
+_LEVEL_DOWN_LINES = tuple(
+    f"⬇️ Вам нужно больше практики. Возврат на уровень **{name}** (уровень {level} из {MAX_BLOOM_LEVEL})\n\n"
+    for level, name in enumerate(BLOOM_LEVEL_NAMES, 1)
+)
+_PROGRESS_LINES = tuple(f"Прогресс: {'⭐' * level} ({level}/{MAX_BLOOM_LEVEL})\n\n" for level in range(1, MAX_BLOOM_LEVEL + 1))
+
+LEVEL_COMPLETED = "🌟 **Поздравляем!** Вы полностью освоили эту тему!\n\n"
+
+
+def bloom_level_name(level):
+    return BLOOM_LEVEL_NAMES[level - 1]
+
+
+def level_up_line(level):
+    return _LEVEL_UP_LINES[level - 1]
+
+
+def level_down_line(level):
+    return _LEVEL_DOWN_LINES[level - 1]
+
+
+def lesson_text(topic_name, bloom_level, lesson, question, question_number=1, question_count=1):
+    """A quiz screen: topic, Bloom level, lesson and the question"""
+    if question_count > 1:
+        heading = f"❓ **Вопрос {question_number} из {question_count}:**\n"
+    else:
+        heading = "❓ **Вопрос:**\n"
+    return "".join(("📚 **Урок: ", topic_name, "**\n", _LEVEL_LINES[bloom_level - 1], lesson, "\n\n", heading, question))
+
+
+def study_plan_text(items):
+    """The study plan screen: every topic with its status and Bloom level"""
+    parts = ["📚 **Ваш учебный план**\n\n"]
+    for item in items:
+        level = item["current_bloom_level"]
+        status = "✅" if item["is_completed"] else "🔄" if level > 1 else "⏳"
+        parts.append(f"{status} **{item['topic']}**\n_{item['description']}_\n")
+        parts.append(_PROGRESS_LINES[level - 1])
+    return "".join(parts)
+
+
+# Month names in the genitive case, by month number
+MONTH_NAMES_GENITIVE = (
+    "января", "февраля", "марта", "апреля", "мая", "июня",
+    "июля", "августа", "сентября", "октября", "ноября", "декабря"
+)
+
+
+def month_name_genitive(month):
+    return MONTH_NAMES_GENITIVE[month - 1]
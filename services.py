@@ -0,0 +1,109 @@
+"""Explicit startup of the external services a bot process depends on
+
+Importing the bot modules opens nothing: the database connects on first use,
+the OpenAI client is created on first request and Telegram connections are
+pooled lazily. init() validates the configuration and then warms every
+service up concurrently, so the first user does not pay for the PostgreSQL
+connection, the schema check or the TLS handshakes. A failed warm-up is
+logged and does not stop the process; the service is retried on first use.
+"""
+
+import asyncio
+import os
+import time
+from config import TELEGRAM_BOT_TOKEN, logger, validate_config
+from metrics import stage_seconds
+
+# Warm-up name -> (async function(token), names of the warm-ups it runs after)
+_warmups = {}
+
+
+def warmup(name, after=()):
+    """Register an async function(token) to be run by init(), once the warm-ups named in `after` are done"""
+    def decorator(function):
+        if name in _warmups:
+            raise ValueError(f"Warm-up {name!r} is already registered")
+        _warmups[name] = (function, tuple(after))
+        return function
+    return decorator
+
+
+@warmup("database")
+async def _warm_database(token):
+    from database import db
+    # psycopg2 is blocking; connecting and creating the tables must not hold up the event loop
+    await asyncio.to_thread(db.init)
+
+
+@warmup("openai")
+async def _warm_openai(token):
+    from openai_service import openai_service
+    # Any authenticated request opens the pooled TLS connection used by the completions
+    await openai_service.client.models.list()
+
+
+# The word pool is read through the shared psycopg2 connection, which must not be connected twice at once
+@warmup("exercises", after=("database",))
+async def _warm_exercises(token):
+    from config import LOCAL_EXERCISE_BLOOM_LEVELS
+    if LOCAL_EXERCISE_BLOOM_LEVELS:
+        from exercise_engine import exercise_engine
+        await exercise_engine.refresh()
+
+
+@warmup("distractors")
+async def _warm_distractors(token):
+    from config import DISTRACTOR_INDEX_PATH
+    from distractor_index import distractor_index
+    # The index is optional: without it distractors are picked from the word pool
+    if os.path.exists(DISTRACTOR_INDEX_PATH):
+        await asyncio.to_thread(distractor_index.load, DISTRACTOR_INDEX_PATH)
+    else:
+        logger.info(f"No distractor index at {DISTRACTOR_INDEX_PATH}, build it with distractor_index.py")
+
+
+@warmup("telegram")
+async def _warm_telegram(token):
+    from telegram_api import get_telegram_api
+    result = await get_telegram_api(token).call("getMe", {})
+    if not result.get("ok"):
+        raise RuntimeError(f"getMe failed: {result.get('description') or result.get('error')}")
+
+
+async def _timed(name, function, token):
+    started = time.perf_counter()
+    try:
+        await function(token)
+    finally:
+        seconds = time.perf_counter() - started
+        stage_seconds.observe(seconds, stage="startup", name=name)
+    return seconds
+
+
+async def init(token=None, names=None):
+    """Validate the configuration and warm up the services; returns {name: seconds or exception}"""
+    validate_config()
+    token = token or TELEGRAM_BOT_TOKEN
+    names = list(names or _warmups)
+    started = time.perf_counter()
+    tasks = {}
+
+    async def run(name):
+        function, after = _warmups[name]
+        # A failed dependency does not stop the warm-up: it then connects on first use like any query
+        await asyncio.gather(
+            *(tasks[dependency] for dependency in after if dependency in tasks), return_exceptions=True
+        )
+        return await _timed(name, function, token)
+
+    for name in names:
+        tasks[name] = asyncio.ensure_future(run(name))
+    results = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    timings = dict(zip(names, results))
+    for name, result in timings.items():
+        if isinstance(result, BaseException):
+            logger.warning(f"Warm-up of {name} failed, it will be retried on first use: {result}")
+        else:
+            logger.info(f"Warmed up {name} in {result * 1000:.0f} ms")
+    logger.info(f"Services initialised in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return timings
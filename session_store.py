@@ -0,0 +1,278 @@
+import asyncio
+import json
+import time
+import zlib
+from config import SESSION_BACKEND, SESSION_TTL_SECONDS, REDIS_URL, logger
+
+try:
+    import redis
+except ImportError:
+    # A dependency of the project; only SESSION_BACKEND=redis needs it, the other backends work without
+    redis = None
+
+# Short aliases for the session fields to keep serialized sessions small
+_FIELD_ALIASES = {
+    'lesson': 'l',
+    'question': 'q',
+    'options': 'o',
+    'correct_answer': 'c',
+    'answered': 'a',
+    'chat_id': 'ch',
+    'message_id': 'm',
+    'topic_id': 't',
+    'bloom_level': 'b',
+    'user_answer': 'u',
+    'pending_questions': 'pq',
+    'question_number': 'qn',
+    'question_count': 'qc',
+    'nonce': 'n',
+    'typed': 'ty',
+}
+_FIELD_NAMES = {alias: name for name, alias in _FIELD_ALIASES.items()}
+
+# Payloads larger than this are zlib-compressed
+_COMPRESS_THRESHOLD = 512
+
+
+def serialize_session(session):
+    """Serialize a quiz session dict into compact bytes"""
+    packed = {_FIELD_ALIASES.get(key, key): value for key, value in session.items()}
+    raw = json.dumps(packed, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    if len(raw) > _COMPRESS_THRESHOLD:
+        return b'z' + zlib.compress(raw)
+    return b'j' + raw
+
+
+def deserialize_session(payload):
+    """Restore a quiz session dict from bytes produced by serialize_session"""
+    if payload is None:
+        return None
+    payload = bytes(payload)
+    header, body = payload[:1], payload[1:]
+    if header == b'z':
+        body = zlib.decompress(body)
+    packed = json.loads(body.decode('utf-8'))
+    return {_FIELD_NAMES.get(key, key): value for key, value in packed.items()}
+
+
+class SessionStore:
+    """Base class for quiz session backends
+
+    A session is a plain dict (see OldChurchSlavonicBot.handle_get_assignment).
+    Backends must make claim() atomic so that an answer is accepted only once,
+    even when several workers receive callbacks for the same user. Async code
+    calls the a-prefixed methods: a backend doing blocking I/O (`blocking`)
+    then runs in a worker thread instead of on the event loop.
+    """
+
+    blocking = False
+
+    def get(self, user_id):
+        """Get the session for a user or None"""
+        raise NotImplementedError
+
+    def set(self, user_id, session):
+        """Create or replace the session for a user"""
+        raise NotImplementedError
+
+    def delete(self, user_id):
+        """Remove the session for a user"""
+        raise NotImplementedError
+
+    def claim(self, user_id, nonce=None):
+        """Mark the session as answered and return it
+
+        With a nonce only the quiz session with that nonce is claimed.
+        Returns None if there is no such session or it was already answered.
+        """
+        raise NotImplementedError
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    async def _run(self, method, *args):
+        if self.blocking:
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def aget(self, user_id):
+        return await self._run(self.get, user_id)
+
+    async def aset(self, user_id, session):
+        return await self._run(self.set, user_id, session)
+
+    async def adelete(self, user_id):
+        return await self._run(self.delete, user_id)
+
+    async def aclaim(self, user_id, nonce=None):
+        return await self._run(self.claim, user_id, nonce)
+
+
+class InMemorySessionStore(SessionStore):
+    """Process-local session store (single worker only)"""
+
+    def __init__(self, ttl=SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self.sessions = {}
+
+    def _get_entry(self, user_id):
+        entry = self.sessions.get(user_id)
+        if entry and entry[0] < time.monotonic():
+            del self.sessions[user_id]
+            return None
+        return entry
+
+    def get(self, user_id):
+        entry = self._get_entry(user_id)
+        return deserialize_session(entry[1]) if entry else None
+
+    def set(self, user_id, session):
+        self.sessions[user_id] = (time.monotonic() + self.ttl, serialize_session(session))
+
+    def delete(self, user_id):
+        self.sessions.pop(user_id, None)
+
+    def claim(self, user_id, nonce=None):
+        entry = self._get_entry(user_id)
+        if not entry:
+            return None
+        session = deserialize_session(entry[1])
+        if session.get('answered') or (nonce is not None and session.get('nonce') != nonce):
+            return None
+        session['answered'] = True
+        self.sessions[user_id] = (entry[0], serialize_session(session))
+        return session
+
+
+class PostgresSessionStore(SessionStore):
+    """Session store backed by the quiz_sessions table"""
+
+    blocking = True
+
+    def __init__(self, database=None, ttl=SESSION_TTL_SECONDS):
+        if database is None:
+            from database import db as database
+        self.db = database
+        self.ttl = ttl
+
+    def get(self, user_id):
+        row = self.db.get_quiz_session(user_id)
+        if not row:
+            return None
+        session = deserialize_session(row['data'])
+        session['answered'] = row['answered']
+        return session
+
+    def set(self, user_id, session):
+        self.db.save_quiz_session(
+            user_id, serialize_session(session), bool(session.get('answered')), self.ttl, session.get('nonce')
+        )
+
+    def delete(self, user_id):
+        self.db.delete_quiz_session(user_id)
+
+    def claim(self, user_id, nonce=None):
+        data = self.db.claim_quiz_session(user_id, nonce)
+        if data is None:
+            return None
+        session = deserialize_session(data)
+        session['answered'] = True
+        return session
+
+
+class LocalRedisStandIn:
+    """Minimal in-process replacement for the subset of the Redis API we use
+
+    Lets the Redis backend run without a server (local development, benchmarks).
+    """
+
+    def __init__(self):
+        self.values = {}
+
+    def _alive(self, name):
+        entry = self.values.get(name)
+        if entry and entry[1] is not None and entry[1] < time.monotonic():
+            del self.values[name]
+            return None
+        return entry
+
+    def get(self, name):
+        entry = self._alive(name)
+        return entry[0] if entry else None
+
+    def set(self, name, value, ex=None, nx=False):
+        if nx and self._alive(name):
+            return None
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        self.values[name] = (value, time.monotonic() + ex if ex else None)
+        return True
+
+    def delete(self, *names):
+        removed = 0
+        for name in names:
+            if self.values.pop(name, None) is not None:
+                removed += 1
+        return removed
+
+
+class RedisSessionStore(SessionStore):
+    """Session store speaking the Redis protocol
+
+    Any client with get/set(ex, nx)/delete works, including LocalRedisStandIn.
+    """
+
+    KEY_PREFIX = "quiz_session:"
+
+    def __init__(self, client=None, url=REDIS_URL, ttl=SESSION_TTL_SECONDS):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("The redis package is required for SESSION_BACKEND=redis")
+            client = redis.Redis.from_url(url)
+        self.client = client
+        # A real Redis client waits on the network
+        self.blocking = not isinstance(client, LocalRedisStandIn)
+        self.ttl = ttl
+
+    def _key(self, user_id):
+        return f"{self.KEY_PREFIX}{user_id}"
+
+    def get(self, user_id):
+        session = deserialize_session(self.client.get(self._key(user_id)))
+        if session is not None and self.client.get(self._key(user_id) + ":claimed"):
+            session['answered'] = True
+        return session
+
+    def set(self, user_id, session):
+        key = self._key(user_id)
+        self.client.delete(key + ":claimed")
+        self.client.set(key, serialize_session(session), ex=self.ttl)
+
+    def delete(self, user_id):
+        key = self._key(user_id)
+        self.client.delete(key, key + ":claimed")
+
+    def claim(self, user_id, nonce=None):
+        key = self._key(user_id)
+        session = deserialize_session(self.client.get(key))
+        if session is None or session.get('answered') or (nonce is not None and session.get('nonce') != nonce):
+            return None
+        # SET NX on a marker key is atomic across workers: only one claim wins
+        if not self.client.set(key + ":claimed", b"1", ex=self.ttl, nx=True):
+            return None
+        session['answered'] = True
+        return session
+
+
+def create_session_store(backend=SESSION_BACKEND):
+    """Create the session store configured by SESSION_BACKEND"""
+    if backend == "postgres":
+        store = PostgresSessionStore()
+    elif backend == "redis":
+        store = RedisSessionStore()
+    elif backend == "redis-local":
+        store = RedisSessionStore(client=LocalRedisStandIn())
+    else:
+        store = InMemorySessionStore()
+    logger.info(f"Using {type(store).__name__} for quiz sessions")
+    return store
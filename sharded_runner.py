@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+import asyncio
+import multiprocessing
+import queue
+from config import (
+    BOT_WORKERS, OPENAI_MAX_CONCURRENCY, TELEGRAM_BOT_TOKEN, METRICS_PORT, METRICS_LOG_INTERVAL,
+    LLM_USAGE_FLUSH_INTERVAL, logger, validate_config
+)
+from metrics import start_metrics_reporting
+from telegram_api import get_telegram_api
+from update_tracker import UpdateTracker
+
+# How often the supervisor checks that all workers are alive (seconds)
+WORKER_CHECK_INTERVAL = 5
+# How long the poller waits for an acknowledgement when Telegram only returns updates still being handled
+ACK_WAIT_SECONDS = 1
+# Handled updates deleted from pending_updates in one statement at most
+ACK_BATCH_SIZE = 500
+
+
+def update_user_id(update):
+    """Extract the id of the user an update belongs to (0 if unknown)"""
+    for key in ("message", "edited_message", "callback_query"):
+        if key in update:
+            return update[key].get("from", {}).get("id", 0)
+    return 0
+
+
+def shard_for_user(user_id, workers):
+    """Pick the worker that owns a user; all updates of a user go to the same worker"""
+    return hash(user_id) % workers
+
+
+class UserOrderedDispatcher:
+    """Runs updates concurrently across users but strictly in order for each user
+
+    on_done(update) is called after every update, whether its handler succeeded or not.
+    """
+
+    def __init__(self, handler, on_done=None):
+        self.handler = handler
+        self.on_done = on_done
+        self.tails = {}
+
+    def submit(self, user_id, update):
+        """Schedule an update after all previously submitted updates of the same user"""
+        previous = self.tails.get(user_id)
+        task = asyncio.create_task(self._run_after(previous, update))
+        self.tails[user_id] = task
+        task.add_done_callback(lambda done: self._forget(user_id, done))
+        return task
+
+    def _forget(self, user_id, task):
+        if self.tails.get(user_id) is task:
+            del self.tails[user_id]
+
+    async def _run_after(self, previous, update):
+        if previous:
+            await asyncio.wait([previous])
+        try:
+            await self.handler(update)
+        except Exception as e:
+            logger.error(f"Error processing update {update.get('update_id')}: {e}", exc_info=True)
+        finally:
+            if self.on_done:
+                self.on_done(update)
+
+
+async def _worker_loop(index, update_queue, ack_queue, openai_budget):
+    # Imported here so every worker process opens its own DB connection and HTTP pools
+    from enhanced_bot import OldChurchSlavonicBot
+    from openai_service import openai_service
+    from llm_usage import usage_tracker
+    import services
+
+    openai_service.set_concurrency(openai_budget)
+    await services.init(TELEGRAM_BOT_TOKEN)
+    # Each worker exposes its own /metrics on the next port after the supervisor's
+    await start_metrics_reporting(METRICS_PORT + 1 + index if METRICS_PORT else 0, METRICS_LOG_INTERVAL)
+    flusher = asyncio.create_task(usage_tracker.run_flusher(LLM_USAGE_FLUSH_INTERVAL))
+    bot = OldChurchSlavonicBot(TELEGRAM_BOT_TOKEN)
+    # A failing update is acknowledged too and not retried, like in the single-process bot
+    dispatcher = UserOrderedDispatcher(bot.process_update, lambda update: ack_queue.put(update["update_id"]))
+    loop = asyncio.get_running_loop()
+    logger.info(f"Worker {index} started (OpenAI budget: {openai_budget})")
+
+    while True:
+        update = await loop.run_in_executor(None, update_queue.get)
+        if update is None:
+            break
+        dispatcher.submit(update_user_id(update), update)
+
+    # Let in-flight handlers finish before exiting
+    pending = list(dispatcher.tails.values())
+    if pending:
+        await asyncio.wait(pending)
+    flusher.cancel()
+    usage_tracker.flush()
+    logger.info(f"Worker {index} stopped")
+
+
+def worker_main(index, update_queue, ack_queue, openai_budget):
+    """Entry point of a worker process"""
+    try:
+        asyncio.run(_worker_loop(index, update_queue, ack_queue, openai_budget))
+    except KeyboardInterrupt:
+        pass
+
+
+class ShardedBotRunner:
+    """Supervisor: one getUpdates poller feeding N worker processes partitioned by user_id
+
+    Received updates are stored in the pending_updates table before the
+    getUpdates offset (polled with and stored in bot_state) moves past them,
+    so polling never waits for a slow handler and an update is not lost if
+    the supervisor stops before a worker finished it: the stored updates are
+    routed again on start. Workers acknowledge every update they have
+    finished on a shared queue and the update is deleted from the table.
+    While the table cannot be written the offset only moves up to the oldest
+    unstored update still in flight, so Telegram keeps it instead. The
+    updates of a worker that dies are sent again to its replacement.
+    """
+
+    def __init__(self, token, workers=BOT_WORKERS, openai_concurrency=OPENAI_MAX_CONCURRENCY):
+        self.token = token
+        self.workers = max(1, workers)
+        self.openai_budget = max(1, openai_concurrency // self.workers)
+        self.context = multiprocessing.get_context("spawn")
+        self.queues = [self.context.Queue() for _ in range(self.workers)]
+        self.acks = self.context.Queue()
+        self.processes = [None] * self.workers
+        # update_id -> update, routed and not acknowledged yet
+        self.in_flight = {}
+        # In-flight update_ids that could not be stored in pending_updates; the offset stays below them
+        self.unsaved = set()
+        # Acknowledged update_ids above the offset; Telegram still returns them
+        self.acked = set()
+        # Acknowledged stored update_ids to delete from pending_updates
+        self.finished = []
+        # The offset after the newest routed update
+        self.next_offset = None
+        self.tracker = UpdateTracker(token)
+        self.acknowledged = asyncio.Event()
+
+    def start_worker(self, index):
+        process = self.context.Process(
+            target=worker_main,
+            args=(index, self.queues[index], self.acks, self.openai_budget),
+            name=f"bot-worker-{index}",
+            daemon=True
+        )
+        process.start()
+        self.processes[index] = process
+
+    def shard(self, update):
+        return shard_for_user(update_user_id(update), self.workers)
+
+    def route(self, update, saved=True):
+        """Send an update to the worker owning its user"""
+        update_id = update["update_id"]
+        self.in_flight[update_id] = update
+        if not saved:
+            self.unsaved.add(update_id)
+        if self.next_offset is None or update_id + 1 > self.next_offset:
+            self.next_offset = update_id + 1
+        self.queues[self.shard(update)].put(update)
+
+    def seen(self, update_id):
+        """True if the update is being handled or was handled already"""
+        return update_id in self.in_flight or update_id in self.acked or self.tracker.is_duplicate(update_id)
+
+    def advance(self):
+        """Move the offset past every stored or handled update, up to the oldest unstored one in flight"""
+        offset = min(self.unsaved) if self.unsaved else self.next_offset
+        if offset is None:
+            return
+        self.acked = {acked for acked in self.acked if acked >= offset}
+        self.tracker.commit(offset)
+
+    def acknowledge(self, update_id):
+        """A worker has finished an update"""
+        if self.in_flight.pop(update_id, None) is None:
+            return
+        if update_id in self.unsaved:
+            self.unsaved.discard(update_id)
+        else:
+            self.finished.append(update_id)
+        self.acked.add(update_id)
+        self.advance()
+        self.acknowledged.set()
+
+    def forget(self, update_ids):
+        """Delete handled updates from pending_updates; False if the database could not be reached"""
+        for start in range(0, len(update_ids), ACK_BATCH_SIZE):
+            if not self.tracker.database.delete_pending_updates(self.tracker.key, update_ids[start:start + ACK_BATCH_SIZE]):
+                return False
+        return True
+
+    async def receive_acks(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                # A timeout lets the executor thread end soon after the task is cancelled
+                update_id = await loop.run_in_executor(None, self.acks.get, True, 1)
+            except queue.Empty:
+                continue
+            self.acknowledge(update_id)
+            while True:
+                try:
+                    self.acknowledge(self.acks.get_nowait())
+                except queue.Empty:
+                    break
+            finished, self.finished = self.finished, []
+            if finished and not await asyncio.to_thread(self.forget, finished):
+                # Kept for the next acknowledgement; after a restart they would be handled again
+                self.finished[:0] = finished
+
+    async def restore_pending(self):
+        """Route the updates stored by a previous run that were not handled"""
+        updates = await asyncio.to_thread(self.tracker.database.get_pending_updates, self.tracker.key)
+        for update in updates:
+            self.route(update)
+        if updates:
+            logger.warning(f"Routing {len(updates)} updates left unhandled by the previous run")
+
+    def restart_worker(self, index):
+        """Start a worker again and give it every update its predecessor had not finished"""
+        # The old queue may still hold some of them: a fresh one avoids handling those twice
+        self.queues[index] = self.context.Queue()
+        self.start_worker(index)
+        unfinished = sorted(
+            update_id for update_id, update in self.in_flight.items() if self.shard(update) == index
+        )
+        for update_id in unfinished:
+            self.queues[index].put(self.in_flight[update_id])
+        if unfinished:
+            logger.warning(f"Resending {len(unfinished)} unfinished updates to worker {index}")
+
+    async def monitor_workers(self):
+        """Restart workers that died"""
+        while True:
+            await asyncio.sleep(WORKER_CHECK_INTERVAL)
+            for index, process in enumerate(self.processes):
+                if not process.is_alive():
+                    logger.error(f"Worker {index} exited with code {process.exitcode}, restarting")
+                    self.restart_worker(index)
+
+    async def poll_updates(self):
+        """Long-poll Telegram and route every new update to its worker"""
+        api = get_telegram_api(self.token)
+        try:
+            while True:
+                self.acknowledged.clear()
+                updates = await api.get_updates(self.tracker.offset)
+                if not updates.get("ok"):
+                    await asyncio.sleep(5)
+                    continue
+
+                received = updates.get("result", [])
+                new = [update for update in received if not self.seen(update["update_id"])]
+                if new:
+                    saved = await asyncio.to_thread(self.tracker.database.save_pending_updates, self.tracker.key, new)
+                    if not saved:
+                        logger.warning(f"Could not store {len(new)} updates, polling waits for their handlers")
+                    for update in new:
+                        self.route(update, saved)
+                    self.advance()
+                elif received:
+                    # Everything Telegram returned is still being handled: wait for a worker instead of spinning
+                    try:
+                        await asyncio.wait_for(self.acknowledged.wait(), ACK_WAIT_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                self.tracker.maybe_flush()
+        finally:
+            self.tracker.flush()
+            await api.close()
+
+    def stop(self):
+        """Ask every worker to finish its queue and exit"""
+        for update_queue in self.queues:
+            try:
+                update_queue.put(None)
+            except (ValueError, OSError, queue.Full):
+                pass
+        for process in self.processes:
+            if process:
+                process.join(timeout=30)
+
+    async def run(self):
+        logger.info(f"Starting sharded bot with {self.workers} workers")
+        for index in range(self.workers):
+            self.start_worker(index)
+        await self.restore_pending()
+        monitor = asyncio.create_task(self.monitor_workers())
+        acks = asyncio.create_task(self.receive_acks())
+        try:
+            await self.poll_updates()
+        finally:
+            monitor.cancel()
+            self.stop()
+            acks.cancel()
+            # Acknowledgements of the updates the workers finished while stopping
+            while True:
+                try:
+                    self.acknowledge(self.acks.get_nowait())
+                except (queue.Empty, ValueError, OSError):
+                    break
+            self.forget(self.finished)
+            self.tracker.flush()
+
+
+async def main():
+    # Workers warm up their own connections; the supervisor only needs a valid configuration
+    validate_config()
+    runner = ShardedBotRunner(TELEGRAM_BOT_TOKEN)
+    await runner.run()
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        logger.info("Sharded bot stopped")
@@ -1,70 +1,44 @@
 #!/usr/bin/env python3
 
 import asyncio
-import json
 import logging
-from config import TELEGRAM_BOT_TOKEN, logger
+from config import SESSION_TTL_SECONDS, TELEGRAM_BOT_TOKEN, logger
+from callback_codec import (
+    ACTION_ANSWER, CallbackQuery, CallbackRouter, new_nonce, nonce_age, parse_answer
+)
 from openai_service import openai_service
+from session_store import create_session_store
+from telegram_api import get_telegram_api
+from inflight import InFlightGenerations
+from rendering import GET_ASSIGNMENT_KEYBOARD, RETRY_ASSIGNMENT_KEYBOARD, answer_keyboard
+import services
 
 # Simple bot implementation using direct HTTP requests to Telegram API
-import httpx
+
+callbacks = CallbackRouter()
 
 class SimpleTelegramBot:
     def __init__(self, token):
         self.token = token
-        self.base_url = f"https://api.telegram.org/bot{token}"
-        self.session = httpx.AsyncClient()
-        self.quiz_sessions = {}
+        self.api = get_telegram_api(token)
+        self.quiz_sessions = create_session_store()
+        self.generations = InFlightGenerations()
     
     async def send_message(self, chat_id, text, reply_markup=None):
         """Send a message to a chat"""
-        data = {
-            "chat_id": chat_id,
-            "text": text,
-            "parse_mode": "Markdown"
-        }
-        if reply_markup:
-            data["reply_markup"] = json.dumps(reply_markup)
-        
-        response = await self.session.post(f"{self.base_url}/sendMessage", data=data)
-        return response.json()
+        return await self.api.send_message(chat_id, text, reply_markup)
     
     async def edit_message(self, chat_id, message_id, text, reply_markup=None):
         """Edit a message"""
-        data = {
-            "chat_id": chat_id,
-            "message_id": message_id,
-            "text": text,
-            "parse_mode": "Markdown"
-        }
-        if reply_markup:
-            data["reply_markup"] = json.dumps(reply_markup)
-        
-        response = await self.session.post(f"{self.base_url}/editMessageText", data=data)
-        return response.json()
+        return await self.api.edit_message(chat_id, message_id, text, reply_markup)
     
     async def answer_callback_query(self, callback_query_id, text=None):
         """Answer a callback query"""
-        data = {"callback_query_id": callback_query_id}
-        if text:
-            data["text"] = text
-        
-        response = await self.session.post(f"{self.base_url}/answerCallbackQuery", data=data)
-        return response.json()
+        return await self.api.answer_callback_query(callback_query_id, text)
     
     async def get_updates(self, offset=None):
         """Get updates from Telegram"""
-        params = {"timeout": 30}
-        if offset:
-            params["offset"] = offset
-        
-        try:
-            response = await self.session.get(f"{self.base_url}/getUpdates", params=params)
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Failed to get updates: {e}")
-            return {"ok": False, "error": str(e)}
+        return await self.api.get_updates(offset)
     
     async def handle_start_command(self, chat_id, user):
         """Handle /start command"""
@@ -77,36 +51,32 @@ class SimpleTelegramBot:
             "Нажмите кнопку ниже, чтобы получить первое задание!"
         )
         
-        keyboard = {
-            "inline_keyboard": [[{
-                "text": "📖 Получить задание",
-                "callback_data": "get_assignment"
-            }]]
-        }
+        keyboard = GET_ASSIGNMENT_KEYBOARD
         
         await self.send_message(chat_id, welcome_message, keyboard)
     
     async def handle_get_assignment(self, chat_id, message_id, user_id):
         """Handle get assignment request"""
         # Clear any existing session
-        if user_id in self.quiz_sessions:
-            del self.quiz_sessions[user_id]
+        await self.quiz_sessions.adelete(user_id)
         
         # Show loading message
         await self.edit_message(chat_id, message_id, "⏳ Генерируем новое задание...")
         
         try:
             # Generate lesson and quiz
-            lesson_data = await openai_service.generate_lesson_and_quiz()
+            lesson_data = await openai_service.generate_lesson_and_quiz(user_id=user_id)
             
             # Store session
-            self.quiz_sessions[user_id] = {
+            nonce = new_nonce()
+            await self.quiz_sessions.aset(user_id, {
                 'lesson': lesson_data['lesson'],
                 'question': lesson_data['question'],
                 'options': lesson_data['options'],
                 'correct_answer': lesson_data['correct_answer'],
-                'answered': False
-            }
+                'answered': False,
+                'nonce': nonce
+            })
             
             # Format message
             message = f"📚 **Урок по межславянскому языку**\n\n"
@@ -114,43 +84,36 @@ class SimpleTelegramBot:
             message += f"❓ **Вопрос:**\n{lesson_data['question']}"
             
             # Create keyboard with options
-            keyboard = {"inline_keyboard": []}
-            for i, option in enumerate(lesson_data['options']):
-                keyboard["inline_keyboard"].append([{
-                    "text": option,
-                    "callback_data": f"answer_{i}_{option}"
-                }])
+            keyboard = answer_keyboard(nonce, lesson_data['options'])
             
             await self.edit_message(chat_id, message_id, message, keyboard)
             
         except Exception as e:
             logger.error(f"Error generating assignment: {e}")
-            error_keyboard = {
-                "inline_keyboard": [[{
-                    "text": "📖 Попробовать снова",
-                    "callback_data": "get_assignment"
-                }]]
-            }
+            error_keyboard = RETRY_ASSIGNMENT_KEYBOARD
             await self.edit_message(
                 chat_id, message_id, 
                 f"😔 Ошибка при создании задания: {str(e)}", 
                 error_keyboard
             )
     
-    async def handle_quiz_answer(self, chat_id, message_id, user_id, callback_data):
-        """Handle quiz answer"""
-        session = self.quiz_sessions.get(user_id)
-        if not session or session['answered']:
+    async def handle_quiz_answer(self, chat_id, message_id, user_id, option_index, nonce=None):
+        """Handle quiz answer; nonce is None for buttons in the legacy format"""
+        # Answers to quizzes older than the session TTL are ignored without a session lookup
+        age = nonce_age(nonce) if nonce is not None else 0
+        if age is None or age > SESSION_TTL_SECONDS:
+            return
+        
+        # A button of an earlier quiz does not match the nonce and leaves the current one open
+        session = await self.quiz_sessions.aclaim(user_id, nonce)
+        if not session:
             return
         
-        # Parse answer
         try:
-            parts = callback_data.split("_", 2)
-            user_answer = parts[2]
-        except:
+            user_answer = session['options'][option_index]
+        except IndexError:
             return
         
-        session['answered'] = True
         session['user_answer'] = user_answer
         is_correct = user_answer == session['correct_answer']
         
@@ -160,7 +123,7 @@ class SimpleTelegramBot:
         try:
             # Generate feedback
             feedback = await openai_service.generate_feedback(
-                session['question'], user_answer, session['correct_answer'], is_correct
+                session['question'], user_answer, session['correct_answer'], is_correct, user_id=user_id
             )
         except:
             feedback = None
@@ -176,19 +139,29 @@ class SimpleTelegramBot:
             message += f"💡 {feedback}\n\n"
         message += "Нажмите «Получить задание» для нового урока!"
         
-        keyboard = {
-            "inline_keyboard": [[{
-                "text": "📖 Получить задание",
-                "callback_data": "get_assignment"
-            }]]
-        }
+        keyboard = GET_ASSIGNMENT_KEYBOARD
         
         await self.edit_message(chat_id, message_id, message, keyboard)
         
         # Clean up session
-        del self.quiz_sessions[user_id]
+        await self.quiz_sessions.adelete(user_id)
         logger.info(f"User {user_id} answered {'correctly' if is_correct else 'incorrectly'}")
     
+    @callbacks.on("get_assignment")
+    async def on_get_assignment(self, query):
+        # Generated in the background; a double tap joins the running generation
+        self.generations.start(
+            query.user_id, lambda: self.handle_get_assignment(query.chat_id, query.message_id, query.user_id)
+        )
+    
+    @callbacks.action(ACTION_ANSWER)
+    @callbacks.prefix("answer_")  # legacy "answer_<index>_<option text>" buttons
+    async def on_answer(self, query):
+        answer = parse_answer(query.data)
+        if answer:
+            nonce, option_index = answer
+            await self.handle_quiz_answer(query.chat_id, query.message_id, query.user_id, option_index, nonce)
+    
     async def run(self):
         """Main bot loop"""
         logger.info("Starting Simple Telegram Bot...")
@@ -224,10 +197,10 @@ class SimpleTelegramBot:
                             
                             await self.answer_callback_query(query["id"])
                             
-                            if data == "get_assignment":
-                                await self.handle_get_assignment(chat_id, message_id, user_id)
-                            elif data.startswith("answer_"):
-                                await self.handle_quiz_answer(chat_id, message_id, user_id, data)
+                            route = callbacks.resolve(data)
+                            if route:
+                                handler, _, args = route
+                                await handler(self, CallbackQuery(query["id"], chat_id, message_id, user_id, data, args))
                 else:
                     logger.error(f"Failed to get updates: {updates}")
                 
@@ -238,6 +211,7 @@ class SimpleTelegramBot:
                 await asyncio.sleep(5)
 
 async def main():
+    await services.init(TELEGRAM_BOT_TOKEN, names=("openai", "telegram"))
     bot = SimpleTelegramBot(TELEGRAM_BOT_TOKEN)
     await bot.run()
 
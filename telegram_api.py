@@ -0,0 +1,182 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+import httpx
+from config import (
+    TELEGRAM_API_URL, TELEGRAM_MAX_CONNECTIONS, TELEGRAM_MAX_KEEPALIVE,
+    TELEGRAM_SEND_TIMEOUT, TELEGRAM_POLL_TIMEOUT, TELEGRAM_RENDER_CACHE_SIZE, logger
+)
+from telegram_outbox import NOT_MODIFIED, TelegramOutbox
+from metrics import registry, stage_seconds
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    # Installed with httpx[http2]; without h2 httpx falls back to HTTP/1.1 with keep-alive pooling
+    HTTP2_AVAILABLE = False
+    logger.warning("h2 is not installed, talking to the Telegram Bot API over HTTP/1.1")
+
+edits_skipped = registry.counter(
+    "telegram_edits_skipped_total", "Message edits not sent because the message already shows that content"
+)
+
+
+def rendered_digest(text, reply_markup=None, parse_mode=None):
+    """Digest of what an edit would display"""
+    if isinstance(reply_markup, str):
+        markup = reply_markup  # a pre-serialized rendering.Keyboard
+    else:
+        markup = json.dumps(reply_markup, ensure_ascii=False, sort_keys=True) if reply_markup else ""
+    return hashlib.blake2b(f"{parse_mode}\0{text}\0{markup}".encode("utf-8"), digest_size=16).digest()
+
+
+class RenderedStateCache:
+    """Digest of the last content sent to each (chat_id, message_id), least recently used evicted first"""
+
+    def __init__(self, size=TELEGRAM_RENDER_CACHE_SIZE):
+        self.size = size
+        self.digests = OrderedDict()
+
+    def matches(self, key, digest):
+        if self.digests.get(key) != digest:
+            return False
+        self.digests.move_to_end(key)
+        return True
+
+    def put(self, key, digest):
+        if not self.size:
+            return
+        self.digests[key] = digest
+        self.digests.move_to_end(key)
+        if len(self.digests) > self.size:
+            self.digests.popitem(last=False)
+
+    def discard(self, key):
+        self.digests.pop(key, None)
+
+
+class TelegramAPI:
+    """Shared client for the Telegram Bot API
+
+    One pooled HTTP/2 connection set per process, JSON request bodies, short
+    timeouts for send calls and a longer one for getUpdates long polling.
+    Outbound calls go through a TelegramOutbox for rate limiting.
+    """
+
+    def __init__(self, token, api_url=TELEGRAM_API_URL):
+        self.base_url = f"{api_url}/bot{token}"
+        self.send_timeout = httpx.Timeout(TELEGRAM_SEND_TIMEOUT, connect=5.0)
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE,
+            timeout=self.send_timeout,
+            limits=httpx.Limits(
+                max_connections=TELEGRAM_MAX_CONNECTIONS,
+                max_keepalive_connections=TELEGRAM_MAX_KEEPALIVE,
+                keepalive_expiry=60.0
+            )
+        )
+        self.outbox = TelegramOutbox(self.client, self.base_url)
+        self.rendered = RenderedStateCache()
+
+    async def call(self, method, data, chat_id=None, priority=None, files=None):
+        """Send a Bot API call through the outbox and return the decoded response"""
+        started = time.perf_counter()
+        try:
+            return await self.outbox.call(method, data, chat_id=chat_id, priority=priority, files=files)
+        finally:
+            stage_seconds.observe(time.perf_counter() - started, stage="telegram", name=method)
+
+    async def send_message(self, chat_id, text, reply_markup=None, priority=None):
+        data = {
+            "chat_id": chat_id,
+            "text": text,
+            "parse_mode": "Markdown"
+        }
+        if reply_markup:
+            data["reply_markup"] = reply_markup
+        return await self.call("sendMessage", data, chat_id=chat_id, priority=priority)
+
+    async def edit_message(self, chat_id, message_id, text, reply_markup=None):
+        """Edit a message's text; skipped if the message already shows exactly this"""
+        key = (chat_id, message_id)
+        digest = rendered_digest(text, reply_markup, "Markdown")
+        if self.rendered.matches(key, digest):
+            edits_skipped.inc()
+            return {"ok": True, "result": True}
+        # Stored before sending: a newer edit merged into this one in the outbox has already replaced it
+        self.rendered.put(key, digest)
+        data = {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "text": text,
+            "parse_mode": "Markdown"
+        }
+        if reply_markup:
+            data["reply_markup"] = reply_markup
+        result = await self.call("editMessageText", data, chat_id=chat_id)
+        if not result.get("ok") and NOT_MODIFIED not in (result.get("description") or ""):
+            self.rendered.discard(key)
+        return result
+
+    async def answer_callback_query(self, callback_query_id, text=None, show_alert=False):
+        data = {"callback_query_id": callback_query_id}
+        if text:
+            data["text"] = text
+        if show_alert:
+            data["show_alert"] = True
+        return await self.call("answerCallbackQuery", data)
+
+    async def send_photo(self, chat_id, photo, caption=None, reply_markup=None):
+        """Upload a photo (multipart, so reply_markup has to be a JSON string here)"""
+        data = {"chat_id": chat_id}
+        if caption:
+            data["caption"] = caption
+        if reply_markup:
+            data["reply_markup"] = reply_markup if isinstance(reply_markup, str) else json.dumps(reply_markup)
+        return await self.call("sendPhoto", data, chat_id=chat_id, files={"photo": photo})
+
+    async def send_media_group(self, chat_id, media, files=None):
+        """Send 2-10 photos as one album
+
+        media items refer to a file_id or, for uploads, to "attach://<name>"
+        with the file passed in files[<name>] (multipart, media as a JSON string).
+        """
+        if files:
+            data = {"chat_id": chat_id, "media": json.dumps(media, ensure_ascii=False)}
+            return await self.call("sendMediaGroup", data, chat_id=chat_id, files=files)
+        return await self.call("sendMediaGroup", {"chat_id": chat_id, "media": media}, chat_id=chat_id)
+
+    async def get_updates(self, offset=None, timeout=TELEGRAM_POLL_TIMEOUT):
+        """Long-poll for updates (bypasses the outbox, it is not a send)"""
+        params = {"timeout": timeout}
+        if offset:
+            params["offset"] = offset
+
+        try:
+            response = await self.client.get(
+                f"{self.base_url}/getUpdates",
+                params=params,
+                timeout=httpx.Timeout(timeout + 10.0, connect=5.0)
+            )
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            logger.error(f"Failed to get updates: {e}")
+            return {"ok": False, "error": str(e)}
+
+    async def close(self):
+        await self.outbox.close()
+        await self.client.aclose()
+
+
+_clients = {}
+
+
+def get_telegram_api(token):
+    """Get the process-wide TelegramAPI for a bot token"""
+    api = _clients.get(token)
+    if api is None:
+        api = _clients[token] = TelegramAPI(token)
+    return api
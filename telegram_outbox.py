@@ -0,0 +1,340 @@
+import asyncio
+import heapq
+import itertools
+import time
+from config import (
+    TELEGRAM_GLOBAL_RATE, TELEGRAM_PER_CHAT_RATE, TELEGRAM_PER_CHAT_BURST,
+    TELEGRAM_MAX_RETRIES, logger
+)
+from metrics import registry
+from rendering import encode_body
+
+# Priorities of outbound calls, lower is sent first
+PRIORITY_CALLBACK = 0  # answerCallbackQuery: removes the spinner on the button
+PRIORITY_EDIT = 1      # editMessageText: screen updates the user is waiting for
+PRIORITY_SEND = 2      # sendMessage/sendPhoto in reply to a user action
+PRIORITY_PUSH = 3      # broadcasts such as the daily ritual
+
+# Edits of one message still waiting in the queue are merged, the latest content wins
+COALESCED_METHODS = ("editMessageText", "editMessageReplyMarkup")
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+# Telegram's answer to an edit that would not change the message; not a failure
+NOT_MODIFIED = "message is not modified"
+
+METHOD_PRIORITIES = {
+    "answerCallbackQuery": PRIORITY_CALLBACK,
+    "editMessageText": PRIORITY_EDIT,
+    "editMessageReplyMarkup": PRIORITY_EDIT,
+}
+
+queue_depth = registry.gauge("telegram_outbox_queue_depth", "Calls waiting in the Telegram outbox")
+queue_wait = registry.histogram("telegram_outbox_wait_seconds", "Time from enqueue to dispatch")
+retries = registry.counter("telegram_outbox_retries_total", "Telegram calls retried")
+failures = registry.counter("telegram_outbox_failures_total", "Telegram calls that failed permanently")
+coalesced = registry.counter("telegram_outbox_coalesced_total", "Queued edits replaced by a newer edit of the same message")
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, at most `capacity` stored"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now=None):
+        """Seconds until a token is available (0 if one is available now)"""
+        now = now if now is not None else time.monotonic()
+        self._refill(now)
+        wait = 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+        return max(wait, self.blocked_until - now)
+
+    def consume(self):
+        self.tokens -= 1
+
+    def block(self, seconds):
+        """Stop handing out tokens for `seconds` (Telegram retry_after)"""
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class _OutboundCall:
+    def __init__(self, method, data, chat_id, files, priority, key=None):
+        self.key = key
+        self.method = method
+        self.priority = priority
+        self.data = data
+        self.chat_id = chat_id
+        self.files = files
+        self.attempts = 0
+        self.enqueued_at = time.monotonic()
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class TelegramOutbox:
+    """Rate-limited, prioritized queue for outbound Telegram Bot API calls
+
+    Calls are sent in priority order while respecting a global token bucket and
+    a bucket per chat. 429 responses block the affected bucket for `retry_after`
+    seconds and the call is re-queued; network and 5xx errors are retried with
+    backoff. Callers await the Telegram response as before. An edit of a
+    message whose previous edit has not been sent yet replaces that edit's
+    content, and both callers get the response of the single call.
+
+    Calls wait in one priority heap per chat. The head of every chat whose
+    bucket allows sending is in the `ready` heap; chats blocked by their
+    bucket wait in the `waiting` heap by the time they may send again, so
+    picking the next call costs O(log n) however long the backlog is.
+    """
+
+    def __init__(self, session, base_url, global_rate=TELEGRAM_GLOBAL_RATE,
+                 per_chat_rate=TELEGRAM_PER_CHAT_RATE, per_chat_burst=TELEGRAM_PER_CHAT_BURST,
+                 max_retries=TELEGRAM_MAX_RETRIES):
+        self.session = session
+        self.base_url = base_url
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_retries = max_retries
+        self.chat_buckets = {}
+        # (method, chat_id, message_id) -> queued edit not yet dispatched
+        self.pending_edits = {}
+        # (method, chat_id, message_id) -> newest edit of the message until it completes
+        self.latest_edits = {}
+        # chat_id -> heap of (priority, seq, job)
+        self.queues = {}
+        # (priority, seq, chat_id) of chat queue heads; entries whose head was sent or replaced are skipped
+        self.ready = []
+        # (monotonic time the chat's bucket allows sending, chat_id)
+        self.waiting = []
+        self.waiting_chats = set()
+        self.size = 0
+        # Calls being sent; the loop only keeps weak references to tasks
+        self.sending = set()
+        self.closed = False
+        self.counter = itertools.count()
+        self.wakeup = None
+        self.dispatcher = None
+
+    async def call(self, method, data, chat_id=None, priority=None, files=None):
+        """Queue a Bot API call and wait for its JSON response"""
+        if priority is None:
+            priority = METHOD_PRIORITIES.get(method, PRIORITY_SEND)
+        key = (method, chat_id, data.get("message_id")) if method in COALESCED_METHODS and not files else None
+        queued = self.pending_edits.get(key) if key else None
+        if queued is not None:
+            queued.data = data
+            coalesced.inc(method=method)
+            return await queued.future
+        job = _OutboundCall(method, data, chat_id, files, priority, key)
+        if key:
+            self.pending_edits[key] = job
+            self.latest_edits[key] = job
+            job.future.add_done_callback(lambda done: self._forget_edit(job))
+        self._push(job)
+        self._ensure_dispatcher()
+        return await job.future
+
+    def _push(self, job):
+        if self.closed:
+            # A retry scheduled before close()
+            if not job.future.done():
+                job.future.set_result({"ok": False, "description": "outbox closed"})
+            return
+        entry = (job.priority, next(self.counter), job)
+        chat_queue = self.queues.setdefault(job.chat_id, [])
+        heapq.heappush(chat_queue, entry)
+        self.size += 1
+        queue_depth.set(self.size)
+        # A waiting chat is scheduled again when its wait is over; otherwise the new head must be ready
+        if job.chat_id not in self.waiting_chats and chat_queue[0] is entry:
+            heapq.heappush(self.ready, (entry[0], entry[1], job.chat_id))
+        if self.wakeup:
+            self.wakeup.set()
+
+    def _ensure_dispatcher(self):
+        if self.dispatcher is None or self.dispatcher.done():
+            self.wakeup = asyncio.Event()
+            self.dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = self.chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return bucket
+
+    def _next_ready(self):
+        """Pop the highest-priority call whose buckets allow sending now
+
+        Returns (job, None) or (None, seconds to wait).
+        """
+        now = time.monotonic()
+        global_delay = self.global_bucket.delay(now)
+        if global_delay > 0:
+            return None, global_delay
+
+        while self.waiting and self.waiting[0][0] <= now:
+            _, chat_id = heapq.heappop(self.waiting)
+            self.waiting_chats.discard(chat_id)
+            self._schedule(chat_id)
+
+        while self.ready:
+            _, seq, chat_id = heapq.heappop(self.ready)
+            chat_queue = self.queues.get(chat_id)
+            if not chat_queue or chat_queue[0][1] != seq or chat_id in self.waiting_chats:
+                continue
+            delay = 0.0 if chat_id is None else self._chat_bucket(chat_id).delay(now)
+            if delay > 0:
+                heapq.heappush(self.waiting, (now + delay, chat_id))
+                self.waiting_chats.add(chat_id)
+                continue
+            job = heapq.heappop(chat_queue)[2]
+            self.size -= 1
+            if chat_queue:
+                self._schedule(chat_id)
+            else:
+                del self.queues[chat_id]
+            if job.key and self.pending_edits.get(job.key) is job:
+                del self.pending_edits[job.key]
+            return job, None
+        return None, (self.waiting[0][0] - now if self.waiting else None)
+
+    def _schedule(self, chat_id):
+        """Make the head of the chat's queue a candidate for sending"""
+        chat_queue = self.queues.get(chat_id)
+        if chat_queue:
+            priority, seq, _ = chat_queue[0]
+            heapq.heappush(self.ready, (priority, seq, chat_id))
+
+    async def _dispatch_loop(self):
+        while True:
+            if not self.size:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+
+            job, delay = self._next_ready()
+            if job is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            queue_depth.set(self.size)
+            self.global_bucket.consume()
+            if job.chat_id is not None:
+                self._chat_bucket(job.chat_id).consume()
+            if job.attempts == 0:
+                queue_wait.observe(time.monotonic() - job.enqueued_at, method=job.method)
+            task = asyncio.create_task(self._send(job))
+            self.sending.add(task)
+            task.add_done_callback(self.sending.discard)
+
+    async def _send(self, job):
+        job.attempts += 1
+        try:
+            if job.files:
+                for file in job.files.values():
+                    # A file is either a file object or a (filename, file object) tuple
+                    file = file[1] if isinstance(file, tuple) else file
+                    if hasattr(file, "seek"):
+                        file.seek(0)
+                response = await self.session.post(f"{self.base_url}/{job.method}", data=job.data, files=job.files)
+            else:
+                # Pre-serialized keyboards are spliced into the body instead of being encoded again
+                response = await self.session.post(
+                    f"{self.base_url}/{job.method}", content=encode_body(job.data), headers=JSON_HEADERS
+                )
+        except Exception as e:
+            self._retry_or_fail(job, f"network error: {e}", backoff=2 ** job.attempts)
+            return
+
+        try:
+            result = response.json()
+        except ValueError:
+            result = {"ok": False, "description": response.text}
+
+        if response.status_code == 429:
+            retry_after = result.get("parameters", {}).get("retry_after", 1)
+            logger.warning(f"Telegram 429 on {job.method} for chat {job.chat_id}, retry after {retry_after}s")
+            bucket = self.global_bucket if job.chat_id is None else self._chat_bucket(job.chat_id)
+            bucket.block(retry_after)
+            self._retry_or_fail(job, "too many requests", backoff=0)
+        elif response.status_code >= 500:
+            self._retry_or_fail(job, f"HTTP {response.status_code}", backoff=2 ** job.attempts)
+        else:
+            if not result.get("ok") and NOT_MODIFIED in (result.get("description") or ""):
+                logger.debug(f"Telegram {job.method} for chat {job.chat_id}: {result.get('description')}")
+            elif not result.get("ok"):
+                failures.inc(method=job.method)
+                logger.error(f"Telegram {job.method} failed for chat {job.chat_id}: {result.get('description')}")
+            if not job.future.done():
+                job.future.set_result(result)
+
+    def _retry_or_fail(self, job, reason, backoff):
+        if job.attempts > self.max_retries:
+            failures.inc(method=job.method)
+            logger.error(f"Telegram {job.method} for chat {job.chat_id} dropped after {job.attempts} attempts: {reason}")
+            if not job.future.done():
+                job.future.set_result({"ok": False, "description": reason})
+            return
+
+        retries.inc(method=job.method)
+        if job.key:
+            newer = self.latest_edits.get(job.key)
+            if newer is not None and newer is not job:
+                # The message got a newer edit meanwhile (queued or sent): resending this one could overwrite it
+                coalesced.inc(method=job.method)
+                newer.future.add_done_callback(lambda done: self._settle(job, done))
+                return
+            # Edits made while this one waits for its retry are merged into it
+            self.pending_edits[job.key] = job
+        if backoff:
+            asyncio.get_running_loop().call_later(backoff, self._push, job)
+        else:
+            self._push(job)
+
+    def _forget_edit(self, job):
+        if self.latest_edits.get(job.key) is job:
+            del self.latest_edits[job.key]
+        if self.pending_edits.get(job.key) is job:
+            del self.pending_edits[job.key]
+
+    @staticmethod
+    def _settle(job, newer_future):
+        """Give a superseded call the response of the call that replaced it"""
+        if job.future.done():
+            return
+        if newer_future.cancelled():
+            job.future.cancel()
+        else:
+            job.future.set_result(newer_future.result())
+
+    async def close(self):
+        """Stop the dispatcher and wait for the calls being sent; queued calls are failed"""
+        self.closed = True
+        if self.dispatcher:
+            self.dispatcher.cancel()
+        if self.sending:
+            await asyncio.gather(*self.sending, return_exceptions=True)
+        for chat_queue in self.queues.values():
+            for _, _, job in chat_queue:
+                if not job.future.done():
+                    job.future.set_result({"ok": False, "description": "outbox closed"})
+        self.queues.clear()
+        self.ready.clear()
+        self.waiting.clear()
+        self.waiting_chats.clear()
+        self.size = 0
+        self.pending_edits.clear()
+        self.latest_edits.clear()
+        queue_depth.set(0)
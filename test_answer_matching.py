@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+
+# Checks how typed quiz answers are graded: which differences from the correct
+# answer pass and which are wrong answers
+from answer_matching import EXACT, NORMALIZED, REORDERED, TYPO, WRONG, edit_distance, grade_answer
+
+PHRASE = "Ja jesm student iz Pragy"
+PHRASE_OPTIONS = (PHRASE, "Ty jesi student iz Pragy", "My jesmo studenti")
+
+
+def test_same_answer_in_any_script_or_order_passes():
+    assert grade_answer(PHRASE, PHRASE, PHRASE_OPTIONS) == (True, EXACT)
+    assert grade_answer("ја јесм студент из прагы!", PHRASE, PHRASE_OPTIONS) == (True, NORMALIZED)
+    assert grade_answer("Rěč", "rec") == (True, NORMALIZED)
+    assert grade_answer("Iz Pragy ja jesm student", PHRASE, PHRASE_OPTIONS) == (True, REORDERED)
+
+
+def test_typo_in_a_stem_passes():
+    assert grade_answer("Ja jesm studnet iz Pragy", PHRASE, PHRASE_OPTIONS) == (True, TYPO)
+    assert grade_answer("knjyga", "knjiga") == (True, TYPO)
+
+
+def test_other_option_is_wrong():
+    assert grade_answer("My jesmo studenti", PHRASE, PHRASE_OPTIONS) == (False, WRONG)
+    assert grade_answer("", PHRASE, PHRASE_OPTIONS) == (False, WRONG)
+
+
+def test_answer_as_close_to_another_option_is_wrong():
+    assert grade_answer("vodi", "voda", ["voda", "vody"]) == (False, WRONG)
+    assert grade_answer("vodopod", "vodopad") == (True, TYPO)
+    assert grade_answer("vodopod", "vodopad", ["vodopad", "vodovod"]) == (False, WRONG)
+
+
+def test_short_answer_has_no_typo_tolerance():
+    assert grade_answer("vida", "voda") == (False, WRONG)
+    assert grade_answer("kot", "kit") == (False, WRONG)
+
+
+def test_other_ending_is_wrong():
+    assert grade_answer("knjigu", "knjiga") == (False, WRONG)
+    assert grade_answer("studenta", "student") == (False, WRONG)
+    assert grade_answer("Ja jesm studenti iz Pragy", PHRASE, PHRASE_OPTIONS) == (False, WRONG)
+
+
+def test_edit_distance_stops_at_limit():
+    assert edit_distance("student", "studnet", 2) == 2
+    assert edit_distance("student", "studnet", 1) == 2
+    assert edit_distance("voda", "vodopad", 1) == 2
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+
+# Checks the compact callback_data format and the callback router
+import time
+import pytest
+import callback_codec
+from callback_codec import (
+    ACTION_ANSWER, MAX_CALLBACK_BYTES, CallbackRouter, answer_callback, decode, encode, new_nonce, nonce_age,
+    parse_answer
+)
+
+
+def test_encode_decode_round_trip():
+    data = encode(ACTION_ANSWER, "skk0x4q7", 2)
+    assert data == "1a.skk0x4q7.2"
+    assert decode(data) == (ACTION_ANSWER, ["skk0x4q7", "2"])
+    assert decode("get_assignment") is None
+    assert decode("1") is None
+
+
+def test_callback_data_is_limited_to_64_bytes():
+    assert len(encode(ACTION_ANSWER, "x" * (MAX_CALLBACK_BYTES - 3)).encode()) == MAX_CALLBACK_BYTES
+    with pytest.raises(ValueError):
+        encode(ACTION_ANSWER, "x" * (MAX_CALLBACK_BYTES - 2))
+    # Multi-byte characters count in bytes
+    with pytest.raises(ValueError):
+        encode(ACTION_ANSWER, "ж" * 31)
+    assert len(answer_callback(new_nonce(), 3).encode()) <= MAX_CALLBACK_BYTES
+
+
+def test_answer_callback_round_trip():
+    nonce = new_nonce()
+    assert parse_answer(answer_callback(nonce, 3)) == (nonce, 3)
+    # Buttons of the legacy format carry the option text and no nonce
+    assert parse_answer("answer_1_вода") == (None, 1)
+    for data in ("1a.nonce", "1a.nonce.x", "1b.nonce.1", "answer_x_вода", "get_assignment"):
+        assert parse_answer(data) is None
+
+
+def test_nonce_age():
+    nonce = new_nonce()
+    assert 0 <= nonce_age(nonce) < 2
+    old = callback_codec._base36(int(time.time()) - 3600) + "zz"
+    assert 3599 <= nonce_age(old) < 3602
+    assert nonce_age("!!") is None
+    assert nonce_age(None) is None
+
+
+def test_router_dispatch():
+    router = CallbackRouter()
+
+    @router.on("get_assignment")
+    def exact():
+        pass
+
+    @router.prefix("level_")
+    def prefixed():
+        pass
+
+    @router.action(ACTION_ANSWER, ack=False)
+    def action():
+        pass
+
+    assert router.resolve("get_assignment") == (exact, True, [])
+    assert router.resolve("level_beginner") == (prefixed, True, ["beginner"])
+    assert router.resolve(answer_callback("abc12", 1)) == (action, False, ["abc12", "1"])
+    assert router.resolve("1z.field") is None
+    assert router.resolve("goal_texts") is None
+    assert router.resolve("unknown") is None
+
+
+def test_router_rejects_bad_routes():
+    router = CallbackRouter()
+    router.on("main_menu")(lambda: None)
+    with pytest.raises(ValueError):
+        router.on("main_menu")
+    with pytest.raises(ValueError):
+        router.prefix("level")
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
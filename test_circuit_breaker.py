@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+# Checks that the OpenAI circuit breaker only changes state on real outcomes
+import asyncio
+from circuit_breaker import STATE_CLOSED, STATE_HALF_OPEN, STATE_OPEN, CircuitBreaker, CircuitOpenError
+from openai_service import OpenAIService
+
+
+def _half_open_service():
+    service = OpenAIService()
+    service.breaker = CircuitBreaker("test", min_calls=1, open_seconds=0.0)
+    service.breaker.record(0.0, failed=True)
+    assert service.breaker.state == STATE_OPEN
+    return service
+
+
+def test_success_of_probe_closes():
+    breaker = CircuitBreaker("test", min_calls=1, open_seconds=0.0)
+    breaker.record(0.0, failed=True)
+    breaker.before_call()
+    assert breaker.state == STATE_HALF_OPEN
+    breaker.record(0.0)
+    assert breaker.state == STATE_CLOSED
+
+
+def test_cancelled_probe_does_not_close():
+    service = _half_open_service()
+
+    async def hang(*args):
+        await asyncio.Event().wait()
+
+    async def main():
+        service._create_routed_completion = hang
+        call = asyncio.create_task(service._create_completion("feedback", messages=[]))
+        await asyncio.sleep(0)
+        assert service.breaker.state == STATE_HALF_OPEN
+        call.cancel()
+        try:
+            await call
+        except asyncio.CancelledError:
+            pass
+        else:
+            raise AssertionError("the cancellation was swallowed")
+
+    asyncio.run(main())
+    assert service.breaker.state == STATE_HALF_OPEN
+    # The probe slot is free again for the next call
+    service.breaker.before_call()
+    try:
+        service.breaker.before_call()
+    except CircuitOpenError:
+        pass
+    else:
+        raise AssertionError("a second probe was let through")
+
+
+def test_cancelled_calls_are_not_counted():
+    service = OpenAIService()
+    service.breaker = CircuitBreaker("test", window=4, min_calls=2)
+
+    async def hang(*args):
+        await asyncio.Event().wait()
+
+    async def main():
+        service._create_routed_completion = hang
+        calls = [asyncio.create_task(service._create_completion("feedback", messages=[])) for _ in range(3)]
+        await asyncio.sleep(0)
+        for call in calls:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+
+    asyncio.run(main())
+    assert not service.breaker.outcomes
+    service.breaker.record(0.0, failed=True)
+    service.breaker.record(0.0, failed=True)
+    assert service.breaker.state == STATE_OPEN
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+
+# Checks that locally built questions have exactly one right option
+from distractor_index import DistractorIndex
+from exercise_engine import ExerciseEngine
+
+ROWS = [
+    {"id": 1, "isv": "mir", "partOfSpeech": "m.", "ru": "мир, покой", "level": "A1"},
+    {"id": 2, "isv": "svět", "partOfSpeech": "m.", "ru": "мир, свет", "level": "A1"},
+    {"id": 3, "isv": "dom", "partOfSpeech": "m.", "ru": "дом", "level": "A1"},
+    {"id": 4, "isv": "grad", "partOfSpeech": "m.", "ru": "город", "level": "A1"},
+    {"id": 5, "isv": "les", "partOfSpeech": "m.", "ru": "лес", "level": "A1"},
+    {"id": 6, "isv": "hlěb", "partOfSpeech": "m.", "ru": "хлеб", "level": "A1"},
+    {"id": 7, "isv": "stol", "partOfSpeech": "m.", "ru": "стол", "level": "A1"},
+]
+
+SENSES = {row["isv"]: row["ru"].split(",")[0] for row in ROWS}
+
+
+def _engine():
+    engine = ExerciseEngine(database=object(), index=DistractorIndex())
+    engine.load(ROWS)
+    return engine
+
+
+def test_synonym_is_never_a_wrong_option():
+    engine = _engine()
+    for seed in range(300):
+        lesson = engine.generate("Мир", 1, question_count=5, seed=seed)
+        for question in lesson.get("questions") or [lesson]:
+            options = question["options"]
+            assert len(options) == len(set(options)) == 4
+            assert question["correct_answer"] in options
+            if question["correct_answer"] in SENSES:
+                right = [option for option in options if SENSES[option] == SENSES[question["correct_answer"]]]
+                assert right == [question["correct_answer"]], question
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
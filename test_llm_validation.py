@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+# Checks which malformed LLM lessons are repaired and which are rejected
+import copy
+import pytest
+from llm_validation import LLMValidationError, repair_lesson, repair_question_set
+
+OPTIONS = ["voda", "ogonj", "zemja", "vozduh"]
+
+
+def _lesson(**fields):
+    return {"lesson": "Урок", "question": "Как будет «вода»?", "options": list(OPTIONS), "correct_answer": "voda",
+            **fields}
+
+
+# (case, lesson, expected options, expected correct_answer)
+REPAIRED = [
+    ("valid", _lesson(), OPTIONS, "voda"),
+    ("answer as letter", _lesson(correct_answer="Б"), OPTIONS, "ogonj"),
+    ("answer as latin letter", _lesson(correct_answer="c)"), OPTIONS, "zemja"),
+    ("answer as number", _lesson(correct_answer="4"), OPTIONS, "vozduh"),
+    ("answer in other case", _lesson(correct_answer=" VODA "), OPTIONS, "voda"),
+    ("answer with prefix", _lesson(correct_answer="В) zemja"), OPTIONS, "zemja"),
+    ("prefixed options", _lesson(options=["А) voda", "Б) ogonj", "В) zemja", "Г) vozduh"]), OPTIONS, "voda"),
+    ("duplicate and empty options", _lesson(options=["voda", "voda", " ", "ogonj"]), ["voda", "ogonj"], "voda"),
+    ("too many options", _lesson(options=OPTIONS + ["dom", "les"], correct_answer="les"),
+     ["voda", "ogonj", "zemja", "les"], "les"),
+    ("numeric answer", _lesson(options=["1", "2", "3"], correct_answer=2), ["1", "2", "3"], "2"),
+]
+
+# (case, lesson, fragment of the error)
+REJECTED = [
+    ("not an object", ["voda"], "expected an object"),
+    ("missing question", {key: value for key, value in _lesson().items() if key != "question"}, "missing question"),
+    ("missing options", _lesson(options=None), "missing options"),
+    ("options not a list", _lesson(options="voda, ogonj"), "options is str"),
+    ("one option", _lesson(options=["voda", "voda"]), "only 1 distinct options"),
+    ("answer not an option", _lesson(correct_answer="dom"), "is not an option"),
+    ("answer index out of range", _lesson(correct_answer="5"), "is not an option"),
+    ("answer letter out of range", _lesson(options=["voda", "ogonj"], correct_answer="В"), "is not an option"),
+]
+
+
+@pytest.mark.parametrize("case, lesson, options, correct_answer", REPAIRED, ids=[case[0] for case in REPAIRED])
+def test_lesson_is_repaired(case, lesson, options, correct_answer):
+    repaired = repair_lesson(copy.deepcopy(lesson))
+    assert repaired["options"] == options
+    assert repaired["correct_answer"] == correct_answer
+
+
+@pytest.mark.parametrize("case, lesson, error", REJECTED, ids=[case[0] for case in REJECTED])
+def test_lesson_is_rejected(case, lesson, error):
+    with pytest.raises(LLMValidationError, match=error):
+        repair_lesson(copy.deepcopy(lesson))
+
+
+def test_question_set_keeps_usable_questions():
+    data = {
+        "lesson": " Урок ",
+        "task_type": "Слово дня",
+        "questions": [
+            {"question": "Q1", "options": OPTIONS, "correct_answer": "A"},
+            {"question": "Q2", "options": ["voda"], "correct_answer": "voda"},
+            {"question": "Q3", "options": OPTIONS, "correct_answer": "9"},
+            "not a question",
+            {"question": "Q1", "options": OPTIONS, "correct_answer": "ogonj"},
+            {"question": "Q4", "options": OPTIONS},
+            {"question": "Q5", "options": OPTIONS, "correct_answer": "vozduh"},
+        ],
+    }
+    lesson = repair_question_set(data)
+    assert [question["question"] for question in lesson["questions"]] == ["Q1", "Q5"]
+    assert lesson["question"] == "Q1" and lesson["correct_answer"] == "voda"
+    assert lesson["lesson"] == "Урок" and lesson["task_type"] == "Слово дня"
+
+
+def test_question_set_accepts_a_single_question():
+    lesson = repair_question_set(_lesson(correct_answer="2"))
+    assert lesson["questions"] == [{"question": "Как будет «вода»?", "options": OPTIONS, "correct_answer": "ogonj"}]
+
+
+@pytest.mark.parametrize("data", [
+    None,
+    {"lesson": "Урок", "questions": []},
+    {"lesson": "Урок", "questions": [{"question": "Q", "options": OPTIONS, "correct_answer": "dom"}]},
+])
+def test_question_set_without_usable_questions_is_rejected(data):
+    with pytest.raises(LLMValidationError):
+        repair_question_set(data)
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main([__file__, "-q"]))
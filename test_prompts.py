@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+
+# Checks that every prompt starts with a static prefix identical across calls,
+# so that provider-side prompt caching can reuse it
+import prompts
+
+WORDS = [
+    {"isv": "voda", "partOfSpeech": "n.", "ru": "вода", "en": "water"},
+    {"isv": "ogonj", "addition": "(m.)", "partOfSpeech": "n.", "ru": "огонь"},
+]
+
+
+def _prefix(messages):
+    return [message for message in messages if message["role"] == "system"]
+
+
+def test_lesson_prefix_is_stable():
+    first = prompts.lesson_messages("Алфавит", 1, WORDS, "vedunia", question_count=5)
+    second = prompts.lesson_messages("Падежи", 4, WORDS[:1], "polyak")
+    third = prompts.lesson_messages("Глаголы", 6)
+    assert first[0] is second[0] is third[0] is prompts.LESSON_SYSTEM
+    assert _prefix(first) == _prefix(second) == _prefix(third)
+
+
+def test_static_prefix_comes_first():
+    builders = [
+        lambda avatar: prompts.lesson_messages("Алфавит", 2, WORDS, avatar),
+        lambda avatar: prompts.feedback_messages("Вопрос?", "a", "b", False, avatar),
+        lambda avatar: prompts.study_plan_messages("beginner", "texts", avatar),
+        lambda avatar: prompts.ritual_messages("voda", "вода", avatar),
+    ]
+    for build in builders:
+        variants = [build(avatar) for avatar in (None, *prompts.AVATAR_STYLES)]
+        # Only the last (user) message may differ between avatars
+        assert all(messages[0]["role"] == "system" for messages in variants)
+        assert len({messages[0]["content"] for messages in variants}) == 1
+        assert all(messages[-1]["role"] == "user" for messages in variants)
+
+
+def test_dynamic_parts_stay_out_of_the_prefix():
+    messages = prompts.lesson_messages("Алфавит", 3, WORDS, "starec", question_count=3)
+    system, user = messages[0]["content"], messages[1]["content"]
+    for dynamic in ("Алфавит", "voda", prompts.AVATAR_STYLES["starec"], prompts.TASK_TYPES[3]):
+        assert dynamic not in system
+        assert dynamic in user
+
+
+def test_typed_answer_line_only_for_typed_lessons():
+    typed = prompts.lesson_messages("Фразы", 3, WORDS, question_count=3, typed=True)
+    chosen = prompts.lesson_messages("Фразы", 3, WORDS, question_count=3)
+    assert typed[0] is chosen[0] is prompts.LESSON_SYSTEM
+    assert prompts.TYPED_ANSWER_LINE in typed[1]["content"]
+    assert prompts.TYPED_ANSWER_LINE not in chosen[1]["content"]
+
+
+def test_prompts_have_no_indentation():
+    for message in (prompts.LESSON_SYSTEM, prompts.FEEDBACK_SYSTEM, prompts.STUDY_PLAN_SYSTEM, prompts.RITUAL_SYSTEM):
+        content = message["content"]
+        assert content == content.strip()
+        assert not any(line.startswith((" ", "\t")) for line in content.splitlines())
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
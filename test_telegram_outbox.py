@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+
+# Checks the order, pacing, retries and edit merging of outbound Telegram calls
+# against a fake HTTP session
+import asyncio
+import json
+import time
+from telegram_outbox import PRIORITY_PUSH, TelegramOutbox
+
+
+class FakeResponse:
+    def __init__(self, status_code, result):
+        self.status_code = status_code
+        self.result = result
+        self.text = json.dumps(result)
+
+    def json(self):
+        return self.result
+
+
+class FakeSession:
+    """Records every call; `responses` are returned first, then {"ok": true}"""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    async def post(self, url, content=None, headers=None, data=None, files=None):
+        self.calls.append((url.rsplit("/", 1)[1], json.loads(content), time.monotonic()))
+        if self.responses:
+            return FakeResponse(*self.responses.pop(0))
+        return FakeResponse(200, {"ok": True, "result": len(self.calls)})
+
+
+def _run(session, scenario, **settings):
+    settings = {"global_rate": 1000, "per_chat_rate": 1000, "per_chat_burst": 1000, **settings}
+
+    async def main():
+        outbox = TelegramOutbox(session, "https://api.test/bot", **settings)
+        try:
+            return await scenario(outbox)
+        finally:
+            await outbox.close()
+    return asyncio.run(main())
+
+
+def test_higher_priority_is_sent_first():
+    session = FakeSession()
+
+    async def scenario(outbox):
+        await asyncio.gather(
+            outbox.call("sendMessage", {"text": "ritual"}, 1, priority=PRIORITY_PUSH),
+            outbox.call("sendMessage", {"text": "reply"}, 2),
+            outbox.call("editMessageText", {"message_id": 5, "text": "screen"}, 3),
+            outbox.call("answerCallbackQuery", {"callback_query_id": "q"}, 4),
+        )
+    _run(session, scenario)
+    assert [method for method, _, _ in session.calls] == [
+        "answerCallbackQuery", "editMessageText", "sendMessage", "sendMessage"
+    ]
+    assert session.calls[2][1]["text"] == "reply"
+
+
+def test_chat_is_paced_by_its_bucket():
+    session = FakeSession()
+
+    async def scenario(outbox):
+        await asyncio.gather(*(outbox.call("sendMessage", {"text": str(n)}, 1) for n in range(3)),
+                             outbox.call("sendMessage", {"text": "other"}, 2))
+    started = time.monotonic()
+    _run(session, scenario, per_chat_rate=20, per_chat_burst=1)
+    same_chat = [sent for _, body, sent in session.calls if body["text"] != "other"]
+    other_chat = [sent for _, body, sent in session.calls if body["text"] == "other"]
+    # Order within the chat is kept and every call after the first waits for a token (1/20 s)
+    assert [body["text"] for _, body, _ in session.calls if body["text"] != "other"] == ["0", "1", "2"]
+    assert same_chat[2] - same_chat[0] >= 0.09
+    # Another chat is not held up by the busy one
+    assert other_chat[0] - started < 0.05
+
+
+def test_retry_after_blocks_then_resends():
+    session = FakeSession((429, {"ok": False, "parameters": {"retry_after": 0.1}}))
+
+    async def scenario(outbox):
+        return await outbox.call("sendMessage", {"text": "hi"}, 1)
+    result = _run(session, scenario)
+    assert result["ok"]
+    assert len(session.calls) == 2
+    assert session.calls[1][2] - session.calls[0][2] >= 0.09
+
+
+def test_server_error_fails_after_retries():
+    session = FakeSession((502, {"ok": False}))
+
+    async def scenario(outbox):
+        return await outbox.call("sendMessage", {"text": "hi"}, 1)
+    result = _run(session, scenario, max_retries=0)
+    assert result == {"ok": False, "description": "HTTP 502"}
+    assert len(session.calls) == 1
+
+
+def test_queued_edits_of_a_message_are_merged():
+    session = FakeSession()
+
+    async def scenario(outbox):
+        return await asyncio.gather(
+            outbox.call("editMessageText", {"message_id": 7, "text": "1"}, 1),
+            outbox.call("editMessageText", {"message_id": 7, "text": "2"}, 1),
+            outbox.call("editMessageText", {"message_id": 8, "text": "other"}, 1),
+            outbox.call("editMessageText", {"message_id": 7, "text": "3"}, 1),
+        )
+    results = _run(session, scenario)
+    assert [body["text"] for _, body, _ in session.calls] == ["3", "other"]
+    assert results[0] is results[1] is results[3]
+
+
+def test_retried_edit_does_not_overwrite_a_newer_one():
+    session = FakeSession((429, {"ok": False, "parameters": {"retry_after": 0.1}}))
+
+    async def scenario(outbox):
+        first = asyncio.ensure_future(outbox.call("editMessageText", {"message_id": 7, "text": "old"}, 1))
+        # Wait until the first edit was sent and rejected, then edit again
+        while not session.calls:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        second = await outbox.call("editMessageText", {"message_id": 7, "text": "new"}, 1)
+        return await first, second
+    first, second = _run(session, scenario)
+    assert [body["text"] for _, body, _ in session.calls] == ["old", "new"]
+    assert first == second
+
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"✅ {name}")
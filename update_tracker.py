@@ -0,0 +1,112 @@
+import time
+from collections import deque
+from config import (
+    UPDATE_OFFSET_FLUSH_EVERY, UPDATE_OFFSET_FLUSH_INTERVAL, RECENT_UPDATES_SIZE,
+    PROCESSED_CALLBACK_TTL_HOURS, logger
+)
+from metrics import registry
+
+duplicate_updates = registry.counter("telegram_duplicate_updates_total", "Redelivered updates skipped by reason")
+
+# How often processed_callbacks rows older than the TTL are deleted (seconds)
+PRUNE_INTERVAL = 3600
+
+
+def offset_key(token):
+    """bot_state key of a bot's getUpdates offset (by bot id, the token itself is not stored)"""
+    return f"getupdates_offset:{token.split(':', 1)[0]}"
+
+
+class UpdateTracker:
+    """Durable getUpdates offset and a guard against redelivered updates
+
+    The offset after the last processed update is written to the bot_state
+    table every `flush_every` updates or `flush_interval` seconds, and read
+    back on start, so a restarted bot continues where it stopped instead of
+    from whatever Telegram still holds. Updates processed after the last
+    write are redelivered after a crash; update_ids seen by this process are
+    remembered in a bounded set, and callback queries are claimed in the
+    processed_callbacks table by the bot before their handler runs.
+    """
+
+    def __init__(self, token, database=None, flush_every=UPDATE_OFFSET_FLUSH_EVERY,
+                 flush_interval=UPDATE_OFFSET_FLUSH_INTERVAL, recent_size=RECENT_UPDATES_SIZE):
+        self.key = offset_key(token)
+        self._database = database
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.recent = set()
+        self.recent_order = deque()
+        self.recent_size = recent_size
+        self._offset = None
+        self.loaded = False
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+        self.last_prune = float("-inf")
+
+    @property
+    def database(self):
+        if self._database is None:
+            from database import db
+            self._database = db
+        return self._database
+
+    @property
+    def offset(self):
+        """The getUpdates offset to poll with (None before anything was processed)"""
+        if not self.loaded:
+            value = self.database.get_bot_state(self.key)
+            self._offset = int(value) if value else None
+            self.loaded = True
+            if self._offset:
+                logger.info(f"Resuming getUpdates from offset {self._offset}")
+        return self._offset
+
+    def is_duplicate(self, update_id):
+        """True if the update was already processed by this process or before the stored offset"""
+        if update_id in self.recent:
+            duplicate_updates.inc(reason="recent")
+            return True
+        offset = self.offset
+        if offset is not None and update_id < offset:
+            duplicate_updates.inc(reason="offset")
+            return True
+        return False
+
+    def mark_processed(self, update_id):
+        """Advance the offset past an update and write it out once a batch is complete"""
+        self.recent.add(update_id)
+        self.recent_order.append(update_id)
+        if len(self.recent_order) > self.recent_size:
+            self.recent.discard(self.recent_order.popleft())
+        offset = self.offset
+        if offset is None or update_id + 1 > offset:
+            self._offset = update_id + 1
+        self.unflushed += 1
+        self.maybe_flush()
+
+    def commit(self, offset):
+        """Move the offset to `offset`, for callers that complete updates out of order"""
+        if offset is not None and (self.offset is None or offset > self.offset):
+            self._offset = offset
+            self.unflushed += 1
+            self.maybe_flush()
+
+    def maybe_flush(self):
+        if self.unflushed and (
+            self.unflushed >= self.flush_every or time.monotonic() - self.last_flush >= self.flush_interval
+        ):
+            self.flush()
+
+    def flush(self):
+        """Write the offset to bot_state; keeps it pending if the write fails"""
+        if not self.unflushed:
+            return False
+        if not self.database.set_bot_state(self.key, str(self._offset)):
+            return False
+        self.unflushed = 0
+        self.last_flush = time.monotonic()
+        if self.last_flush - self.last_prune >= PRUNE_INTERVAL:
+            self.last_prune = self.last_flush
+            self.database.prune_processed_callbacks(PROCESSED_CALLBACK_TTL_HOURS)
+        return True